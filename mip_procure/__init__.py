@@ -1,6 +1,6 @@
 __version__ = "1.0.0"
 from mip_procure.main import solve
-from mip_procure.schemas import input_schema, output_schema
+from mip_procure.schemas import input_schema, output_schema, scenarios_schema
 from mip_procure.action_update_packing_cost import update_packing_cost_solve
 
 
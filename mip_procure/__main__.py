@@ -1,10 +1,49 @@
-from ticdat import standard_main
+import argparse
+import functools
+import os
+import sys
 
+from ticdat import standard_main, utils as ticdat_utils
+
+from mip_procure.input_cache import CACHED_EXTENSIONS, DEFAULT_CACHE_DIR, read_pan_dat
 from mip_procure.main import solve
 from mip_procure.schemas import input_schema, output_schema
+from mip_procure.utils import configure_logging
+
+
+def _cached_dat_reader(cache_dir: str):
+    """
+    Wraps the input reader of ticdat's standard_main, so that xlsx/xls/json input files are read through the
+    parsed-input cache (see input_cache.py). The other inputs are read by ticdat, as well as the rest of the command
+    line flow (--errors, the writers of every output format, solve results without a solution, etc.).
+    """
+    get_dat_object = ticdat_utils._get_dat_object
+
+    def get_cached_dat_object(tdf, create_routine, file_path, file_or_directory, check_for_dups):
+        if create_routine == 'create_pan_dat' and file_or_directory == 'file' and os.path.isfile(file_path) and \
+                os.path.splitext(file_path)[1].lower() in CACHED_EXTENSIONS:
+            return read_pan_dat(file_path, tdf, cache_dir=cache_dir)
+        return get_dat_object(tdf, create_routine, file_path, file_or_directory, check_for_dups)
+    return get_cached_dat_object
+
 
 # When run from the command line, will read/write json/xls/csv/db/sql/mdb files
 # For example, the next command will read from a model stored in input.xlsx and write solution.xlsx.
 #   python -m mip_procure -i input.xlsx -o solution.xlsx
+# The logging level defaults to INFO, and DEBUG also logs the solver log and the build times:
+#   python -m mip_procure -i input.xlsx -o solution.xlsx --log-level DEBUG
+# --verbose also logs a summary of the optimization data (see DatIn.log_opt_data()).
+# xlsx/xls/json inputs are read through the parsed-input cache (see input_cache.py), unless --no-input-cache is given.
 if __name__ == "__main__":
-    standard_main(input_schema, output_schema, solve)
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('--log-level', default='INFO', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
+                        type=str.upper)
+    parser.add_argument('--verbose', action='store_true')
+    parser.add_argument('--no-input-cache', action='store_true')
+    parser.add_argument('--input-cache-dir', default=DEFAULT_CACHE_DIR)
+    args, other_args = parser.parse_known_args()
+    configure_logging(args.log_level)
+    if not args.no_input_cache:
+        ticdat_utils._get_dat_object = _cached_dat_reader(args.input_cache_dir)
+    sys.argv = [sys.argv[0]] + other_args  # the remaining arguments (-i, -o, -e, etc.) are handled by standard_main
+    standard_main(input_schema, output_schema, functools.partial(solve, verbose=args.verbose))
@@ -0,0 +1,319 @@
+"""
+Contains the coarse-to-fine solve mode: similar packings are clustered, the much smaller aggregated model is solved
+first, and its plan guides the solution of the full model.
+"""
+import logging
+import time
+from functools import partial
+from typing import Callable, Dict
+
+import numpy as np
+import pandas as pd
+import pulp
+
+from mip_procure.data_bridge import DatIn
+from mip_procure.opt_model import OptModel
+from mip_procure.rolling_horizon import solve_rolling_horizon
+from mip_procure.schemas import input_schema
+
+logger = logging.getLogger(__name__)
+
+
+def cluster_packings(dat: input_schema.PanDat, num_clusters: int, seed: int = 0,
+                     max_iterations: int = 50) -> pd.Series:
+    """
+    Clusters the packings with similar costs, aging limit and demand shape, using k-means.
+
+    Each packing is described by its 'Unit Price', its 'Inventory Cost' in Patas Pack and in Pet Gourmet, its
+    'Maximum Time' (items_aging) and its demand shape (the share of its total demand in each period). The attributes
+    are standardized, and the demand shape is weighted so that it counts as much as each one of the attributes.
+
+    Parameters
+    ----------
+    dat : input_schema.PanDat
+        A PanDat object from ticdat package, created accordingly to schemas.input_schema.
+    num_clusters : int
+        The maximum number of clusters (clusters that end up empty are dropped).
+    seed : int
+        Seed of the k-means++ initialization.
+    max_iterations : int
+        Maximum number of k-means iterations.
+
+    Returns
+    -------
+    clusters : pd.Series
+        The cluster ID (str) of each packing, indexed by 'Packing ID'.
+    """
+    packing_ids = dat.packing['Packing ID'].sort_values().to_numpy()
+    inventory_cost = dat.inventory.pivot(index='Packing ID', columns='Factory ID', values='Inventory Cost')
+    attributes = pd.DataFrame({
+        'Unit Price': dat.packing.set_index('Packing ID')['Unit Price'],
+        'Pack Cost': inventory_cost['Pack'],
+        'Gourmet Cost': inventory_cost['Gourmet'],
+        'Maximum Time': dat.items_aging.set_index('Packing ID')['Maximum Time']}).loc[packing_ids]
+    demand = dat.demand_packing.pivot(index='Packing ID', columns='Period ID', values='Demand').loc[packing_ids]
+    shape = demand.to_numpy(dtype=float) / np.maximum(demand.sum(axis=1).to_numpy(dtype=float), 1.0)[:, None]
+
+    def standardize(values: np.ndarray) -> np.ndarray:
+        std = values.std(axis=0)
+        return (values - values.mean(axis=0)) / np.where(std > 0, std, 1.0)
+
+    features = np.hstack([standardize(attributes.to_numpy(dtype=float)),
+                          standardize(shape) / np.sqrt(shape.shape[1])])
+
+    # k-means++ initialization
+    num_clusters = min(num_clusters, len(packing_ids))
+    rng = np.random.default_rng(seed)
+    centers = features[[rng.integers(len(features))]]
+    sq_distances = ((features - centers[0]) ** 2).sum(axis=1)
+    while len(centers) < num_clusters and sq_distances.sum() > 0:
+        center = features[rng.choice(len(features), p=sq_distances / sq_distances.sum())]
+        centers = np.vstack([centers, center])
+        sq_distances = np.minimum(sq_distances, ((features - center) ** 2).sum(axis=1))
+
+    # Lloyd iterations
+    labels = None
+    for _ in range(max_iterations):
+        distances = (features ** 2).sum(axis=1)[:, None] - 2 * features @ centers.T + (centers ** 2).sum(axis=1)
+        new_labels = distances.argmin(axis=1)
+        if labels is not None and (new_labels == labels).all():
+            break
+        labels = new_labels
+        centers = np.vstack([features[labels == k].mean(axis=0) for k in np.unique(labels)])
+        labels = np.unique(labels, return_inverse=True)[1]  # renumber, dropping the empty clusters
+
+    return pd.Series([f'Cluster {label}' for label in labels], index=pd.Index(packing_ids, name='Packing ID'),
+                     name='Cluster ID')
+
+
+def aggregate_dat(dat: input_schema.PanDat, clusters: pd.Series) -> input_schema.PanDat:
+    """
+    Builds the input data of the aggregated model, where each cluster of packings is a single packing.
+
+    Quantities (demand, inventories and maximum quantities) are summed over the members, costs are averaged and the
+    minimum quantities and aging limits take the smallest value among the members, so that any plan of the members
+    is also feasible for their cluster.
+
+    Parameters
+    ----------
+    dat : input_schema.PanDat
+        A PanDat object from ticdat package, created accordingly to schemas.input_schema.
+    clusters : pd.Series
+        The cluster ID of each packing, indexed by 'Packing ID' (see cluster_packings()).
+
+    Returns
+    -------
+    agg_dat : input_schema.PanDat
+        A PanDat object with the same schema, whose 'Packing ID' values are the cluster IDs.
+    """
+    def with_cluster(df: pd.DataFrame) -> pd.DataFrame:
+        return df.assign(**{'Packing ID': df['Packing ID'].map(clusters)})
+
+    agg_dat = input_schema.PanDat()
+    agg_dat.parameters = dat.parameters.copy()
+    agg_dat.packing = with_cluster(dat.packing).groupby('Packing ID', as_index=False).agg(
+        {'Unit Price': 'mean', 'Size': 'first', 'Color': 'first'})
+    agg_dat.demand_packing = with_cluster(dat.demand_packing).groupby(['Packing ID', 'Period ID'], as_index=False).agg(
+        {'Demand': 'sum', 'Min Order Qty': 'min', 'Max Order Qty': 'sum'})
+    agg_dat.inventory = with_cluster(dat.inventory).groupby(['Factory ID', 'Packing ID'], as_index=False).agg(
+        {'Initial Inventory': 'sum', 'Minimum Inventory': 'sum', 'Inventory Cost': 'mean'})
+    agg_dat.distribution = with_cluster(dat.distribution).groupby('Packing ID', as_index=False).agg(
+        {'Minimum Transfer Qty': 'min', 'Maximum Transfer Qty': 'sum'})
+    agg_dat.items_aging = with_cluster(dat.items_aging).groupby('Packing ID', as_index=False).agg(
+        {'Maximum Time': 'min'})
+    return agg_dat
+
+
+def restrict_to_aggregated_plan(opt_model: OptModel, agg_model: OptModel, clusters: pd.Series) -> Dict:
+    """
+    Splits the order and transfer schedule of each cluster in the aggregated plan back to its packings, by fixing
+    the binaries of the full model.
+
+    Each packing can only order in the periods where its cluster orders, and only transfer in the periods where its
+    cluster transfers. Its orders are fixed lot for lot: at each order period of the cluster, the packing orders
+    (wb = 1) if its stock does not cover its demand until the next order period of the cluster, and does not order
+    (wb = 0) otherwise. The quantities are left free, so that solving the restricted full model repairs the plan of
+    each packing (minimum orders, inventory limits, etc.). The packings whose initial stock does not last until the
+    first order period of their cluster are left unrestricted.
+
+    Parameters
+    ----------
+    opt_model : OptModel
+        The full model, already built.
+    agg_model : OptModel
+        The aggregated model, already solved.
+    clusters : pd.Series
+        The cluster ID of each packing, indexed by 'Packing ID'.
+
+    Returns
+    -------
+    restricted : dict
+        Dictionary {variable: (original lower bound, original upper bound)} of the restricted variables, to undo the
+        restriction with release_restriction().
+    """
+    dat_in = opt_model.dat_in
+    d, ilg, ini_inventory, au, moq = dat_in.d, dat_in.ilg, dat_in.ini_inventory, dat_in.au, dat_in.moq
+    periods = sorted(dat_in.T)
+    wb, xb = opt_model.vars['wb'], opt_model.vars['xb']
+    agg_wb, agg_xb = agg_model.vars['wb'], agg_model.vars['xb']
+    restricted = {}
+
+    def set_bounds(var: pulp.LpVariable, low_bound: float, up_bound: float) -> None:
+        restricted[var] = var.lowBound, var.upBound
+        var.lowBound, var.upBound = low_bound, up_bound
+
+    for i in sorted(dat_in.I):
+        cluster = clusters[i]
+        order_positions = [k for k, t in enumerate(periods) if round(agg_wb[cluster, t].value() or 0) == 1]
+        # cum_demand[k] is the demand of periods[0], ..., periods[k - 1]
+        cum_demand = np.concatenate([[0], np.cumsum([d[i, t] for t in periods])])
+        stock = ini_inventory['Pack', i] + ini_inventory['Gourmet', i] - ilg['Gourmet', i]
+        if stock < cum_demand[order_positions[0] if order_positions else len(periods)]:
+            continue  # the initial stock does not last until the first order of the cluster
+        for t in periods:
+            if round(agg_xb[cluster, t].value() or 0) == 0:
+                set_bounds(xb[i, t], 0, 0)
+        for k, position in enumerate(order_positions):
+            t = periods[position]
+            next_position = order_positions[k + 1] if k + 1 < len(order_positions) else len(periods)
+            need = cum_demand[next_position] - stock
+            if need > 0:
+                set_bounds(wb[i, t], 1, 1)
+                stock += min(max(need, moq[i, t]), au[i, t])
+            else:
+                set_bounds(wb[i, t], 0, 0)
+        for position in set(range(len(periods))).difference(order_positions):
+            set_bounds(wb[i, periods[position]], 0, 0)
+    return restricted
+
+
+def release_restriction(restricted: Dict) -> None:
+    """
+    Restores the bounds changed by restrict_to_aggregated_plan().
+    """
+    for var, (low_bound, up_bound) in restricted.items():
+        var.lowBound, var.upBound = low_bound, up_bound
+
+
+def solve_aggregated(dat: input_schema.PanDat, num_clusters: int, discount: bool = False, warm_start: bool = False,
+                     solver_parameters: Dict[str, float] = None, compact_names: bool = False,
+                     dat_in: DatIn = None, periods_per_window: int = None,
+                     full_model_fallback: bool = False) -> OptModel:
+    """
+    Solves the model coarse to fine: aggregated model, repair of the per-packing plan and, optionally, full model.
+
+    1. The packings are clustered (cluster_packings()) and the aggregated model, with one packing per cluster, is
+       solved.
+    2. Repair: the per-packing model is solved with the orders and transfers of each packing restricted to the periods
+       where its cluster orders or transfers (restrict_to_aggregated_plan()). Most binaries are fixed to zero, so this
+       model solves much faster than the full one. If periods_per_window is given, the repair is solved by rolling
+       horizon (see rolling_horizon.py), so that only models of a window of periods are built, and a window whose
+       restriction is infeasible is solved again without it. Otherwise, the repair model is the full model.
+    3. If warm_start is True, the restriction is dropped and the full model is solved with the repaired plan as the
+       initial incumbent.
+
+    If the plan can't be repaired (without windows), the full model is only solved if full_model_fallback is True.
+    Otherwise, the returned model has no solution.
+
+    The times, objectives and status of each step are recorded in the run_stats of the returned model.
+
+    Parameters
+    ----------
+    dat : input_schema.PanDat
+        A PanDat object from ticdat package, created accordingly to schemas.input_schema.
+    num_clusters : int
+        The number of clusters of packings in the aggregated model.
+    discount : bool
+        Whether the volume discount complexity is enabled.
+    warm_start : bool
+        If True, the full model is solved after the repair step, warm started with the repaired plan. It can't be
+        combined with periods_per_window.
+    solver_parameters : dict, optional
+        Solver parameters of every solve (see OptModel.set_model_parameters()).
+    compact_names : bool
+        Whether the per-packing models use compact names (see OptModel).
+    dat_in : DatIn, optional
+        The DatIn instance of dat, if already built.
+    periods_per_window : int, optional
+        If given, the number of periods of the windows of the repair (see rolling_horizon.max_periods_per_window()).
+    full_model_fallback : bool
+        If True, the unrestricted full model is solved (with the solver_parameters) when the plan can't be repaired.
+
+    Returns
+    -------
+    opt_model : OptModel
+        The model holding the repaired (or warm started) solution, if any.
+    """
+    if warm_start and periods_per_window is not None:
+        raise ValueError('warm_start solves the full model, so it cannot be combined with periods_per_window')
+    solver_parameters = solver_parameters or {}
+    start = time.perf_counter()
+    clusters = cluster_packings(dat, num_clusters)
+    logger.info('Solving the aggregated model of %d clusters of packings...', clusters.nunique())
+    agg_model = _build_model(DatIn(aggregate_dat(dat, clusters)), 'Mip_Procure_Aggregated', discount)
+    agg_model.set_model_parameters(solver_parameters)
+    agg_model.optimize()
+    aggregation_time = time.perf_counter() - start
+    stats = {'Aggregation Clusters': clusters.nunique(), 'Aggregation Time (s)': aggregation_time,
+             'Aggregated Status': pulp.LpStatus[agg_model.mdl.status],
+             'Aggregated Objective': agg_model.sol.get('obj_val')}
+    dat_in = dat_in or DatIn(dat)
+
+    if periods_per_window is not None:
+        def restrict(window_model: OptModel) -> Callable:
+            return partial(release_restriction, restrict_to_aggregated_plan(window_model, agg_model, clusters))
+
+        if 'vars' in agg_model.sol:
+            logger.info('Repairing the per-packing plan of the aggregated model by windows of %d periods...',
+                        periods_per_window)
+        else:
+            logger.warning('The aggregated model has no solution. Solving the windows without its plan...')
+            restrict = None
+        start = time.perf_counter()
+        opt_model = solve_rolling_horizon(dat, periods_per_window, discount=discount,
+                                          solver_parameters=solver_parameters, compact_names=compact_names,
+                                          dat_in=dat_in, restrict=restrict)
+        stats.update({'Repair Time (s)': time.perf_counter() - start,
+                      'Repair Status': pulp.LpStatus[opt_model.mdl.status],
+                      'Repair Objective': opt_model.sol.get('obj_val')})
+        opt_model.run_stats.update(stats)
+        return opt_model
+
+    opt_model = _build_model(dat_in, 'Mip_Procure', discount, compact_names)
+    opt_model.set_model_parameters(solver_parameters)
+    if 'vars' in agg_model.sol:
+        logger.info('Repairing the per-packing plan of the aggregated model...')
+        start = time.perf_counter()
+        restricted = restrict_to_aggregated_plan(opt_model, agg_model, clusters)
+        opt_model.optimize()
+        release_restriction(restricted)
+        stats.update({'Repair Time (s)': time.perf_counter() - start,
+                      'Repair Status': pulp.LpStatus[opt_model.mdl.status],
+                      'Repair Objective': opt_model.sol.get('obj_val')})
+        repaired = 'vars' in opt_model.sol
+    else:
+        repaired = False
+    stats['Full Model Fallback'] = int(not repaired and full_model_fallback)  # 1 if the full model was solved
+    if not repaired and full_model_fallback:
+        logger.warning('The aggregated plan could not be repaired. Solving the full model (solver parameters: %s)...',
+                       solver_parameters)
+        opt_model.optimize()
+    elif not repaired:
+        logger.warning('The aggregated plan could not be repaired, and the full model fallback is disabled')
+        # the restricted model is not proved infeasible, so it is reported as not solved (and it is not triaged)
+        opt_model.mdl.assignStatus(pulp.LpStatusNotSolved)
+        opt_model.sol = {'status': pulp.LpStatusNotSolved}
+    elif warm_start:
+        logger.info('Solving the full model from the repaired plan...')
+        opt_model.optimize(warm_start=True)
+    opt_model.run_stats.update(stats)
+    return opt_model
+
+
+def _build_model(dat_in: DatIn, model_name: str, discount: bool, compact_names: bool = False) -> OptModel:
+    opt_model = OptModel(dat_in, model_name=model_name, compact_names=compact_names)
+    opt_model.build_base_model()
+    opt_model.transporting_cost_complexity()
+    if discount:
+        opt_model.discount_complexity()
+    return opt_model
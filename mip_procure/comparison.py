@@ -0,0 +1,206 @@
+"""
+Contains the comparison of the solutions of several scenarios (variants of the same input data).
+
+The output tables of every scenario are stacked once into aligned (scenario x packing x period) arrays, from which
+the cost breakdown of each scenario and the decisions that changed with respect to a baseline scenario are computed
+with array operations, instead of merging the pet_gourmet/patas_pack dataframes of each pair of scenarios.
+"""
+from typing import Dict, List, NamedTuple, Union
+
+import numpy as np
+import pandas as pd
+
+from mip_procure.schemas import input_schema, output_schema
+
+# Stacked fields: {field name in the comparison: (output table, output field)}
+STACKED_FIELDS = {
+    'Acquired Quantity': ('patas_pack', 'Acquired Quantity'),
+    'Transferred Quantity': ('patas_pack', 'Transferred Quantity'),
+    'Pack Final Inventory': ('patas_pack', 'Final Inventory'),
+    'Gourmet Final Inventory': ('pet_gourmet', 'Final Inventory'),
+}
+COST_COLUMNS = ['Purchase Cost', 'Pack Holding Cost', 'Gourmet Holding Cost', 'Truck Cost', 'Total Cost']
+
+
+class SolutionStack(NamedTuple):
+    """
+    The output tables of several scenarios, aligned on the union of their packings and periods.
+    """
+    scenarios: List[str]
+    packings: np.ndarray
+    periods: np.ndarray
+    values: Dict[str, np.ndarray]  # {STACKED_FIELDS key: (scenario, packing, period) array, NaN if missing}
+
+
+class ComparisonReport(NamedTuple):
+    """
+    The result of compare_solutions().
+    """
+    stack: SolutionStack
+    costs_df: pd.DataFrame
+    changed: Dict[str, np.ndarray]
+    changes_df: pd.DataFrame
+
+
+def stack_solutions(solutions: Dict[str, output_schema.PanDat]) -> SolutionStack:
+    """
+    Stacks the output tables of several scenarios into aligned (scenario x packing x period) arrays.
+
+    Parameters
+    ----------
+    solutions : dict
+        Dictionary {scenario name: output_schema.PanDat}, e.g. the outputs of main.solve for each scenario.
+
+    Returns
+    -------
+    stack : SolutionStack
+        The packings and periods are the sorted union of the ones of every scenario. The (packing, period) pairs
+        missing in a scenario (e.g., an infeasible scenario, without output tables) are NaN.
+    """
+    scenarios = list(solutions)
+    tables = {table for table, _ in STACKED_FIELDS.values()}
+    frames = [(number, table, getattr(solutions[scenario], table)) for number, scenario in enumerate(scenarios)
+              for table in sorted(tables) if getattr(solutions[scenario], table) is not None]
+    # union of the packings and periods, and the positions of the rows of each table on it (hash-based lookups)
+    packings = pd.Index(pd.unique(np.concatenate([df['Packing ID'].unique() for _, _, df in frames] or [[]])))
+    periods = pd.Index(pd.unique(np.concatenate([df['Period ID'].unique() for _, _, df in frames] or [[]])))
+    packings, periods = packings.astype(str).sort_values(), periods.astype(np.int64).sort_values()
+
+    values = {field: np.full((len(scenarios), len(packings), len(periods)), np.nan) for field in STACKED_FIELDS}
+    for number, table, df in frames:
+        packing_positions = packings.get_indexer(df['Packing ID'].astype(str))
+        period_positions = periods.get_indexer(df['Period ID'])
+        for field, (field_table, output_field) in STACKED_FIELDS.items():
+            if field_table == table:
+                values[field][number, packing_positions, period_positions] = df[output_field].to_numpy(dtype=float)
+    return SolutionStack(scenarios=scenarios, packings=packings.to_numpy(), periods=periods.to_numpy(),
+                         values=values)
+
+
+def cost_breakdown(stack: SolutionStack,
+                   dat: Union[input_schema.PanDat, Dict[str, input_schema.PanDat]]) -> pd.DataFrame:
+    """
+    Computes the cost of each scenario by component, as in the objective function of OptModel.
+
+    The purchase cost uses the unit prices without volume discount (see OptModel.discount_complexity()), and the
+    truck cost charges ceil(transferred quantity / TruckCapacity) trucks per period at CostByTruck each (see
+    OptModel.transporting_cost_complexity()).
+
+    Parameters
+    ----------
+    stack : SolutionStack
+        The stacked solutions (see stack_solutions()).
+    dat : input_schema.PanDat or dict
+        The input data shared by every scenario, or a dictionary {scenario name: input_schema.PanDat}.
+
+    Returns
+    -------
+    costs_df : pd.DataFrame
+        Dataframe indexed by 'Scenario', with the COST_COLUMNS columns (NaN for the scenarios without solution).
+    """
+    dats = dat if isinstance(dat, dict) else {scenario: dat for scenario in stack.scenarios}
+    # (scenario, packing) arrays of unit costs and (scenario,) arrays of truck parameters
+    unit_price = np.stack([_packing_array(dats[scenario].packing.set_index('Packing ID')['Unit Price'], stack)
+                           for scenario in stack.scenarios])
+    inventory_cost = {factory: np.stack([_packing_array(_inventory_cost(dats[scenario], factory), stack)
+                                         for scenario in stack.scenarios]) for factory in ('Pack', 'Gourmet')}
+    params = [input_schema.create_full_parameters_dict(dats[scenario]) for scenario in stack.scenarios]
+    truck_capacity = np.array([scenario_params['TruckCapacity'] for scenario_params in params], dtype=float)
+    cost_by_truck = np.array([scenario_params['CostByTruck'] for scenario_params in params], dtype=float)
+
+    values = {field: np.nan_to_num(array) for field, array in stack.values.items()}
+    # round before the ceiling, so that 1e-9 above a multiple of the truck capacity does not count as a truck
+    trucks = np.ceil(np.round(values['Transferred Quantity'].sum(axis=1) / truck_capacity[:, None], 6))
+    costs_df = pd.DataFrame({
+        'Purchase Cost': np.einsum('si,sit->s', unit_price, values['Acquired Quantity']),
+        'Pack Holding Cost': np.einsum('si,sit->s', inventory_cost['Pack'], values['Pack Final Inventory']),
+        'Gourmet Holding Cost': np.einsum('si,sit->s', inventory_cost['Gourmet'], values['Gourmet Final Inventory']),
+        'Truck Cost': cost_by_truck * trucks.sum(axis=1),
+    }, index=pd.Index(stack.scenarios, name='Scenario'))
+    costs_df['Total Cost'] = costs_df.sum(axis=1)
+    costs_df.loc[np.isnan(stack.values['Acquired Quantity']).all(axis=(1, 2))] = np.nan  # scenarios without solution
+    return costs_df
+
+
+def _inventory_cost(dat: input_schema.PanDat, factory: str) -> pd.Series:
+    inventory = dat.inventory[dat.inventory['Factory ID'] == factory]
+    return inventory.set_index('Packing ID')['Inventory Cost']
+
+
+def _packing_array(series: pd.Series, stack: SolutionStack) -> np.ndarray:
+    """
+    Aligns a series indexed by packing to the packings of the stack (0 for the missing ones).
+    """
+    series.index = series.index.astype(str)
+    return series.reindex(stack.packings, fill_value=0).to_numpy(dtype=float)
+
+
+def changed_decisions(stack: SolutionStack, baseline: str = None, tolerance: float = 1e-6) -> Dict[str, np.ndarray]:
+    """
+    Finds the decisions of each scenario that differ from the ones of a baseline scenario.
+
+    Parameters
+    ----------
+    stack : SolutionStack
+        The stacked solutions (see stack_solutions()).
+    baseline : str, optional
+        The name of the baseline scenario. Defaults to the first scenario.
+    tolerance : float
+        Absolute difference above which a value is considered changed.
+
+    Returns
+    -------
+    changed : dict
+        Dictionary {STACKED_FIELDS key: boolean (scenario, packing, period) array}. A pair missing in only one of the
+        two scenarios is changed, and the row of the baseline scenario is all False.
+    """
+    baseline_number = 0 if baseline is None else stack.scenarios.index(baseline)
+    changed = {}
+    for field, array in stack.values.items():
+        baseline_array = array[baseline_number][None, :, :]
+        missing, baseline_missing = np.isnan(array), np.isnan(baseline_array)
+        with np.errstate(invalid='ignore'):
+            changed[field] = (np.abs(array - baseline_array) > tolerance) | (missing != baseline_missing)
+    return changed
+
+
+def compare_solutions(solutions: Dict[str, output_schema.PanDat],
+                      dat: Union[input_schema.PanDat, Dict[str, input_schema.PanDat]], baseline: str = None,
+                      tolerance: float = 1e-6) -> ComparisonReport:
+    """
+    Compares the solutions of several scenarios: stacks them, computes their cost breakdowns, and lists the decisions
+    that changed with respect to the baseline scenario.
+
+    Parameters
+    ----------
+    solutions : dict
+        Dictionary {scenario name: output_schema.PanDat}.
+    dat : input_schema.PanDat or dict
+        The input data shared by every scenario, or a dictionary {scenario name: input_schema.PanDat}.
+    baseline : str, optional
+        The name of the baseline scenario. Defaults to the first scenario.
+    tolerance : float
+        Absolute difference above which a value is considered changed.
+
+    Returns
+    -------
+    report : ComparisonReport
+        The stack, the costs dataframe (see cost_breakdown()), the changed masks (see changed_decisions()) and
+        changes_df, the changed values in long format, with the columns 'Scenario', 'Packing ID', 'Period ID',
+        'Field', 'Baseline Value' and 'Value' ('Scenario', 'Packing ID' and 'Field' are categorical).
+    """
+    stack = stack_solutions(solutions)
+    changed = changed_decisions(stack, baseline, tolerance)
+    baseline_number = 0 if baseline is None else stack.scenarios.index(baseline)
+    changes = []
+    for field_number, (field, mask) in enumerate(changed.items()):
+        scenario_numbers, packing_positions, period_positions = np.nonzero(mask)
+        changes.append(pd.DataFrame({
+            'Scenario': pd.Categorical.from_codes(scenario_numbers, categories=stack.scenarios),
+            'Packing ID': pd.Categorical.from_codes(packing_positions, categories=stack.packings),
+            'Period ID': stack.periods[period_positions],
+            'Field': pd.Categorical.from_codes(np.full(len(scenario_numbers), field_number), categories=list(changed)),
+            'Baseline Value': stack.values[field][baseline_number, packing_positions, period_positions],
+            'Value': stack.values[field][scenario_numbers, packing_positions, period_positions]}))
+    changes_df = pd.concat(changes, ignore_index=True)
+    return ComparisonReport(stack=stack, costs_df=cost_breakdown(stack, dat), changed=changed, changes_df=changes_df)
@@ -1,9 +1,15 @@
 import itertools
+import logging
+from collections import defaultdict
+from typing import Dict, Iterator, Tuple
 import pandas as pd
 from mip_procure.schemas import input_schema, output_schema
 from mip_procure.utils import BadSolutionError, is_list_of_consecutive_increasing_integers
 import pulp
 from mip_procure.data_preparation import all_integrity_checks
+from mip_procure.validation import ValidationCache
+
+logger = logging.getLogger(__name__)
 
 class DatIn:
     """
@@ -14,7 +20,8 @@ class DatIn:
     to the mathematical formulation, which facilitates debugging and maintenance.
     """
 
-    def __init__(self, dat: input_schema.PanDat, verbose: bool = False) -> None:
+    def __init__(self, dat: input_schema.PanDat, verbose: bool = False,
+                 validation_cache: ValidationCache = None) -> None:
         """
         Initializes a DatIn instance, from a dat object.
 
@@ -27,13 +34,21 @@ class DatIn:
         dat : input_schema.PanDat
             A PanDat object from ticdat package, created accordingly to schemas.input_schema. It contains the input 
             data as its attributes (pandas dataframes).
+        verbose : bool
+            If True, logs a summary of the optimization data after populating it (see log_opt_data()).
+        validation_cache : ValidationCache, optional
+            If given, the schema and integrity checks are run through the cache, which only validates the tables
+            that changed since its previous use. Otherwise, only the integrity checks are run.
         """
-        print('Instantiating a DatIn object...')
+        logger.info('Instantiating a DatIn object...')
         self.dat = input_schema.copy_pan_dat(pan_dat=dat)  # copy input "dat" to avoid over-writing
         self.dat_params = input_schema.create_full_parameters_dict(dat)  # create input parameters from 'dat'
 
         # Additional integrity checks
-        all_integrity_checks(self.dat)
+        if validation_cache is None:
+            all_integrity_checks(self.dat)
+        else:
+            validation_cache.check(self.dat)
 
         # set of indices, populated in _populate_sets_of_indices() method
         self.I = set()  # set of items ids
@@ -63,13 +78,13 @@ class DatIn:
         self.xb_keys = []
 
         # populate optimization data. The order below in which methods are called is important! Don't change it!
-        print("Populating the optimization data...")
+        logger.info('Populating the optimization data...')
         self._populate_sets_of_indices()
         self._populate_parameters()
         self._derive_variables_keys()
 
         if verbose:
-            self.print_opt_data()
+            self.log_opt_data()
 
     def _populate_sets_of_indices(self) -> None:
         """
@@ -123,16 +138,34 @@ class DatIn:
         self.yp_keys = [(i, t) for i in I for t in T_extend]
         self.yg_keys = self.yp_keys.copy()
         
-    def print_opt_data(self) -> None:
+    def log_opt_data(self, max_items: int = 3) -> None:
         """
-        Prints the indices/parameters created for the optimization engine.
+        Logs a summary of the indices/parameters created for the optimization engine: the size of each one and a
+        sample of its first items, instead of their full contents.
+
+        Parameters
+        ----------
+        max_items : int
+            Maximum number of items shown for each index/parameter.
         """
         for attr_name, value in self.__dict__.items():
-            if attr_name.startswith('_'):
+            if attr_name.startswith('_') or attr_name == 'dat':
                 continue
-            print(f"{attr_name}:")
-            print(value)
-            print('-' * 40)
+            logger.info('%s: %s', attr_name, _summarize(value, max_items))
+
+
+def _summarize(value, max_items: int) -> str:
+    """
+    Describes a collection by its size and first items (other values are described by their repr).
+    """
+    if isinstance(value, dict):
+        items = [f'{key!r}: {item!r}' for key, item in itertools.islice(value.items(), max_items)]
+    elif isinstance(value, (list, set, tuple)):
+        items = [repr(item) for item in itertools.islice(value, max_items)]
+    else:
+        return repr(value)
+    sample = ', '.join(items) + (', ...' if len(value) > max_items else '')
+    return f'{type(value).__name__} of {len(value)} items [{sample}]'
 
 
 class DatOut:
@@ -144,7 +177,7 @@ class DatOut:
     retrieves a PanDat), and/or print them through print_solution_dataframes() method.
     """
 
-    def __init__(self, solution_model) -> None:
+    def __init__(self, solution_model, build_tables: bool = True) -> None:
         """
         Initializes a DatOut instance from the solved optimization model, and populates the output tables.
 
@@ -153,8 +186,11 @@ class DatOut:
         solution_model : OptModel
             An instance of the OptModel class (see opt_model.py) which has already called its optimize() method. It
             contains   output data from optimization to feed the DatOut class.
+        build_tables : bool
+            If False, the output tables are not populated at initialization. Used to stream the output tables to
+            disk with iter_output_chunks() (see output_writer.py) without holding them fully in memory.
         """
-        print('Instantiating a DatOut object...')
+        logger.info('Instantiating a DatOut object...')
         # get optimal data
         self.solution_model = solution_model
         self.opt_sol = solution_model.sol
@@ -163,16 +199,19 @@ class DatOut:
         # initialize output data
         self.patas_pack_df = None
         self.pet_gourmet_df = None
+        self.run_stats_df = pd.DataFrame(list(solution_model.run_stats.items()), columns=['Statistic', 'Value'])
+        self.triage_df = solution_model.triage_df  # violations of the elastic model, if the model was infeasible
+        if self.triage_df is None:
+            self.triage_df = pd.DataFrame(columns=['Family', 'Packing ID', 'Period ID', 'Violation'])
 
         # populate the solution dataframes
-        self._process_solution()
+        if build_tables:
+            self._process_solution()
 
     def _process_solution(self) -> None:
         """
         Converts the output from the optimization into dataframes that will be used to build reports.
         """
-        dat_in, dat = self.dat_in, self.dat_in.dat
-        # I, T = dat_in.I, dat_in.T
         mdl = self.solution_model.mdl
         # print status
         status = mdl.status
@@ -180,9 +219,29 @@ class DatOut:
 
         if status != pulp.LpStatusOptimal:
             return
-        
+
+        self.pet_gourmet_df, self.patas_pack_df = self._build_tables(*self._solution_frames())
+
+    def _solution_frames(self, vars_sol: Dict[str, list] = None,
+                         demand_packing_df: pd.DataFrame = None) -> Tuple[pd.DataFrame, ...]:
+        """
+        Reads the output variables values from optimization as dataframes sorted by packing and period.
+
+        Parameters
+        ----------
+        vars_sol : dict, optional
+            Dictionary {variable name: list of (packing, period, value)} with the values of a block of packings.
+            Defaults to the whole solution.
+        demand_packing_df : pd.DataFrame, optional
+            The demand_packing rows of the same block of packings. Defaults to the whole table.
+
+        Returns
+        -------
+        frames : tuple of pd.DataFrame
+            The x, w, yp, yg and demand dataframes, indexed by the 'Packing ID' and 'Period ID' columns.
+        """
         # read output variables values from optimization
-        vars_sol = self.opt_sol['vars']
+        vars_sol = self.opt_sol['vars'] if vars_sol is None else vars_sol
         x_sol = vars_sol['x']
         yp_sol = vars_sol['yp']
         yg_sol = vars_sol['yg']
@@ -195,9 +254,24 @@ class DatOut:
         yg_df = pd.DataFrame(yg_sol, columns=['Packing ID', 'Period ID', 'Final Inventory'])
 
         # demand table
-        demand_packing_df = dat.demand_packing.copy()
+        if demand_packing_df is None:
+            demand_packing_df = self.dat_in.dat.demand_packing
         demand_df = demand_packing_df[['Packing ID', 'Period ID', 'Demand']]
 
+        return tuple(df.sort_values(by=['Packing ID', 'Period ID'], ignore_index=True)
+                     for df in (x_df, w_df, yp_df, yg_df, demand_df))
+
+    @staticmethod
+    def _build_tables(x_df: pd.DataFrame, w_df: pd.DataFrame, yp_df: pd.DataFrame, yg_df: pd.DataFrame,
+                      demand_df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        Builds the pet_gourmet and patas_pack output tables from the solution dataframes (see _solution_frames()).
+
+        Returns
+        -------
+        tables : tuple of pd.DataFrame
+            The pet_gourmet and patas_pack dataframes, sorted by packing and period.
+        """
         # Pet Gourmet Table
         pet_gourmet_df = x_df.merge(yg_df, on=['Packing ID', 'Period ID'], how='left')
         pet_gourmet_df = demand_df.merge(pet_gourmet_df, on=['Packing ID', 'Period ID'], how='right')
@@ -210,7 +284,6 @@ class DatOut:
         pet_gourmet_df = pet_gourmet_df[new_order]
         pet_gourmet_df = pet_gourmet_df.sort_values(by=['Packing ID', 'Period ID'],
                                                     ascending=[True, True], ignore_index=True)
-        self.pet_gourmet_df = pet_gourmet_df
 
         # Patas Pack table
         patas_pack_df = x_df.merge(yp_df, on=['Packing ID', 'Period ID'], how='left')
@@ -223,7 +296,46 @@ class DatOut:
         patas_pack_df = patas_pack_df[new_order]
         patas_pack_df = patas_pack_df.sort_values(by=['Packing ID', 'Period ID'],
                                                   ascending=[True, True], ignore_index=True)
-        self.patas_pack_df = patas_pack_df
+        return pet_gourmet_df, patas_pack_df
+
+    def iter_output_chunks(self, packings_per_chunk: int = 1000) -> Iterator[Tuple[str, pd.DataFrame]]:
+        """
+        Builds the output tables by blocks of packings, so they can be written to disk while they are built.
+
+        Only one block of each output table is held in memory at a time. The concatenation of the chunks of a table
+        equals the table built by build_output(). Only the run_stats and infeasibility_triage tables are yielded if the
+        solution is not optimal.
+
+        Parameters
+        ----------
+        packings_per_chunk : int
+            Number of packings (each one with all its periods) in each chunk.
+
+        Yields
+        ------
+        table, chunk_df : tuple of (str, pd.DataFrame)
+            The output table name and a block of its rows.
+        """
+        yield 'run_stats', self.run_stats_df
+        yield 'infeasibility_triage', self.triage_df
+        if self.solution_model.mdl.status != pulp.LpStatusOptimal:
+            return
+        # group the solution values by packing, so that the dataframes of each block are built from its values only
+        vars_by_packing = {var_name: defaultdict(list) for var_name in ('x', 'w', 'yp', 'yg')}
+        for var_name, packing_values in vars_by_packing.items():
+            for value in self.opt_sol['vars'][var_name]:
+                packing_values[value[0]].append(value)
+        demand_packing = self.dat_in.dat.demand_packing
+        demand_rows = demand_packing.groupby('Packing ID').indices
+        packings = sorted(self.dat_in.I)
+        for first in range(0, len(packings), packings_per_chunk):
+            block = packings[first:first + packings_per_chunk]
+            block_vars = {var_name: [value for i in block for value in packing_values[i]]
+                          for var_name, packing_values in vars_by_packing.items()}
+            block_demand = demand_packing.iloc[[row for i in block for row in demand_rows.get(i, ())]]
+            pet_gourmet_df, patas_pack_df = self._build_tables(*self._solution_frames(block_vars, block_demand))
+            yield 'pet_gourmet', pet_gourmet_df
+            yield 'patas_pack', patas_pack_df
 
     def build_output(self) -> output_schema.PanDat:
         """
@@ -235,9 +347,11 @@ class DatOut:
             A PanDat object from ticdat package, accordingly to the schemas.output_schema, that contains all output
             tables as attributes.
         """
-        print('Building output dat...')
+        logger.info('Building output dat...')
         sln = output_schema.PanDat()
         sln.pet_gourmet = self.pet_gourmet_df
         sln.patas_pack = self.patas_pack_df
+        sln.run_stats = self.run_stats_df
+        sln.infeasibility_triage = self.triage_df
 
         return sln
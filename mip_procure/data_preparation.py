@@ -46,6 +46,14 @@ def data_integrity_checks4(dat):
     return
 
 
+# tables read by each integrity check, so that a check only needs to run again when one of its tables changes
+integrity_checks_tables = {
+    data_integrity_checks: ('demand_packing', 'packing'),
+    data_integrity_checks2: ('inventory', 'packing'),
+    data_integrity_checks3: ('items_aging', 'packing'),
+    data_integrity_checks4: ('distribution', 'packing')}
+
+
 def all_integrity_checks(dat):
     data_integrity_checks(dat)
     data_integrity_checks2(dat)
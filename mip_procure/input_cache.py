@@ -0,0 +1,167 @@
+"""
+Contains the local binary cache of parsed input files, which skips the parse of an unchanged workbook.
+
+Parsing a large xlsx workbook with input_schema.xls.create_pan_dat() can take longer than the solve. read_pan_dat()
+stores the parsed tables in a cache directory (one Feather file per table if pyarrow is installed, a pickle file
+otherwise), and loads them back while the file path, size, modification time and schema version stay the same.
+"""
+import hashlib
+import json
+import logging
+import os
+import pickle
+import shutil
+import tempfile
+
+import pandas as pd
+from ticdat import PanDatFactory
+
+from mip_procure.schemas import input_schema
+
+try:
+    import pyarrow
+except ImportError:  # the tables are pickled without pyarrow
+    pyarrow = None
+
+logger = logging.getLogger(__name__)
+
+# Bumped whenever the layout of the cache entries changes, so that old entries are parsed again.
+CACHE_FORMAT_VERSION = 1
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'mip_procure')
+
+# File extensions read by read_pan_dat(), and the ticdat reader of each one. Other paths are csv directories.
+_READERS = {'.xlsx': 'xls', '.xls': 'xls', '.json': 'json'}
+CACHED_EXTENSIONS = tuple(_READERS)
+
+
+def schema_version(schema: PanDatFactory) -> str:
+    """
+    Fingerprints the tables, fields, data types, foreign keys, defaults and parameters of a schema, so that the
+    cache entries parsed under another version of the schema are not reused.
+    """
+    return hashlib.sha256(repr(_canonical(schema.schema(include_ancillary_info=True))).encode()).hexdigest()
+
+
+def _canonical(value):
+    """
+    Converts a nested structure of dicts, sets and sequences to nested lists in a deterministic order.
+    """
+    if isinstance(value, dict):
+        return sorted((repr(key), _canonical(item)) for key, item in value.items())
+    if isinstance(value, (set, frozenset)):
+        return sorted(repr(_canonical(item)) for item in value)
+    if isinstance(value, (list, tuple)) and not hasattr(value, '_fields'):
+        return [_canonical(item) for item in value]
+    return repr(value)
+
+
+def _file_signature(path: str) -> dict:
+    """
+    Gets the size and modification time of a file, or the sums of the ones of the files of a csv directory.
+    """
+    if os.path.isdir(path):
+        stats = [os.stat(os.path.join(path, name)) for name in sorted(os.listdir(path))
+                 if os.path.isfile(os.path.join(path, name))]
+    else:
+        stats = [os.stat(path)]
+    return {'size': sum(stat.st_size for stat in stats), 'mtime_ns': max((stat.st_mtime_ns for stat in stats),
+                                                                         default=0)}
+
+
+def _parse(path: str, schema: PanDatFactory):
+    reader = _READERS.get(os.path.splitext(path)[1].lower(), 'csv')
+    return getattr(schema, reader).create_pan_dat(path)
+
+
+def read_pan_dat(path: str, schema: PanDatFactory = input_schema, cache_dir: str = DEFAULT_CACHE_DIR,
+                 use_cache: bool = True):
+    """
+    Reads an xlsx/xls/json file or a csv directory into a PanDat object, through the local cache of parsed files.
+
+    The cache entry of a file is keyed by its absolute path, and it is valid while the file size, modification time,
+    schema version and CACHE_FORMAT_VERSION stay the same. Otherwise, the file is parsed by ticdat and the entry is
+    overwritten.
+
+    Parameters
+    ----------
+    path : str
+        The input file, or the directory of csv files.
+    schema : PanDatFactory
+        The schema of the input data.
+    cache_dir : str
+        The directory holding the cache entries (one sub-directory per input file). Defaults to
+        ~/.cache/mip_procure.
+    use_cache : bool
+        If False, the file is always parsed and the cache is neither read nor written.
+
+    Returns
+    -------
+    dat : PanDat
+        A PanDat object of the given schema.
+    """
+    if not use_cache:
+        return _parse(path, schema)
+    entry_dir = os.path.join(cache_dir, hashlib.sha256(os.path.abspath(path).encode()).hexdigest()[:32])
+    metadata = {'path': os.path.abspath(path), **_file_signature(path), 'schema_version': schema_version(schema),
+                'cache_format_version': CACHE_FORMAT_VERSION}
+    dat = _load_entry(entry_dir, metadata, schema)
+    if dat is not None:
+        logger.info('Read %s from the input cache', path)
+        return dat
+    logger.info('Parsing %s (not in the input cache)...', path)
+    dat = _parse(path, schema)
+    try:
+        _store_entry(entry_dir, metadata, dat, schema)
+    except OSError as error:  # e.g. read-only cache directory: the cache is only an accelerator
+        logger.warning('Could not write the input cache entry of %s: %s', path, error)
+    return dat
+
+
+def _load_entry(entry_dir: str, metadata: dict, schema: PanDatFactory):
+    """
+    Loads the PanDat object of a cache entry, or returns None if the entry is missing, stale or unreadable.
+    """
+    try:
+        with open(os.path.join(entry_dir, 'metadata.json')) as file:
+            if json.load(file) != metadata:
+                return None
+        tables = {}
+        for table in schema.all_tables:
+            table_path = os.path.join(entry_dir, table)
+            if os.path.exists(f'{table_path}.feather'):
+                tables[table] = pd.read_feather(f'{table_path}.feather')
+            else:
+                with open(f'{table_path}.pkl', 'rb') as file:
+                    tables[table] = pickle.load(file)
+    except (OSError, ValueError, pickle.UnpicklingError) as error:
+        logger.debug('Ignoring the input cache entry %s: %s', entry_dir, error)
+        return None
+    return schema.PanDat(**tables)
+
+
+def _store_entry(entry_dir: str, metadata: dict, dat, schema: PanDatFactory) -> None:
+    """
+    Writes a cache entry to a temporary directory, then moves it in place of the previous entry of the same file.
+    """
+    os.makedirs(os.path.dirname(entry_dir), exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=os.path.dirname(entry_dir))
+    try:
+        for table in schema.all_tables:
+            table_df = getattr(dat, table).reset_index(drop=True)
+            table_path = os.path.join(tmp_dir, table)
+            if pyarrow is not None:
+                try:
+                    table_df.to_feather(f'{table_path}.feather')
+                    continue
+                except (pyarrow.ArrowException, TypeError, ValueError):  # e.g. mixed types in an object column
+                    if os.path.exists(f'{table_path}.feather'):
+                        os.remove(f'{table_path}.feather')
+            with open(f'{table_path}.pkl', 'wb') as file:
+                pickle.dump(table_df, file, protocol=pickle.HIGHEST_PROTOCOL)
+        with open(os.path.join(tmp_dir, 'metadata.json'), 'w') as file:
+            json.dump(metadata, file)
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        os.replace(tmp_dir, entry_dir)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
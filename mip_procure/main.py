@@ -1,15 +1,78 @@
+import logging
+import os
+import time
+import pulp
+from typing import Callable, Dict, Union
+from mip_procure.aggregation import solve_aggregated
 from mip_procure.data_bridge import DatIn, DatOut
+from mip_procure.model_size import estimate_model_size
 from mip_procure.opt_model import OptModel
+from mip_procure.rolling_horizon import max_periods_per_window, solve_rolling_horizon
 from mip_procure.schemas import input_schema, output_schema
+from mip_procure.utils import ModelTooLargeError, configure_logging
+from mip_procure.validation import ValidationCache
 
+# Solver parameters used when an oversized model is solved in "heuristic" mode (rolling horizon windows, see
+# rolling_horizon.py) or "aggregate" mode (see aggregation.py). They apply to each solve (e.g., each window).
+HEURISTIC_PARAMETERS = {'MIPGap': 0.05, 'TimeLimit': 600}
+OVERSIZE_MODES = ('reject', 'heuristic', 'aggregate')
 
-def solve(dat: input_schema.PanDat) -> output_schema.PanDat:
-    dat_in = DatIn(dat, verbose=True)
-    opt_model = OptModel(dat_in, model_name='Mip_Procure')
-    opt_model.build_base_model()
-    opt_model.transporting_cost_complexity()
-    opt_model.optimize()
-    opt_model.mdl.writeLP('lp.lp') # It is very useful in infeasible solutions debug.
+logger = logging.getLogger(__name__)
+
+
+def solve(dat: input_schema.PanDat, discount: bool = False, validation_cache: ValidationCache = None,
+          incumbent_callback: Callable = None, size_limits: Dict[str, float] = None,
+          oversize_mode: str = 'reject', compact_names: bool = False, log_level: Union[int, str] = None,
+          verbose: bool = False, triage: bool = True, debug_lp_path: str = 'lp.lp') -> output_schema.PanDat:
+    if log_level is not None:
+        configure_logging(log_level)
+    if oversize_mode not in OVERSIZE_MODES:
+        raise ValueError(f'Unknown oversize mode {repr(oversize_mode)}. Use one of {list(OVERSIZE_MODES)}.')
+    size_estimate = estimate_model_size(dat, discount=discount)
+    logger.info('Estimated model size: %s', size_estimate)
+    exceeded_limits = size_estimate.exceeded_limits(size_limits)
+    if exceeded_limits and oversize_mode == 'reject':
+        raise ModelTooLargeError(f'Model exceeds the size limits: {", ".join(exceeded_limits)}')
+    if exceeded_limits:
+        logger.warning('Model exceeds the size limits (%s), solving in %s mode', ', '.join(exceeded_limits),
+                       oversize_mode)
+    start = time.perf_counter()
+    dat_in = DatIn(dat, verbose=verbose, validation_cache=validation_cache)
+    input_time = time.perf_counter() - start
+    if exceeded_limits and oversize_mode == 'aggregate':
+        # cluster the packings so that the aggregated model fits the limits (sizes grow linearly with packings)
+        num_clusters = max(1, int(size_estimate.num_packings * size_estimate.fraction_within_limits(size_limits)))
+        # and repair its plan by windows of periods whose per-packing models fit the limits
+        periods_per_window = max_periods_per_window(dat, size_limits, discount=discount)
+        opt_model = solve_aggregated(dat, num_clusters, discount=discount, solver_parameters=HEURISTIC_PARAMETERS,
+                                     compact_names=compact_names, dat_in=dat_in,
+                                     periods_per_window=periods_per_window)
+    elif exceeded_limits:
+        # solve windows of consecutive periods whose models fit the limits, instead of the full model
+        if incumbent_callback is not None:
+            logger.warning('The incumbent callback is not called in heuristic mode')
+        periods_per_window = max_periods_per_window(dat, size_limits, discount=discount)
+        opt_model = solve_rolling_horizon(dat, periods_per_window, discount=discount,
+                                          solver_parameters=HEURISTIC_PARAMETERS, compact_names=compact_names,
+                                          dat_in=dat_in)
+    else:
+        opt_model = OptModel(dat_in, model_name='Mip_Procure', compact_names=compact_names)
+        opt_model.build_base_model()
+        opt_model.transporting_cost_complexity()
+        if discount:
+            opt_model.discount_complexity()
+        if incumbent_callback is None:
+            opt_model.optimize()
+        else:
+            opt_model.optimize_anytime(incumbent_callback)
+    opt_model.run_stats['Input Time (s)'] = input_time
+    if opt_model.mdl.status == pulp.LpStatusInfeasible:
+        if debug_lp_path is not None:  # None disables the debug files
+            opt_model.mdl.writeLP(debug_lp_path) # It is very useful in infeasible solutions debug.
+            if compact_names:  # maps the names in the LP file to families and keys (e.g., lp_names.csv)
+                opt_model.name_lookup().to_csv(f'{os.path.splitext(debug_lp_path)[0]}_names.csv', index=False)
+        if triage:
+            opt_model.triage_infeasibility()  # reported in the infeasibility_triage output table
     dat_out = DatOut(opt_model)
     sln = dat_out.build_output()
     return sln
\ No newline at end of file
@@ -1,18 +1,46 @@
 """
 Contains the class that builds and solves the optimization model.
 """
+import numpy as np
 import pulp
+import pandas as pd
 from pulp import lpSum
 import itertools
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import re
+import signal
+import tempfile
 import time
-from typing import Dict
+from typing import Callable, Dict, List
+from mip_procure.data_bridge import DatOut
+from mip_procure.schemas import output_schema
+
+logger = logging.getLogger(__name__)
+
+# gurobi-like parameter names accepted by OptModel.set_model_parameters, and the matching pulp solver arguments
+SOLVER_PARAMETERS = {'TimeLimit': 'timeLimit', 'MIPGap': 'gapRel', 'Threads': 'threads'}
+
+# fraction of the "TimeLimit" parameter above which a run is flagged as close to its time budget
+TIME_BUDGET_WARNING = 0.8
+
+# constraint families that can be generated lazily (see OptModel.optimize_lazy()), and the violation tolerance
+LAZY_FAMILIES = ('C6', 'C9')
+LAZY_TOLERANCE = 1e-6
+
+# constraint families relaxed by OptModel.triage_infeasibility(), and the tolerance above which a slack is a violation
+ELASTIC_FAMILIES = ('C1a', 'C1b', 'C2a', 'C2b', 'C3', 'C5', 'C6')
+ELASTIC_TOLERANCE = 1e-6
 
 
 class OptModel:
     """
     Builds and solves the optimization model.
     """
-    def __init__(self, dat_in, model_name: str) -> None:
+    def __init__(self, dat_in, model_name: str, compact_names: bool = False) -> None:
         """
         Initializes the optimization model and placeholders for future useful data.
 
@@ -25,6 +53,10 @@ class OptModel:
             A DatIn instance containing the input data (see data_bridge.py).
         model_name : str
             A name for the gurobi model. It cannot contain whitespaces!
+        compact_names : bool
+            If True, rows and columns get short numeric names ('r0', 'r1', ..., 'c0', 'c1', ...) instead of
+            descriptive ones (e.g., 'C4a_3_Pack_A'), which makes the model faster to build and the LP/MPS files
+            smaller. The names are mapped back to their family, packing and period by name_lookup().
         """
         # read input parameters
         self.model_name = model_name
@@ -36,16 +68,35 @@ class OptModel:
         # initialize placeholders
         self.sol = None
         self.vars = {}
+        self.constrs = {}  # dict {constraint family: {key: constraint}}, for the rows that are modified in place
+        self.solver_params = {}  # pulp solver arguments, populated in set_model_parameters() method
+        self.portfolio_result = None  # summary of the last optimize_portfolio() race
+        self.run_stats = {}  # dict {statistic: value}, with the build and solve telemetry (see DatOut.run_stats_df)
+        self.compact_names = compact_names
+        # dicts {'Family' | 'Packing ID' | 'Period ID': list of values by row/column number}, populated in
+        # compact_names mode (stored by field instead of by row to keep them small)
+        self.row_index = {'Family': [], 'Packing ID': [], 'Period ID': []}
+        self.column_index = {'Family': [], 'Packing ID': [], 'Period ID': []}
+        self.lazy_constraints = False  # whether the LAZY_FAMILIES rows are added on demand (see optimize_lazy())
+        self.lazy_rows = {family: set() for family in LAZY_FAMILIES}  # dict {family: (i, t) keys of added rows}
+        self.triage_df = None  # violations of the elastic model, populated in triage_infeasibility() method
 
         # Initialize the Object Function
         self.ObjFunction = pulp.LpAffineExpression()
 
-    def build_base_model(self) -> None:
+    def build_base_model(self, lazy_constraints: bool = False) -> None:
         """
         Build the base optimization model.
+
+        Parameters
+        ----------
+        lazy_constraints : bool
+            If True, the rows of LAZY_FAMILIES (C6 and C9) are left out of the model, and added only when violated
+            by optimize_lazy().
         """
         # Define the model
-        print('Building base optimization model...')
+        logger.info('Building base optimization model...')
+        self.lazy_constraints = lazy_constraints
         self._add_decision_variables()
         self._add_base_constraints()
         self._build_objective()
@@ -56,20 +107,15 @@ class OptModel:
         x_keys, yp_keys, yg_keys, wb_keys = dat_in.x_keys, dat_in.yp_keys, dat_in.yg_keys, dat_in.wb_keys
         w_keys, xb_keys = dat_in.w_keys, dat_in.xb_keys
 
-        t1 = time.perf_counter()
+        start = time.perf_counter()
         # create decision variables
 
-        yp = pulp.LpVariable.dicts(indices=yp_keys, cat=pulp.LpInteger, lowBound=0.0,
-                                   name='yp')  # Qty  in Patas Pack
-        yg = pulp.LpVariable.dicts(indices=yg_keys, cat=pulp.LpInteger, lowBound=0.0,
-                                   name='yg')  # Qty  in Pet Gourmet
-        x = pulp.LpVariable.dicts(indices=x_keys, cat=pulp.LpInteger, lowBound=0.0,
-                                  name='x')  # Qty of transporting packing
-        w = pulp.LpVariable.dicts(indices=w_keys, cat=pulp.LpInteger, lowBound=0.0,
-                                  name='w')  # Acquired quantity of packing
-        wb = pulp.LpVariable.dicts(indices=wb_keys, cat=pulp.LpBinary,
-                                   name='wb')  # Binary decision variable of acquisition
-        xb = pulp.LpVariable.dicts(indices=xb_keys, cat=pulp.LpBinary, name='xb')# Binary decision variable of transport
+        yp = self._add_variables('yp', yp_keys, cat=pulp.LpInteger, lowBound=0.0)  # Qty  in Patas Pack
+        yg = self._add_variables('yg', yg_keys, cat=pulp.LpInteger, lowBound=0.0)  # Qty  in Pet Gourmet
+        x = self._add_variables('x', x_keys, cat=pulp.LpInteger, lowBound=0.0)  # Qty of transporting packing
+        w = self._add_variables('w', w_keys, cat=pulp.LpInteger, lowBound=0.0)  # Acquired quantity of packing
+        wb = self._add_variables('wb', wb_keys, cat=pulp.LpBinary)  # Binary decision variable of acquisition
+        xb = self._add_variables('xb', xb_keys, cat=pulp.LpBinary)  # Binary decision variable of transport
 
         self.vars['x'] = x
         self.vars['yp'] = yp
@@ -77,8 +123,7 @@ class OptModel:
         self.vars['w'] = w
         self.vars['wb'] = wb
         self.vars['xb'] = xb
-        t2 = time.perf_counter()
-        print(f"ADDING DECISION VARS: {t2-t1:.4f} s")
+        self._record_build_time('Variables', start)
 
     def _add_base_constraints(self) -> None:
         """Add the constraints"""
@@ -95,77 +140,96 @@ class OptModel:
         d, ilg, ini_inventory, inven_cost = dat_in.d, dat_in.ilg, dat_in.ini_inventory, dat_in.inven_cost
         c, au, moq, params = dat_in.c, dat_in.au, dat_in.moq, dat_in.dat_params
 
-        t00 = time.perf_counter()
+        start = time.perf_counter()
         # C1) Inventory capacity:
         for t in T:
             # Patas Pack Inventory Capacity:
-            mdl.addConstraint(lpSum(yp[i, t] for i in I) <= params['InventoryCapacityPack'], name=f'C1a_{t}')
+            self._add_constraint(lpSum(yp[i, t] for i in I) <= params['InventoryCapacityPack'], 'C1a', period=t)
             # Pet Gourmet Inventory Capacity:
-            mdl.addConstraint(lpSum(yg[i, t] for i in I) <= params['InventoryCapacityGourmet'], name=f'C1b_{t}')
+            self._add_constraint(lpSum(yg[i, t] for i in I) <= params['InventoryCapacityGourmet'], 'C1b', period=t)
+        start = self._record_build_time('C1', start)
 
-        t1 = time.perf_counter()
-        print(f"ADDING C2: {t1 - t00:.4f} s")
         # C2) Minimum and maximum order quantity:
         for i in I:
             for t in T:
-                mdl.addConstraint(w[i, t] <= wb[i, t] * au[i, t], name=f'C2a_{t}_{i}')
-                mdl.addConstraint(w[i, t] >= wb[i, t] * moq[i, t], name=f'C2b_{t}_{i}')
+                self._add_constraint(w[i, t] <= wb[i, t] * au[i, t], 'C2a', packing=i, period=t)
+                self._add_constraint(w[i, t] >= wb[i, t] * moq[i, t], 'C2b', packing=i, period=t)
+        start = self._record_build_time('C2', start)
 
-        t2 = time.perf_counter()
-        print(f"ADDING C3: {t2-t1:.4f} s")
         # C3) Transporting limit by period:
         for t in T:
-            mdl.addConstraint(lpSum(x[i, t] for i in I) <= params['TransportingLimitByPeriod'], name=f'C3_{t}')
+            self._add_constraint(lpSum(x[i, t] for i in I) <= params['TransportingLimitByPeriod'], 'C3', period=t)
+        start = self._record_build_time('C3', start)
 
-        t3 = time.perf_counter()
-        print(f"ADDING C2: {t3-t2:.4f} s")
         # C4) Flow Balance constraint:
+        self.constrs['C4a'] = {}
         for t in T:
             for i in I:
-                mdl.addConstraint(yg[i, t] == yg[i, t - 1] + x[i, t] - d[i, t], name=f'C4a_{t}_{i}')
-                mdl.addConstraint(yp[i, t] == yp[i, t - 1] + w[i, t] - x[i, t], name=f'C4b_{t}_{i}')
-        
-        t4 = time.perf_counter()
-        print(f"ADDING C3: {t4-t3:.4f} s")
+                self.constrs['C4a'][i, t] = yg[i, t] == yg[i, t - 1] + x[i, t] - d[i, t]
+                self._add_constraint(self.constrs['C4a'][i, t], 'C4a', packing=i, period=t)
+                self._add_constraint(yp[i, t] == yp[i, t - 1] + w[i, t] - x[i, t], 'C4b', packing=i, period=t)
+        start = self._record_build_time('C4', start)
+
         # C5) Minimum Inventory constraint:
         for t in T:
             for i in I:
-                mdl.addConstraint(yg[i, t] >= ilg['Gourmet', i], name=f'C5_{t}_{i}')
+                self._add_constraint(yg[i, t] >= ilg['Gourmet', i], 'C5', packing=i, period=t)
+        start = self._record_build_time('C5', start)
 
-        t5 = time.perf_counter()
-        print(f"ADDING C4: {t5-t4:.4f} s")
         # C6) Maximum time in Patas Pack constraint:
-        for t in T:
-            if t <= max(T) - params['MaxTimePackingPack']:
-                for i in I:
-                    mdl.addConstraint(
-                        lpSum(x[i, t + l] for l in range(1, int(params['MaxTimePackingPack']) + 1)) >= yp[i, t],
-                        name=f'C6_{t}_{i}')
-
-        t6 = time.perf_counter()
-        print(f"ADDING C5: {t6-t5:.4f} s")
+        if not self.lazy_constraints:
+            for t in T:
+                if t <= max(T) - params['MaxTimePackingPack']:
+                    for i in I:
+                        self._add_c6(i, t)
+        start = self._record_build_time('C6', start)
+
         # C7) Initial Inventory Constraint:
         for i in I:
-            mdl.addConstraint(yp[i, first_period - 1] == ini_inventory['Pack', i], name=f'C7a_{i}')
-            mdl.addConstraint(yg[i, first_period - 1] == ini_inventory['Gourmet', i], name=f'C7b_{i}')
-        
-        t6 = time.perf_counter()
-        print(f"ADDING C6: {t6-t5:.4f} s")
+            self._add_constraint(yp[i, first_period - 1] == ini_inventory['Pack', i], 'C7a', packing=i)
+            self._add_constraint(yg[i, first_period - 1] == ini_inventory['Gourmet', i], 'C7b', packing=i)
+        start = self._record_build_time('C7', start)
+
         # C8) Maximum number of different packing types that can be transferred:
         for t in T:
-            mdl.addConstraint(lpSum(xb[i, t] for i in I) <= params['DiversityTransportingPacking'])
+            self._add_constraint(lpSum(xb[i, t] for i in I) <= params['DiversityTransportingPacking'], 'C8', period=t)
+        start = self._record_build_time('C8', start)
 
-        t7 = time.perf_counter()
-        print(f"ADDING C7: {t7-t6:.4f} s")
         # C9) Maximum transfer quantity for each packing:
-        for i in I:
-            for t in T:
-                mdl.addConstraint(x[i, t] <= xb[i, t] * params['TransportingLimitByPeriod'])
+        if not self.lazy_constraints:
+            for i in I:
+                for t in T:
+                    self._add_c9(i, t)
+        self._record_build_time('C9', start)
+
+    def _add_c6(self, i, t) -> None:
+        """Add the maximum time in Patas Pack constraint (C6) of packing i and period t."""
+        x, yp, params = self.vars['x'], self.vars['yp'], self.dat_in.dat_params
+        self._add_constraint(lpSum(x[i, t + l] for l in range(1, int(params['MaxTimePackingPack']) + 1)) >= yp[i, t],
+                             'C6', packing=i, period=t)
 
-        t8 = time.perf_counter()
-        print(f"ADDING C9: {t8-t7:.4f} s")
+    def add_carried_c6(self, carried_yp: Dict[tuple, float]) -> None:
+        """
+        Adds the C6 rows of periods before the first period of the model, whose Patas Pack inventory (carried from
+        the model of the previous periods, see rolling_horizon.py) must still be transferred within the
+        MaxTimePackingPack periods that follow them.
 
+        Parameters
+        ----------
+        carried_yp : dict
+            Dictionary {(i, t): Patas Pack final inventory of packing i at period t}, for periods t before the first
+            period of the model.
+        """
+        x, T = self.vars['x'], self.dat_in.T
+        max_time = int(self.dat_in.dat_params['MaxTimePackingPack'])
+        for (i, t), inventory in carried_yp.items():
+            self._add_constraint(lpSum(x[i, t + l] for l in range(1, max_time + 1) if t + l in T) >= inventory,
+                                 'C6', packing=i, period=t)
 
+    def _add_c9(self, i, t) -> None:
+        """Add the maximum transfer quantity constraint (C9) of packing i and period t."""
+        x, xb, params = self.vars['x'], self.vars['xb'], self.dat_in.dat_params
+        self._add_constraint(x[i, t] <= xb[i, t] * params['TransportingLimitByPeriod'], 'C9', packing=i, period=t)
 
     def _build_objective(self) -> None:
         """
@@ -179,10 +243,11 @@ class OptModel:
 
         # Trocar os conjuntos pelas keys deixa o código mais ROBUSTO!
         # Objective function
-
+        start = time.perf_counter()
         self.ObjFunction += lpSum(c[i] * w[i, t] for i in I for t in T) +\
         lpSum(inven_cost['Pack', i] * yp[i, t] for i in I for t in T) +\
         lpSum(inven_cost['Gourmet', i] * yg[i, t] for i in I for t in T)
+        self._record_build_time('Objective', start)
 
         # mdl.setObjective(
         #    lpSum(c[i] * w[i, t] for i in I for t in T) +
@@ -196,72 +261,444 @@ class OptModel:
         I, T = dat_in.I, dat_in.T
         n_keys = [t for t in T]
         params = dat_in.dat_params
+        start = time.perf_counter()
 
         # New Variable due the complexity
-        n = pulp.LpVariable.dicts(indices=n_keys, cat=pulp.LpInteger, lowBound=0.0,
-                                  name='n')  # Qty of trucks
+        n = self._add_variables('n', n_keys, cat=pulp.LpInteger, lowBound=0.0)  # Qty of trucks
 
         # New constraints
         for t in T:
-            mdl.addConstraint(n[t] >= lpSum(x[i, t]*(1/params['TruckCapacity']) for i in I), name=f'newC1a_{t}')
-            mdl.addConstraint(n[t] <= lpSum(x[i, t]*(1/params['TruckCapacity']) for i in I) + 1, name=f'newC1b_{t}')
+            self._add_constraint(n[t] >= lpSum(x[i, t]*(1/params['TruckCapacity']) for i in I), 'newC1a',
+                                 period=t)
+            self._add_constraint(n[t] <= lpSum(x[i, t]*(1/params['TruckCapacity']) for i in I) + 1, 'newC1b',
+                                 period=t)
         self.vars['n'] = n
 
         # Update of the Objective Function
-        self.ObjFunction += lpSum(n)*350
+        self.ObjFunction += lpSum(n) * params['CostByTruck']
+        self._record_build_time('Transporting Cost', start)
 
         return
 
-    def discount_complexity(self):
+    def discount_complexity(self) -> None:
+        """
+        Add the volume discount: an order of at least DiscountLimit units gets PercentualDiscount off its whole cost.
+
+        Each order w[i, t] is split into a discounted part wd[i, t] and a regular part (w[i, t] - wd[i, t]). The
+        binary dc[i, t] selects the discounted price segment and (wb[i, t] - dc[i, t]) the regular one, and each part
+        carries the order bounds of its own segment. Hence, the formulation is linear and, for every order, its LP
+        relaxation is the convex hull of the two price segments.
+        """
         mdl, dat_in = self.mdl, self.dat_in
-        w = self.vars['w']
-        c = dat_in.c
+        w, wb = self.vars['w'], self.vars['wb']
         I, T = dat_in.I, dat_in.T
+        c, au, moq = dat_in.c, dat_in.au, dat_in.moq
         dc_keys = [(i, t) for i in I for t in T]
         params = dat_in.dat_params
+        discount_limit, discount = params['DiscountLimit'], params['PercentualDiscount']
+        start = time.perf_counter()
 
-        # New variable due the complexity
-        dc = pulp.LpVariable.dicts(indices=dc_keys, cat=pulp.LpBinary, name='dc')
+        # New variables due the complexity
+        wd = self._add_variables('wd', dc_keys, cat=pulp.LpContinuous,
+                                 lowBound=0.0)  # Acquired quantity at discounted price
+        dc = self._add_variables('dc', dc_keys, cat=pulp.LpBinary)  # Binary of discounted order
 
         # New constraints
         for i in I:
             for t in T:
-                mdl.addConstraint(dc[i, t]*w[i, t] >= w[i, t] - params['DiscountLimit'], name=f'disC1a_{i}_{t}')
-                mdl.addConstraint(dc[i, t]*(w[i, t] - params['DiscountLimit']) >= w[i,t] - params['DiscountLimit'],
-                                  name=f'discC1b_{i}_{t}')
+                self._add_constraint(dc[i, t] <= wb[i, t], 'disC1', packing=i, period=t)
+                # Regular segment: [Min Order Qty, min(DiscountLimit, Max Order Qty)]
+                self._add_constraint(w[i, t] - wd[i, t] >= (wb[i, t] - dc[i, t]) * moq[i, t], 'disC2a',
+                                     packing=i, period=t)
+                self._add_constraint(w[i, t] - wd[i, t] <= (wb[i, t] - dc[i, t]) * min(discount_limit, au[i, t]),
+                                     'disC2b', packing=i, period=t)
+                # Discounted segment: [max(DiscountLimit, Min Order Qty), Max Order Qty]
+                self._add_constraint(wd[i, t] >= dc[i, t] * max(discount_limit, moq[i, t]), 'disC3a', packing=i,
+                                     period=t)
+                self._add_constraint(wd[i, t] <= dc[i, t] * au[i, t], 'disC3b', packing=i, period=t)
+        self.vars['wd'] = wd
+        self.vars['dc'] = dc
+
+        # Update of the Objective Function
+        self.ObjFunction += lpSum(-discount * c[i] * wd[i, t] for i in I for t in T)
+        self._record_build_time('Discount', start)
+
+    def _add_variables(self, family: str, keys: list, **kwargs) -> dict:
+        """
+        Creates a family of decision variables, named after the family and their keys or, in compact_names mode,
+        numbered in self.column_index.
+
+        Parameters
+        ----------
+        family : str
+            The name of the family of variables (e.g., 'x').
+        keys : list
+            The keys of the variables: (packing, period) tuples or periods.
+        kwargs
+            Other arguments of pulp.LpVariable (cat, lowBound, upBound).
+
+        Returns
+        -------
+        variables : dict
+            Dictionary {key: pulp.LpVariable}.
+        """
+        if not self.compact_names:
+            return pulp.LpVariable.dicts(indices=keys, name=family, **kwargs)
+        first, column_index = len(self.column_index['Family']), self.column_index
+        column_index['Family'].extend(family for _ in keys)
+        column_index['Packing ID'].extend(key[0] if isinstance(key, tuple) else None for key in keys)
+        column_index['Period ID'].extend(key[1] if isinstance(key, tuple) else key for key in keys)
+        return {key: pulp.LpVariable(f'c{first + number}', **kwargs) for number, key in enumerate(keys)}
+
+    def _add_constraint(self, constraint: pulp.LpConstraint, family: str, packing=None, period=None) -> None:
+        """
+        Adds a constraint to the model, named after its family, period and packing (e.g., 'C4a_3_Pack_A') or, in
+        compact_names mode, numbered in self.row_index.
+        """
+        if self.compact_names:
+            name = f'r{len(self.row_index["Family"])}'
+            self.row_index['Family'].append(family)
+            self.row_index['Packing ID'].append(packing)
+            self.row_index['Period ID'].append(period)
+        else:
+            name = '_'.join(str(part) for part in (family, period, packing) if part is not None)
+        self.mdl.addConstraint(constraint, name=name)
 
-        self.ObjFunction += lpSum(-0.10*c[i]*w[i, t] for i in I for t in T)
+    def name_lookup(self) -> pd.DataFrame:
+        """
+        Maps the compact row and column names back to their family, packing and period (see compact_names).
+
+        Returns
+        -------
+        lookup_df : pd.DataFrame
+            Dataframe with the columns 'Name', 'Kind' ('Row' or 'Column'), 'Family', 'Packing ID' and 'Period ID'
+            ('Packing ID' or 'Period ID' is missing for the families that are not indexed by it).
+        """
+        rows_df = pd.DataFrame(self.row_index)
+        rows_df.insert(0, 'Name', [f'r{number}' for number in range(len(rows_df))])
+        rows_df.insert(1, 'Kind', 'Row')
+        columns_df = pd.DataFrame(self.column_index)
+        columns_df.insert(0, 'Name', [f'c{number}' for number in range(len(columns_df))])
+        columns_df.insert(1, 'Kind', 'Column')
+        lookup_df = pd.concat([rows_df, columns_df], ignore_index=True)
+        lookup_df['Period ID'] = lookup_df['Period ID'].astype('Int64')  # keep periods as int beside missing ones
+        return lookup_df
+
+    def _record_build_time(self, family: str, start: float) -> float:
+        """
+        Records in self.run_stats the time spent adding a family of variables or constraints since start.
+
+        Parameters
+        ----------
+        family : str
+            The name of the family of variables or constraints (e.g., 'C4').
+        start : float
+            The time.perf_counter() value when the family started to be added.
+
+        Returns
+        -------
+        end : float
+            The current time.perf_counter() value, to be used as the start of the next family.
+        """
+        end = time.perf_counter()
+        logger.debug('ADDING %s: %.4f s', family, end - start)
+        self.run_stats[f'Build Time {family} (s)'] = end - start
+        return end
 
     def set_model_parameters(self, parameters: Dict[str, float]) -> None:
         """
-        Set parameters to the gurobi model.
+        Set parameters to the solver.
 
-        Some common parameters are "TimeLimit" and "MIPGap".
+        The supported parameters are "TimeLimit" (seconds), "MIPGap" (relative gap) and "Threads" (see
+        SOLVER_PARAMETERS).
 
         Parameters
         ----------
         parameters : dict
-            Dictionary whose keys are names of gurobi model's parameters (str) and whose values are values for these
+            Dictionary whose keys are names of solver parameters (str) and whose values are values for these
             parameters.
         """
-        # Para o Pulp isso será diferente:
-        # for param, value in parameters.items():
-        #     setattr(self.mdl.params, param, value)
+        for param, value in parameters.items():
+            if param not in SOLVER_PARAMETERS:
+                raise ValueError(f'Unknown solver parameter {repr(param)}. Use one of {list(SOLVER_PARAMETERS)}.')
+            self.solver_params[SOLVER_PARAMETERS[param]] = value
 
-    def optimize(self) -> None:
+    def optimize(self, warm_start: bool = False) -> None:
         """
         Calls the optimizer, and populates the solution data (if any).
+
+        Parameters
+        ----------
+        warm_start : bool
+            If True, the current values of the decision variables (e.g., the previous solution) are passed to CBC
+            as an initial incumbent.
         """
-        print('Solving the optimization model...')
+        logger.info('Solving the optimization model...')
         mdl = self.mdl
         mdl.setObjective(self.ObjFunction)
-        mdl.solve()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            log_path = os.path.join(tmp_dir, 'cbc.log')
+            start = time.perf_counter()
+            mdl.solve(pulp.PULP_CBC_CMD(msg=False, logPath=log_path, warmStart=warm_start, **self.solver_params))
+            solve_time = time.perf_counter() - start
+            with open(log_path) as file:
+                solver_log = file.read()
+        logger.debug('CBC log:\n%s', solver_log)
+        self._collect_solution()
+        self._record_solve_stats(solve_time, cbc_best_bound(solver_log))
+
+    def optimize_lazy(self, max_iterations: int = 100) -> None:
+        """
+        Solves the model built with lazy_constraints=True by cutting planes: it solves the reduced model, adds the
+        rows of LAZY_FAMILIES (C6 and C9) violated by its solution, and re-solves until no row is violated.
+
+        The violations are checked with numpy arrays of the solution values. The loop stops early, without converging,
+        if the reduced model has no solution (then the full model has no solution either), if every violated row is
+        already in the model (so no row is added) or after max_iterations solves. The number
+        of iterations, the rows added by family and the size of the final model next to the size of the full build
+        are recorded in self.run_stats.
+
+        Parameters
+        ----------
+        max_iterations : int
+            Maximum number of solves.
+        """
+        if not self.lazy_constraints:
+            raise ValueError('optimize_lazy() requires a model built with build_base_model(lazy_constraints=True).')
+        dat_in, params = self.dat_in, self.dat_in.dat_params
+        I, T = sorted(dat_in.I), sorted(dat_in.T)
+        max_time, transporting_limit = int(params['MaxTimePackingPack']), params['TransportingLimitByPeriod']
+        num_c6_periods = max(0, len(T) - max_time)  # C6 applies to the periods t <= max(T) - MaxTimePackingPack
+
+        start, iteration, converged = time.perf_counter(), 0, False
+        while iteration < max_iterations:
+            iteration += 1
+            self.optimize()
+            if 'vars' not in self.sol:
+                break
+            x, xb, yp = (self._values_array(var_name, I, T) for var_name in ('x', 'xb', 'yp'))
+            # C9: x[i, t] <= xb[i, t] * TransportingLimitByPeriod
+            c9_violated = x > xb * transporting_limit + LAZY_TOLERANCE
+            # C6: x[i, t + 1] + ... + x[i, t + MaxTimePackingPack] >= yp[i, t]
+            cum_x = np.concatenate([np.zeros((len(I), 1)), np.cumsum(x, axis=1)], axis=1)
+            window_x = cum_x[:, max_time + 1:max_time + 1 + num_c6_periods] - cum_x[:, 1:1 + num_c6_periods]
+            c6_violated = window_x < yp[:, :num_c6_periods] - LAZY_TOLERANCE
+            violated = {'C6': [(I[k], T[p]) for k, p in zip(*np.nonzero(c6_violated))],
+                        'C9': [(I[k], T[p]) for k, p in zip(*np.nonzero(c9_violated))]}
+            logger.info('Lazy iteration %d: %d C6 and %d C9 rows violated', iteration, len(violated['C6']),
+                        len(violated['C9']))
+            if not violated['C6'] and not violated['C9']:
+                converged = True
+                break
+            num_added = 0
+            for family, add_row in (('C6', self._add_c6), ('C9', self._add_c9)):
+                for i, t in violated[family]:
+                    if (i, t) not in self.lazy_rows[family]:
+                        add_row(i, t)
+                        self.lazy_rows[family].add((i, t))
+                        num_added += 1
+            if not num_added:
+                # the violated rows are already in the model, so re-solving would return the same solution (e.g., an
+                # incumbent within the solver tolerances of a solve stopped by the time limit or the gap)
+                logger.warning('Lazy iteration %d: the violated rows are already in the model', iteration)
+                break
+
+        stats = self.run_stats
+        stats['Lazy Iterations'] = iteration
+        stats['Lazy Converged'] = int(converged)
+        stats['Lazy Time (s)'] = time.perf_counter() - start
+        stats['Lazy Rows C6'] = len(self.lazy_rows['C6'])
+        stats['Lazy Rows C9'] = len(self.lazy_rows['C9'])
+        stats['Rows'] = self.mdl.numConstraints()
+        stats['Full Model Rows'] = stats['Rows'] + len(I) * (num_c6_periods + len(T)) - \
+            stats['Lazy Rows C6'] - stats['Lazy Rows C9']
+        logger.info('Lazy constraints %s after %d iterations with %d rows (%d in the full model)',
+                    'converged' if converged else 'stopped', iteration, stats['Rows'], stats['Full Model Rows'])
+
+    def _values_array(self, var_name: str, I: list, T: list) -> np.ndarray:
+        """
+        Returns the values of the variables self.vars[var_name][i, t] as an array of shape (len(I), len(T)).
+        """
+        variables = self.vars[var_name]
+        return np.array([[variables[i, t].varValue or 0.0 for t in T] for i in I], dtype=float).reshape(len(I), len(T))
+
+    def optimize_anytime(self, incumbent_callback: Callable = None, output_dir: str = None,
+                         first_time_slice: float = 5.0, time_limit: float = None) -> None:
+        """
+        Solves the model in time slices of growing length, reporting every improving incumbent as soon as it is found.
+
+        CBC is called with a time limit that starts at first_time_slice and doubles at every call, each call being
+        warm started with the best incumbent so far. Whenever a call improves on the incumbent, the solution is
+        converted into the output tables through DatOut and passed to incumbent_callback and/or written to
+        output_dir. The loop stops when CBC proves optimality (or infeasibility), when time_limit is reached, or on a
+        KeyboardInterrupt. In any case, the best incumbent found is kept in self.sol, and the best bound recorded in
+        self.run_stats is the highest bound proved by any of the calls (a restarted call may prove a lower one).
 
+        Parameters
+        ----------
+        incumbent_callback : callable, optional
+            Function called as incumbent_callback(incumbent_number, objective_value, sln) for every improving
+            incumbent, where sln is an output_schema.PanDat object.
+        output_dir : str, optional
+            If given, every improving incumbent is written as csv files into output_dir/incumbent_<number>.
+        first_time_slice : float
+            Time limit, in seconds, of the first call to CBC.
+        time_limit : float, optional
+            Overall time limit, in seconds.
+        """
+        logger.info('Solving the optimization model in anytime mode...')
+        mdl = self.mdl
+        mdl.setObjective(self.ObjFunction)
+        solver_params = {param: value for param, value in self.solver_params.items() if param != 'timeLimit'}
+        time_limit = time_limit or self.solver_params.get('timeLimit')
+        feasible_sol_status = (pulp.LpSolutionOptimal, pulp.LpSolutionIntegerFeasible)
+
+        start = time.perf_counter()
+        time_slice, best_obj, best_values, num_incumbents = first_time_slice, None, None, 0
+        best_bound, tmp_dir = None, tempfile.TemporaryDirectory()
+        log_path = os.path.join(tmp_dir.name, 'cbc.log')
+        try:
+            while True:
+                if time_limit is not None:
+                    time_slice = min(time_slice, time_limit - (time.perf_counter() - start))
+                mdl.solve(pulp.PULP_CBC_CMD(msg=False, logPath=log_path, warmStart=best_values is not None,
+                                            timeLimit=time_slice, **solver_params))
+                with open(log_path) as file:
+                    slice_bound = cbc_best_bound(file.read())
+                # every slice solves the same model, so the bound proved by any of them holds: keep the highest one
+                if slice_bound is not None and (best_bound is None or slice_bound > best_bound):
+                    best_bound = slice_bound
+                if mdl.sol_status in feasible_sol_status and (best_obj is None or
+                                                              mdl.objective.value() < best_obj - 1e-6):
+                    best_obj = mdl.objective.value()
+                    best_values = {var.name: var.varValue for var in mdl.variables()}
+                    num_incumbents += 1
+                    logger.info('Incumbent %d found after %.4f s: %s', num_incumbents, time.perf_counter() - start,
+                                best_obj)
+                    self._report_incumbent(num_incumbents, incumbent_callback, output_dir)
+                if mdl.sol_status == pulp.LpSolutionOptimal or mdl.status == pulp.LpStatusInfeasible:
+                    break
+                if time_limit is not None and time.perf_counter() - start >= time_limit:
+                    break
+                time_slice *= 2
+        except KeyboardInterrupt:
+            logger.warning('Anytime solve interrupted. Keeping the best incumbent found.')
+        finally:
+            tmp_dir.cleanup()
+
+        if best_values is not None and (mdl.sol_status not in feasible_sol_status or
+                                        mdl.objective.value() > best_obj + 1e-6):
+            # the last call didn't return the incumbent (e.g., it was interrupted, or found a worse solution only):
+            # restore it
+            mdl.assignVarsVals(best_values)
+            mdl.assignStatus(pulp.LpStatusOptimal, pulp.LpSolutionIntegerFeasible)
+        self._collect_solution()
+        self._record_solve_stats(time.perf_counter() - start, best_bound)
+
+    def _report_incumbent(self, incumbent_number: int, incumbent_callback: Callable = None,
+                          output_dir: str = None) -> None:
+        """
+        Converts the current solution of the model into the output tables and reports them.
+        """
+        self._collect_solution()
+        if incumbent_callback is None and output_dir is None:
+            return
+        sln = DatOut(self).build_output()
+        if incumbent_callback is not None:
+            incumbent_callback(incumbent_number, self.sol['obj_val'], sln)
+        if output_dir is not None:
+            os.makedirs(output_dir, exist_ok=True)
+            output_schema.csv.write_directory(sln, os.path.join(output_dir, f'incumbent_{incumbent_number}'))
+
+    def optimize_portfolio(self, configurations: List[dict] = None, history_path: str = None) -> None:
+        """
+        Races several solver configurations in parallel processes and keeps the solution of the first to finish.
+
+        Each configuration solves a copy of the model in its own process. The first configuration that proves
+        optimality (within the "MIPGap" parameter, if set) wins: its solution is loaded into this model and the other
+        processes are cancelled. If no configuration proves optimality (e.g., all of them hit the "TimeLimit"), the
+        best solution found is kept. The race is summarized in self.portfolio_result and, if history_path is given,
+        appended to that history file (see portfolio_history_summary()).
+
+        Parameters
+        ----------
+        configurations : list of dict, optional
+            Each configuration is a dictionary with the keys 'name' (str), 'solver' (a pulp solver name, as in
+            pulp.listSolvers()) and, optionally, 'options' (dict of keyword arguments for that solver). Defaults to
+            default_portfolio().
+        history_path : str, optional
+            Path of a JSON lines file where the result of the race is appended.
+        """
+        configurations = configurations or default_portfolio()
+        logger.info('Solving the optimization model with a portfolio of %d configurations...', len(configurations))
+        mdl = self.mdl
+        mdl.setObjective(self.ObjFunction)
+        mdl_dict = mdl.to_dict()
+
+        start = time.perf_counter()
+        context = multiprocessing.get_context()
+        results_queue = context.Queue()
+        processes = [context.Process(target=_solve_configuration,
+                                     args=(mdl_dict, configuration, self.solver_params, results_queue), daemon=True)
+                     for configuration in configurations]
+        for process in processes:
+            process.start()
+
+        results, winner = [], None
+        while len(results) < len(processes):
+            try:
+                result = results_queue.get(timeout=1.0)
+            except queue.Empty:
+                if not any(process.is_alive() for process in processes) and results_queue.empty():
+                    break  # some process died without reporting
+                continue
+            results.append(result)
+            logger.info('Configuration %r finished in %.4f s: %s', result['name'], result['time'],
+                        pulp.LpStatus[result['status']])
+            if result['status'] == pulp.LpStatusOptimal and result['sol_status'] == pulp.LpSolutionOptimal:
+                winner = result
+                break
+        _cancel_processes(processes)
+
+        if winner is None:  # nobody proved optimality: keep the best solution found, if any
+            feasible_results = [result for result in results if result['objective'] is not None and
+                                result['sol_status'] in (pulp.LpSolutionOptimal, pulp.LpSolutionIntegerFeasible)]
+            winner = min(feasible_results, key=lambda result: result['objective'], default=None)
+        if winner is None and results:
+            winner = results[0]
+        if winner is None:
+            raise RuntimeError('No configuration of the portfolio returned a result.')
+
+        mdl.assignVarsVals(winner['values'])
+        mdl.assignStatus(winner['status'], winner['sol_status'])
+        logger.info('Configuration %r won the race.', winner['name'])
+        self.portfolio_result = {
+            'winner': winner['name'],
+            'winner_time': winner['time'],
+            'total_time': time.perf_counter() - start,
+            'status': pulp.LpStatus[winner['status']],
+            'finished': {result['name']: result['time'] for result in results},
+            'configurations': [configuration['name'] for configuration in configurations],
+        }
+        if history_path:
+            history_entry = dict(self.portfolio_result, timestamp=time.time(), model_name=self.model_name,
+                                 num_variables=mdl.numVariables(), num_constraints=mdl.numConstraints())
+            with open(history_path, 'a') as file:
+                file.write(json.dumps(history_entry) + '\n')
+        self._collect_solution()
+        self._record_solve_stats(self.portfolio_result['total_time'])
+        self.run_stats['Portfolio Winner'] = winner['name']
+
+    def _collect_solution(self) -> None:
+        """
+        Populates self.sol from the status and the variables values of the solved model.
+        """
+        mdl = self.mdl
         # print status
         status = mdl.status
         status_str = pulp.LpStatus[status]
 
-        print(f"Model status: {status_str}")
+        logger.info('Model status: %s', status_str)
 
         # build solution
         if status == pulp.LpStatusOptimal:
@@ -283,9 +720,287 @@ class OptModel:
 
             self.sol = {
                 'status': status,
+                'sol_status': mdl.sol_status,  # LpSolutionIntegerFeasible if the solve stopped before optimality
                 'obj_val': self.mdl.objective.value(),
                 'vars': {'x': x_sol, 'yp': yp_sol, 'yg': yg_sol, 'w': w_sol}
             }
 
         else:
             self.sol = {'status': status}
+
+    def _record_solve_stats(self, solve_time: float, best_bound: float = None) -> None:
+        """
+        Records in self.run_stats the solve time, status, objective, best bound, gap and size of the solved model.
+
+        If the "TimeLimit" parameter is set, it also records the fraction of it used by the solve, and warns when
+        this fraction reaches TIME_BUDGET_WARNING.
+
+        Parameters
+        ----------
+        solve_time : float
+            Wall clock time of the solve, in seconds.
+        best_bound : float, optional
+            Best (lower) bound proved by the solver, if known.
+        """
+        mdl, stats = self.mdl, self.run_stats
+        obj_val = self.sol.get('obj_val')
+        stats['Solve Time (s)'] = solve_time
+        stats['Status'] = pulp.LpStatus[mdl.status]
+        stats['Solution Status'] = pulp.LpSolution[mdl.sol_status]
+        stats['Objective'] = obj_val
+        stats['Best Bound'] = best_bound
+        stats['Gap'] = None if obj_val is None or best_bound is None else \
+            abs(obj_val - best_bound) / max(abs(obj_val), 1e-10)
+        stats['Rows'] = mdl.numConstraints()
+        stats['Columns'] = mdl.numVariables()
+        stats['Nonzeros'] = sum(len(constr) for constr in mdl.constraints.values())
+        time_limit = self.solver_params.get('timeLimit')
+        if time_limit:
+            stats['Time Budget Used'] = solve_time / time_limit
+            stats['Time Budget Warning'] = int(stats['Time Budget Used'] >= TIME_BUDGET_WARNING)  # 1 if close to it
+            if stats['Time Budget Warning']:
+                logger.warning('The solve used %.0f%% of its %s s time budget', 100 * stats['Time Budget Used'],
+                               time_limit)
+
+    def resolve_demand(self, demand_delta: pd.DataFrame) -> pd.DataFrame:
+        """
+        Re-optimizes the model after a change in some rows of the demand_packing table.
+
+        Demand only appears in the right-hand side of the flow balance constraint of Pet Gourmet (C4a). Thus, only
+        the right-hand side of the changed rows is updated in the existing model, which is re-solved using the
+        previous solution as the initial incumbent. The demand data in dat_in is updated as well, so that DatOut
+        reports the new demand.
+
+        Parameters
+        ----------
+        demand_delta : pd.DataFrame
+            The changed rows of the demand_packing table. It must contain the 'Packing ID', 'Period ID' and 'Demand'
+            columns, and every (Packing ID, Period ID) pair must already exist in the model.
+
+        Returns
+        -------
+        changes_df : pd.DataFrame
+            The decisions that changed between the previous and the new solution, with the columns 'Packing ID',
+            'Period ID', 'Variable', 'Previous Value' and 'New Value'.
+        """
+        if not self.sol or 'vars' not in self.sol:
+            raise ValueError('resolve_demand() requires a previous optimal solution. Call optimize() first.')
+        dat_in = self.dat_in
+        d, c4a = dat_in.d, self.constrs['C4a']
+        delta = dict(zip(zip(demand_delta['Packing ID'], demand_delta['Period ID']), demand_delta['Demand']))
+        missing_keys = set(delta).difference(c4a)
+        if missing_keys:
+            raise ValueError(f'There are pairs of packing and period in demand_delta that are not in the model:\n'
+                             f'{missing_keys}')
+
+        # update the right-hand side of C4a: yg[i, t] - yg[i, t - 1] - x[i, t] + d[i, t] == 0
+        logger.info('Updating the demand of %d pairs of packing and period...', len(delta))
+        for key, demand in delta.items():
+            c4a[key].constant += demand - d[key]
+            d[key] = demand
+        demand_packing = dat_in.dat.demand_packing
+        demand_packing['Demand'] = [d[key] for key in zip(demand_packing['Packing ID'], demand_packing['Period ID'])]
+
+        previous_sol_df = self._solution_dataframe()
+        self.optimize(warm_start=True)
+        if 'vars' not in self.sol:
+            return pd.DataFrame(columns=['Packing ID', 'Period ID', 'Variable', 'Previous Value', 'New Value'])
+
+        changes_df = previous_sol_df.merge(self._solution_dataframe(), on=['Packing ID', 'Period ID', 'Variable'],
+                                           how='outer', suffixes=(' Previous', ' New'))
+        changes_df = changes_df.rename(columns={'Value Previous': 'Previous Value', 'Value New': 'New Value'})
+        changes_df = changes_df[(changes_df['Previous Value'] - changes_df['New Value']).abs() > 1e-6]
+        changes_df = changes_df.sort_values(by=['Variable', 'Packing ID', 'Period ID'], ignore_index=True)
+        logger.info('%d decisions changed after the demand update.', len(changes_df))
+        return changes_df
+
+    def triage_infeasibility(self, penalties: Dict[str, float] = None) -> pd.DataFrame:
+        """
+        Finds which constraints must be violated, and by how much, to make an infeasible model feasible.
+
+        A nonnegative slack variable is added to every row of ELASTIC_FAMILIES (capacities C1 and C3, order
+        quantities C2, minimum inventory C5 and aging C6), and the model is re-solved minimizing the penalized sum of
+        the slacks instead of the cost. The model is modified in place, so it should not be re-optimized afterwards,
+        but it keeps the status of its previous solve (self.sol is unchanged as well).
+
+        Parameters
+        ----------
+        penalties : dict, optional
+            Dictionary {family: penalty per unit of violation}. The families not given (by default, all of them) get
+            a penalty of 1.
+
+        Returns
+        -------
+        triage_df : pd.DataFrame
+            The violated rows, with the columns 'Family', 'Packing ID', 'Period ID' and 'Violation' ('Packing ID' is
+            missing for the families indexed by period only), sorted by decreasing violation. It is also stored in
+            self.triage_df, and it is empty if the elastic model is infeasible as well (the infeasibility then comes
+            from the flow balance or initial inventory constraints).
+        """
+        penalties = {} if penalties is None else penalties
+        logger.info('Solving the elastic model of the infeasible model...')
+        slacks = {}  # dict {family: {key: slack variable}}
+        for family, rows in self._family_rows(ELASTIC_FAMILIES).items():
+            slacks[family] = self._add_variables(f'e{family}', list(rows), lowBound=0)
+            for key, constr in rows.items():
+                constr[slacks[family][key]] = constr.sense  # +s relaxes a >= row, -s relaxes a <= row
+        self.ObjFunction = lpSum(penalties.get(family, 1.0) * var for family, family_slacks in slacks.items()
+                                 for var in family_slacks.values())
+        mdl, status, sol_status = self.mdl, self.mdl.status, self.mdl.sol_status
+        mdl.setObjective(self.ObjFunction)
+        start = time.perf_counter()
+        mdl.solve(pulp.PULP_CBC_CMD(msg=False, **self.solver_params))
+        self.run_stats['Elastic Solve Time (s)'] = time.perf_counter() - start
+        self.run_stats['Elastic Status'] = pulp.LpStatus[mdl.status]
+
+        violations = []
+        if mdl.status == pulp.LpStatusOptimal:
+            violations = [(family, *(key if isinstance(key, tuple) else (None, key)), var.value())
+                          for family, family_slacks in slacks.items() for key, var in family_slacks.items()
+                          if var.value() > ELASTIC_TOLERANCE]
+        self.triage_df = pd.DataFrame(violations, columns=['Family', 'Packing ID', 'Period ID', 'Violation'])
+        self.triage_df = self.triage_df.sort_values(by='Violation', ascending=False, ignore_index=True)
+        mdl.assignStatus(status, sol_status)  # keep the status of the original model (e.g., for DatOut)
+        self.run_stats['Elastic Violated Rows'] = len(self.triage_df)
+        self.run_stats['Elastic Total Violation'] = float(self.triage_df['Violation'].sum())
+        if self.run_stats['Elastic Status'] == pulp.LpStatus[pulp.LpStatusOptimal]:
+            logger.warning('%d rows must be violated to make the model feasible', len(self.triage_df))
+        else:
+            logger.warning('The elastic model is %s as well: the infeasibility is not caused by the families %s',
+                           self.run_stats['Elastic Status'], list(ELASTIC_FAMILIES))
+        return self.triage_df
+
+    def _family_rows(self, families) -> Dict[str, dict]:
+        """
+        Gets the rows of some constraint families from the model, by their names (see _add_constraint()).
+
+        Returns
+        -------
+        rows : dict
+            Dictionary {family: {key: pulp.LpConstraint}}, where key is a (packing, period) tuple or a period.
+        """
+        rows = {family: {} for family in families}
+        if self.compact_names:
+            row_index = self.row_index
+            for number, family in enumerate(row_index['Family']):
+                if family in rows:
+                    packing, period = row_index['Packing ID'][number], row_index['Period ID'][number]
+                    rows[family][period if packing is None else (packing, period)] = \
+                        self.mdl.constraints[f'r{number}']
+            return rows
+        packings = {str(i).translate(pulp.LpElement.trans): i for i in self.dat_in.I}  # pulp replaces ' ' by '_'
+        for name, constr in self.mdl.constraints.items():
+            family, period, *packing = name.split('_', 2)  # named family_period or family_period_packing
+            if family in rows:
+                rows[family][(packings[packing[0]], int(period)) if packing else int(period)] = constr
+        return rows
+
+    def _solution_dataframe(self) -> pd.DataFrame:
+        """
+        Stacks the solution values of the decision variables stored in self.sol in a single dataframe.
+        """
+        return pd.DataFrame([(i, t, var_name, value) for var_name, var_sol in self.sol['vars'].items()
+                             for i, t, value in var_sol],
+                            columns=['Packing ID', 'Period ID', 'Variable', 'Value'])
+
+
+def default_portfolio() -> List[dict]:
+    """
+    Builds the default portfolio of optimize_portfolio(): CBC with its default settings, with two other random
+    seeds, without presolve and without cuts, plus the default settings of every other locally installed solver.
+    """
+    configurations = [
+        {'name': 'CBC default', 'solver': 'PULP_CBC_CMD', 'options': {}},
+        {'name': 'CBC seed 1', 'solver': 'PULP_CBC_CMD', 'options': {'options': ['randomSeed 1', 'randomCbcSeed 1']}},
+        {'name': 'CBC seed 2', 'solver': 'PULP_CBC_CMD', 'options': {'options': ['randomSeed 2', 'randomCbcSeed 2']}},
+        {'name': 'CBC no presolve', 'solver': 'PULP_CBC_CMD', 'options': {'options': ['presolve off']}},
+        {'name': 'CBC no cuts', 'solver': 'PULP_CBC_CMD', 'options': {'options': ['cuts off']}},
+    ]
+    configurations += [{'name': f'{solver} default', 'solver': solver, 'options': {}}
+                       for solver in pulp.listSolvers(onlyAvailable=True) if solver != 'PULP_CBC_CMD']
+    return configurations
+
+
+def portfolio_history_summary(history_path: str) -> pd.DataFrame:
+    """
+    Summarizes the races recorded by optimize_portfolio(), to choose the default solver configuration.
+
+    Parameters
+    ----------
+    history_path : str
+        Path of the JSON lines file passed to optimize_portfolio().
+
+    Returns
+    -------
+    summary_df : pd.DataFrame
+        One row per configuration, with the columns 'Configuration', 'Races', 'Wins', 'Win Rate' and
+        'Mean Winning Time', sorted by decreasing number of wins.
+    """
+    with open(history_path) as file:
+        history = [json.loads(line) for line in file if line.strip()]
+    races_df = pd.DataFrame([(name, race['winner'] == name, race['winner_time'] if race['winner'] == name else None)
+                             for race in history for name in race['configurations']],
+                            columns=['Configuration', 'Won', 'Winning Time'])
+    summary_df = races_df.groupby('Configuration', as_index=False).agg(
+        **{'Races': ('Won', 'size'), 'Wins': ('Won', 'sum'), 'Mean Winning Time': ('Winning Time', 'mean')})
+    summary_df['Win Rate'] = summary_df['Wins'] / summary_df['Races']
+    summary_df = summary_df[['Configuration', 'Races', 'Wins', 'Win Rate', 'Mean Winning Time']]
+    return summary_df.sort_values(by=['Wins', 'Mean Winning Time'], ascending=[False, True], ignore_index=True)
+
+
+def cbc_best_bound(solver_log: str):
+    """
+    Reads the best bound proved by CBC from its log.
+
+    Parameters
+    ----------
+    solver_log : str
+        The output of a CBC run.
+
+    Returns
+    -------
+    best_bound : float or None
+        The final lower bound, the objective if the solution was proved optimal, or the last "best possible" value
+        reported during the search. None if the log has no bound (e.g., an infeasible model).
+    """
+    lower_bound = re.search(r'^Lower bound:\s*(\S+)', solver_log, re.MULTILINE)
+    if lower_bound:
+        return float(lower_bound.group(1))
+    objective = re.search(r'^Objective value:\s*(\S+)', solver_log, re.MULTILINE)
+    if objective and 'Result - Optimal solution found' in solver_log:
+        return float(objective.group(1))
+    best_possible = re.findall(r'best possible (\S+)', solver_log)
+    return float(best_possible[-1]) if best_possible else None
+
+
+def _solve_configuration(mdl_dict: dict, configuration: dict, solver_params: dict, results_queue) -> None:
+    """
+    Solves a copy of the model with one configuration of the portfolio (runs in a child process).
+    """
+    if hasattr(os, 'setpgrp'):
+        os.setpgrp()  # own process group, so that cancelling this process also stops the solver it launches
+    start = time.perf_counter()
+    variables, mdl = pulp.LpProblem.from_dict(mdl_dict)
+    solver = pulp.getSolver(configuration['solver'], msg=False, **solver_params, **configuration.get('options', {}))
+    mdl.solve(solver)
+    results_queue.put({
+        'name': configuration['name'],
+        'status': mdl.status,
+        'sol_status': mdl.sol_status,
+        'objective': mdl.objective.value() if mdl.status == pulp.LpStatusOptimal else None,
+        'values': {name: var.varValue for name, var in variables.items()},
+        'time': time.perf_counter() - start,
+    })
+
+
+def _cancel_processes(processes: List[multiprocessing.Process]) -> None:
+    """
+    Stops the processes of the portfolio that are still running, along with the solvers they launched.
+    """
+    for process in processes:
+        if process.is_alive():
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except (AttributeError, ProcessLookupError, PermissionError):
+                process.terminate()
+        process.join()
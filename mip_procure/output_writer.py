@@ -0,0 +1,186 @@
+"""
+Contains the streaming writers of the output tables, which write them to disk by chunks instead of building the whole
+file in memory (as ticdat's xls.write_file does).
+
+The files keep ticdat's layout (one sheet or file per table, named after the table, with the field names as header),
+so they can be read back with output_schema.xls.create_pan_dat() and output_schema.csv.create_pan_dat().
+"""
+import logging
+import os
+from typing import Iterable, Iterator, Tuple
+
+import pandas as pd
+
+from mip_procure.data_bridge import DatOut
+from mip_procure.schemas import output_schema
+
+try:
+    import openpyxl
+except ImportError:  # xlsx output is optional
+    openpyxl = None
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # parquet output is optional
+    pyarrow = None
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_FORMATS = ('xlsx', 'csv', 'parquet')
+
+
+def _table_fields(schema, table: str) -> list:
+    return list(schema.primary_key_fields.get(table, ())) + list(schema.data_fields.get(table, ()))
+
+
+class _ExcelChunkWriter:
+    """
+    Writes the chunks to a single xlsx file, one sheet per table, using openpyxl write-only mode.
+    """
+
+    def __init__(self, path: str, schema) -> None:
+        if openpyxl is None:
+            raise ImportError('Writing xlsx files requires the openpyxl package.')
+        self.path = path
+        self.workbook = openpyxl.Workbook(write_only=True)
+        self.sheets = {}
+        for table in schema.all_tables:
+            self.sheets[table] = self.workbook.create_sheet(title=table)
+            self.sheets[table].append(_table_fields(schema, table))
+
+    def write(self, table: str, chunk_df: pd.DataFrame) -> None:
+        sheet = self.sheets[table]
+        for row in chunk_df.itertuples(index=False, name=None):
+            sheet.append(row)
+
+    def close(self) -> None:
+        self.workbook.save(self.path)
+
+
+class _CsvChunkWriter:
+    """
+    Appends the chunks to one csv file per table, inside the path directory.
+    """
+
+    def __init__(self, path: str, schema) -> None:
+        os.makedirs(path, exist_ok=True)
+        self.files = {}
+        for table in schema.all_tables:
+            self.files[table] = open(os.path.join(path, f'{table}.csv'), 'w', newline='')
+            pd.DataFrame(columns=_table_fields(schema, table)).to_csv(self.files[table], index=False)
+
+    def write(self, table: str, chunk_df: pd.DataFrame) -> None:
+        chunk_df.to_csv(self.files[table], header=False, index=False)
+
+    def close(self) -> None:
+        for file in self.files.values():
+            file.close()
+
+
+class _ParquetChunkWriter:
+    """
+    Writes each chunk as a row group of one parquet file per table, inside the path directory.
+
+    A parquet column has a single type, so the fields that allow both numbers and strings (e.g., the Value of
+    run_stats) are written as strings.
+    """
+
+    def __init__(self, path: str, schema) -> None:
+        if pyarrow is None:
+            raise ImportError('Writing parquet files requires the pyarrow package.')
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.schema = schema
+        self.writers = {}
+
+    def _string_fields(self, table: str) -> list:
+        return [field for field, data_type in self.schema.data_types.get(table, {}).items()
+                if data_type.number_allowed and data_type.strings_allowed]
+
+    def write(self, table: str, chunk_df: pd.DataFrame) -> None:
+        string_fields = [field for field in self._string_fields(table) if field in chunk_df.columns]
+        if string_fields:
+            chunk_df = chunk_df.assign(**{field: chunk_df[field].where(chunk_df[field].isna(),
+                                                                       chunk_df[field].astype(str))
+                                          for field in string_fields})
+        arrow_table = pyarrow.Table.from_pandas(chunk_df, preserve_index=False)
+        if table not in self.writers:
+            self.writers[table] = pyarrow.parquet.ParquetWriter(os.path.join(self.path, f'{table}.parquet'),
+                                                                arrow_table.schema)
+        self.writers[table].write_table(arrow_table)
+
+    def close(self) -> None:
+        for table in self.schema.all_tables:
+            if table not in self.writers:  # write the header of the tables without chunks
+                self.write(table, pd.DataFrame(columns=_table_fields(self.schema, table)))
+        for writer in self.writers.values():
+            writer.close()
+
+
+_CHUNK_WRITERS = {'xlsx': _ExcelChunkWriter, 'csv': _CsvChunkWriter, 'parquet': _ParquetChunkWriter}
+
+
+def write_output_chunks(chunks: Iterable[Tuple[str, pd.DataFrame]], path: str, file_format: str = 'xlsx',
+                        schema=output_schema) -> None:
+    """
+    Writes the output tables to disk as their chunks arrive, so that only one chunk is held in memory at a time.
+
+    Parameters
+    ----------
+    chunks : iterable of (str, pd.DataFrame)
+        The table names and blocks of their rows, e.g. DatOut.iter_output_chunks() or pan_dat_chunks(). The chunks of
+        different tables may be interleaved.
+    path : str
+        The xlsx file path, or the directory path for csv and parquet (one file per table).
+    file_format : str
+        One of OUTPUT_FORMATS: 'xlsx' (openpyxl write-only mode, requires openpyxl), 'csv' or 'parquet' (one row
+        group per chunk, requires pyarrow).
+    schema : PanDatFactory
+        The schema of the written tables. Every table of the schema is written, even without chunks.
+    """
+    if file_format not in _CHUNK_WRITERS:
+        raise ValueError(f'Unknown output format {repr(file_format)}. Use one of {list(OUTPUT_FORMATS)}.')
+    writer = _CHUNK_WRITERS[file_format](path, schema)
+    try:
+        for table, chunk_df in chunks:
+            writer.write(table, chunk_df[_table_fields(schema, table)])
+    finally:
+        writer.close()
+
+
+def write_solution(solution_model, path: str, file_format: str = 'xlsx', packings_per_chunk: int = 1000) -> None:
+    """
+    Streams the output tables of a solved model to disk, building them by blocks of packings (see
+    DatOut.iter_output_chunks()) while they are written.
+
+    Parameters
+    ----------
+    solution_model : OptModel
+        An instance of the OptModel class which has already called its optimize() method.
+    path : str
+        The xlsx file path, or the directory path for csv and parquet.
+    file_format : str
+        One of OUTPUT_FORMATS.
+    packings_per_chunk : int
+        Number of packings (each one with all its periods) in each chunk.
+    """
+    logger.info('Writing the output tables to %s...', path)
+    dat_out = DatOut(solution_model, build_tables=False)
+    write_output_chunks(dat_out.iter_output_chunks(packings_per_chunk), path, file_format)
+
+
+def pan_dat_chunks(sln: output_schema.PanDat, rows_per_chunk: int = 100_000,
+                   schema=output_schema) -> Iterator[Tuple[str, pd.DataFrame]]:
+    """
+    Splits the tables of an already built PanDat object into chunks of rows, to write them with
+    write_output_chunks().
+
+    Yields
+    ------
+    table, chunk_df : tuple of (str, pd.DataFrame)
+        The table name and a block of its rows.
+    """
+    for table in schema.all_tables:
+        table_df = getattr(sln, table)
+        for first in range(0, len(table_df), rows_per_chunk):
+            yield table, table_df.iloc[first:first + rows_per_chunk]
@@ -0,0 +1,219 @@
+"""
+Contains the rolling horizon solve mode, used for the models that exceed the size limits: the horizon is split into
+windows of consecutive periods, whose models fit the limits and are solved one after the other. Each window starts
+from the final inventories of the previous one, so only one window model is held in memory at a time.
+"""
+import logging
+from typing import Callable, Dict, List
+
+import pulp
+
+from mip_procure.data_bridge import DatIn
+from mip_procure.model_size import DEFAULT_SIZE_LIMITS, ModelSizeEstimate, estimate_model_size
+from mip_procure.opt_model import OptModel
+from mip_procure.schemas import input_schema
+
+logger = logging.getLogger(__name__)
+
+# tolerance below which the carried Patas Pack inventory of a period is considered already transferred
+CARRIED_TOLERANCE = 1e-6
+
+
+def window_dat(dat: input_schema.PanDat, periods: List[int],
+               initial_inventory: Dict[tuple, float] = None) -> input_schema.PanDat:
+    """
+    Builds the input data of a window of periods.
+
+    Parameters
+    ----------
+    dat : input_schema.PanDat
+        A PanDat object from ticdat package, created accordingly to schemas.input_schema.
+    periods : list of int
+        The consecutive periods of the window.
+    initial_inventory : dict, optional
+        Dictionary {(factory, packing): inventory} with the final inventories of the period before the window. If
+        missing, the 'Initial Inventory' of dat is kept.
+
+    Returns
+    -------
+    window_dat : input_schema.PanDat
+        A PanDat object with the same schema, whose demand_packing table only has the periods of the window (the
+        other tables are shared with dat, except for the inventory table when initial_inventory is given).
+    """
+    tables = {table: getattr(dat, table) for table in input_schema.all_tables}
+    tables['demand_packing'] = dat.demand_packing[dat.demand_packing['Period ID'].isin(periods)]
+    if initial_inventory is not None:
+        keys = zip(dat.inventory['Factory ID'], dat.inventory['Packing ID'])
+        tables['inventory'] = dat.inventory.assign(
+            **{'Initial Inventory': [int(round(initial_inventory[key])) for key in keys]})
+    return input_schema.PanDat(**tables)
+
+
+def window_size(dat: input_schema.PanDat, num_periods: int, discount: bool = False) -> ModelSizeEstimate:
+    """
+    Predicts the size of the model of a window of num_periods periods, including the C6 rows carried from the
+    previous windows (at most MaxTimePackingPack rows by packing, see OptModel.add_carried_c6()).
+    """
+    periods = sorted(dat.demand_packing['Period ID'].unique())[:num_periods]
+    estimate = estimate_model_size(window_dat(dat, periods), discount=discount)
+    max_time = int(input_schema.create_full_parameters_dict(dat)['MaxTimePackingPack'])
+    num_nonzeros = estimate.num_nonzeros + estimate.num_packings * max_time * max_time
+    return estimate._replace(num_constraints=estimate.num_constraints + estimate.num_packings * max_time,
+                             num_nonzeros=num_nonzeros,
+                             memory_mb=estimate.memory_mb * num_nonzeros / max(estimate.num_nonzeros, 1))
+
+
+def max_periods_per_window(dat: input_schema.PanDat, size_limits: Dict[str, float] = None,
+                           discount: bool = False) -> int:
+    """
+    Finds the largest number of periods by window whose model fits the size limits.
+
+    Parameters
+    ----------
+    dat : input_schema.PanDat
+        A PanDat object from ticdat package, created accordingly to schemas.input_schema.
+    size_limits : dict, optional
+        Dictionary {ModelSizeEstimate field: maximum value}. Defaults to DEFAULT_SIZE_LIMITS.
+    discount : bool
+        Whether the volume discount complexity is enabled.
+
+    Returns
+    -------
+    periods_per_window : int
+        The number of periods by window, at least 1 (a warning is logged if even a single period exceeds the limits).
+    """
+    size_limits = DEFAULT_SIZE_LIMITS if size_limits is None else size_limits
+    low, high = 0, dat.demand_packing['Period ID'].nunique()  # the size grows with the number of periods
+    while low < high:
+        middle = (low + high + 1) // 2
+        if window_size(dat, middle, discount).exceeded_limits(size_limits):
+            high = middle - 1
+        else:
+            low = middle
+    if low == 0:
+        logger.warning('The model of a single period exceeds the size limits (%s)',
+                       ', '.join(window_size(dat, 1, discount).exceeded_limits(size_limits)))
+    return max(low, 1)
+
+
+def solve_rolling_horizon(dat: input_schema.PanDat, periods_per_window: int, periods_per_step: int = None,
+                          discount: bool = False, solver_parameters: Dict[str, float] = None,
+                          compact_names: bool = False, dat_in: DatIn = None, restrict: Callable = None) -> OptModel:
+    """
+    Solves the model by rolling horizon: windows of periods_per_window consecutive periods are solved in order, and
+    the plan of the first periods_per_step periods of each window is kept (the last window keeps all its periods).
+
+    The periods of a window after its step are a look-ahead, which lets the window prepare for the next periods
+    (e.g., transfer in advance the packings that can't all be transferred in the same period). Each window model
+    starts from the final inventories of the kept periods of the previous window (replacing the initial inventory of
+    C7), and the Patas Pack inventory of the last kept periods, which C6 requires to be transferred within
+    MaxTimePackingPack periods, is carried to the next windows (see OptModel.add_carried_c6()). The combined plan is
+    feasible for the full model, but not necessarily optimal.
+
+    Parameters
+    ----------
+    dat : input_schema.PanDat
+        A PanDat object from ticdat package, created accordingly to schemas.input_schema.
+    periods_per_window : int
+        The number of periods of each window (see max_periods_per_window()).
+    periods_per_step : int, optional
+        The number of periods kept from each window, at most periods_per_window. Defaults to half of the window
+        (at least 1 period).
+    discount : bool
+        Whether the volume discount complexity is enabled.
+    solver_parameters : dict, optional
+        Solver parameters of the solve of each window (see OptModel.set_model_parameters()).
+    compact_names : bool
+        Whether the window models use compact names (see OptModel).
+    dat_in : DatIn, optional
+        The DatIn instance of dat, if already built.
+    restrict : callable, optional
+        Function called with each built window model before its solve, returning a function without arguments that
+        undoes its changes (e.g., the restriction to an aggregated plan). If a restricted window has no solution, it
+        is solved again without the restriction.
+
+    Returns
+    -------
+    opt_model : OptModel
+        A model of the full horizon (not built) holding the combined solution, whose run_stats have the number of
+        windows and the size of the largest window model. If a window has no solution, its own model is returned
+        instead, so that it can be written and triaged.
+    """
+    periods_per_step = periods_per_step or max(periods_per_window // 2, 1)
+    if not 1 <= periods_per_step <= periods_per_window:
+        raise ValueError(f'periods_per_step must be between 1 and periods_per_window ({periods_per_window})')
+    solver_parameters = solver_parameters or {}
+    dat_in = dat_in or DatIn(dat)
+    periods = sorted(dat_in.T)
+    max_time = int(dat_in.dat_params['MaxTimePackingPack'])
+    windows = [periods[first:first + periods_per_window]
+               for first in range(0, max(len(periods) - periods_per_window, 0) + periods_per_step, periods_per_step)]
+    windows = windows[:next(number for number, window in enumerate(windows) if window[-1] == periods[-1]) + 1]
+    logger.info('Solving %d windows of %d periods...', len(windows), periods_per_window)
+
+    stats = {'Windows': len(windows), 'Periods per Window': periods_per_window, 'Periods per Step': periods_per_step,
+             'Max Window Rows': 0, 'Max Window Columns': 0, 'Max Window Nonzeros': 0, 'Solve Time (s)': 0.0}
+    sol_vars = {'x': [], 'yp': [], 'yg': [], 'w': []}
+    obj_val, initial_inventory = 0.0, None
+    carried_yp = {}  # dict {(i, t): Patas Pack inventory of period t not transferred yet}
+    for number, window in enumerate(windows):
+        kept = window if number == len(windows) - 1 else window[:periods_per_step]
+        window_model = OptModel(DatIn(window_dat(dat, window, initial_inventory)),
+                                model_name=f'Mip_Procure_Window_{number}', compact_names=compact_names)
+        window_model.build_base_model()
+        window_model.transporting_cost_complexity()
+        if discount:
+            window_model.discount_complexity()
+        window_model.add_carried_c6({key: value for key, value in carried_yp.items() if value > CARRIED_TOLERANCE})
+        window_model.set_model_parameters(solver_parameters)
+        undo = restrict(window_model) if restrict is not None else None
+        window_model.optimize()
+        if undo is not None:
+            undo()
+            if 'vars' not in window_model.sol:
+                logger.warning('The restricted window %d has no solution. Solving it without the restriction...',
+                               number)
+                window_model.optimize()
+        window_stats = window_model.run_stats
+        stats['Solve Time (s)'] += window_stats['Solve Time (s)']
+        for stat in ('Rows', 'Columns', 'Nonzeros'):
+            stats[f'Max Window {stat}'] = max(stats[f'Max Window {stat}'], window_stats[stat])
+        if 'vars' not in window_model.sol:
+            logger.warning('Window %d (periods %d to %d) has no solution', number, window[0], window[-1])
+            window_model.run_stats.update(stats, **{'Failed Window': number})
+            return window_model
+
+        # keep the plan of the kept periods, and the inventories of the period before the first window
+        for var_name, values in window_model.sol['vars'].items():
+            sol_vars[var_name].extend((i, t, value) for i, t, value in values
+                                      if t <= kept[-1] and (number == 0 or t >= kept[0]))
+        obj_val += _kept_cost(window_model, set(kept))
+
+        # carry the final inventories and the Patas Pack inventory still to be transferred
+        x_sol = {(i, t): value for i, t, value in window_model.sol['vars']['x']}
+        yp_sol = {(i, t): value for i, t, value in window_model.sol['vars']['yp']}
+        yg_sol = {(i, t): value for i, t, value in window_model.sol['vars']['yg']}
+        carried_yp.update({(i, t): yp_sol[i, t] for i in dat_in.I for t in kept
+                           if kept[-1] - max_time < t <= periods[-1] - max_time})
+        carried_yp = {(i, t): value - sum(x_sol[i, t_x] for t_x in kept if t < t_x <= t + max_time)
+                      for (i, t), value in carried_yp.items() if t + max_time > kept[-1]}
+        initial_inventory = {(factory, i): (yp_sol if factory == 'Pack' else yg_sol)[i, kept[-1]]
+                             for factory, i in zip(dat.inventory['Factory ID'], dat.inventory['Packing ID'])}
+
+    opt_model = OptModel(dat_in, model_name='Mip_Procure_Rolling_Horizon', compact_names=compact_names)
+    opt_model.mdl.assignStatus(pulp.LpStatusOptimal, pulp.LpSolutionIntegerFeasible)  # feasible, not proved optimal
+    opt_model.sol = {'status': pulp.LpStatusOptimal, 'sol_status': pulp.LpSolutionIntegerFeasible,
+                     'obj_val': obj_val, 'vars': sol_vars}
+    opt_model.run_stats.update(stats, **{'Status': pulp.LpStatus[pulp.LpStatusOptimal],
+                                         'Solution Status': pulp.LpSolution[pulp.LpSolutionIntegerFeasible],
+                                         'Objective': obj_val})
+    return opt_model
+
+
+def _kept_cost(window_model: OptModel, kept: set) -> float:
+    """
+    Evaluates the terms of the objective of a solved window model whose variables belong to the kept periods.
+    """
+    kept_vars = {var for family in window_model.vars.values() for key, var in family.items()
+                 if (key[1] if isinstance(key, tuple) else key) in kept}
+    return sum(coefficient * var.value() for var, coefficient in window_model.ObjFunction.items() if var in kept_vars)
@@ -1,3 +1,4 @@
+import operator
 from ticdat import PanDatFactory
 from mip_procure.constants import Sites
 
@@ -93,12 +94,35 @@ input_schema.add_parameter('PercentualDiscount', default_value=0.10, number_allo
 # endregion
 
 # region predicate
-input_schema.add_data_row_predicate(table='inventory', predicate_name='Initial Inventory >= Minimum Inventory',
-                                    predicate=lambda row: row['Initial Inventory'] >= row['Minimum Inventory'])
-input_schema.add_data_row_predicate(table='distribution', predicate_name='Minimum Transfer Qty <= Maximum Transfer Qty',
-                                    predicate=lambda row: row['Minimum Transfer Qty'] <= row['Maximum Transfer Qty'])
-input_schema.add_data_row_predicate(table='demand_packing', predicate_name='Minimum Order Qty <= Maximum Order Qty',
-                                    predicate= lambda row: row['Min Order Qty'] <= row['Max Order Qty'])
+# The row predicates are declared as (table, predicate name, left field, comparison, right field), so that the same
+# rules feed both ticdat's row by row checks and the vectorized checks in validation.py.
+input_row_predicates = [
+    ('inventory', 'Initial Inventory >= Minimum Inventory', 'Initial Inventory', operator.ge, 'Minimum Inventory'),
+    ('distribution', 'Minimum Transfer Qty <= Maximum Transfer Qty', 'Minimum Transfer Qty', operator.le,
+     'Maximum Transfer Qty'),
+    ('demand_packing', 'Minimum Order Qty <= Maximum Order Qty', 'Min Order Qty', operator.le, 'Max Order Qty')]
+for table, predicate_name, left_field, comparison, right_field in input_row_predicates:
+    input_schema.add_data_row_predicate(table=table, predicate_name=predicate_name,
+                                        predicate=lambda row, left=left_field, op=comparison, right=right_field:
+                                        op(row[left], row[right]))
+# endregion
+
+# region SCENARIOS SCHEMA
+# demand scenarios of the stochastic mode (see stochastic.py), kept out of input_schema so that the workbooks without
+# scenarios are read as before
+scenarios_schema = PanDatFactory(
+   demand_scenarios=[['Scenario ID', 'Packing ID', 'Period ID'], ['Demand']])
+# endregion
+
+# region data types - SCENARIOS SCHEMA
+scenarios_schema.set_data_type(table='demand_scenarios', field='Scenario ID', number_allowed=True,
+                               strings_allowed='*')
+scenarios_schema.set_data_type(table='demand_scenarios', field='Packing ID', number_allowed=False,
+                               strings_allowed='*')
+scenarios_schema.set_data_type(table='demand_scenarios', field='Period ID', number_allowed=True, must_be_int=True,
+                               strings_allowed=())
+scenarios_schema.set_data_type(table='demand_scenarios', field='Demand', number_allowed=True,
+                               must_be_int=True, min=0, inclusive_min=True, strings_allowed=())
 # endregion
 
 # region OUTPUT SCHEMA
@@ -106,7 +130,9 @@ output_schema = PanDatFactory(
     pet_gourmet=[['Packing ID', 'Period ID'], ['Initial Inventory',  'Demand',
                                                'Transferred Quantity', 'Final Inventory']],
     patas_pack=[['Packing ID', 'Period ID'], ['Initial Inventory', 'Transferred Quantity',
-                                              'Acquired Quantity', 'Final Inventory']]
+                                              'Acquired Quantity', 'Final Inventory']],
+    run_stats=[['Statistic'], ['Value']],
+    infeasibility_triage=[[], ['Family', 'Packing ID', 'Period ID', 'Violation']]
 )
 # endregion
 
@@ -138,4 +164,21 @@ output_schema.set_data_type(table=table, field='Acquired Quantity',  strings_all
 output_schema.set_data_type(table=table, field='Final Inventory',  strings_allowed=(),
                             min=0, inclusive_min=True, max=float('inf'), inclusive_max=False)
 # endregion
+
+# region run_stats
+table = 'run_stats'
+output_schema.set_data_type(table=table, field='Statistic', number_allowed=False, strings_allowed='*')
+output_schema.set_data_type(table=table, field='Value', number_allowed=True, strings_allowed='*', nullable=True,
+                            min=-float('inf'), inclusive_min=True, max=float('inf'), inclusive_max=True)
+# endregion
+
+# region infeasibility_triage
+table = 'infeasibility_triage'
+output_schema.set_data_type(table=table, field='Family', number_allowed=False, strings_allowed='*')
+output_schema.set_data_type(table=table, field='Packing ID', number_allowed=False, strings_allowed='*',
+                            nullable=True)
+output_schema.set_data_type(table=table, field='Period ID', number_allowed=True, must_be_int=True, strings_allowed=())
+output_schema.set_data_type(table=table, field='Violation', strings_allowed=(), min=0, inclusive_min=False,
+                            max=float('inf'), inclusive_max=False)
+# endregion
 # endregion
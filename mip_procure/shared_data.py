@@ -0,0 +1,218 @@
+"""
+Contains the sharing of the numeric DatIn data between processes through multiprocessing.shared_memory.
+
+The publishing process copies the arrays once into a shared memory block (publish()) and sends the small, picklable
+SharedDataHandle to the workers. Each worker calls handle.attach() to get a SharedDatIn, a read-only DatIn-like
+object whose parameters are views on the shared block. Hence, the memory used by the input data does not grow with
+the number of workers, and OptModel can be built in the workers as usual:
+
+    with publish(dat_in) as handle:
+        pool.map(worker, [handle] * num_workers)  # worker: OptModel(handle.attach(), model_name='Mip_Procure')
+"""
+import itertools
+import sys
+from collections.abc import Mapping
+from multiprocessing import shared_memory
+from typing import Dict, NamedTuple, Tuple
+
+import numpy as np
+import pandas as pd
+
+from mip_procure.schemas import input_schema
+
+
+class _ArrayMapping(Mapping):
+    """
+    Read-only dictionary view on an array, whose keys are the labels of its axes (e.g., d[i, t]).
+    """
+
+    def __init__(self, array: np.ndarray, *axes_labels) -> None:
+        self.array = array
+        self.axes_labels = axes_labels
+        self.positions = [{label: position for position, label in enumerate(labels)} for labels in axes_labels]
+
+    def __getitem__(self, key):
+        if self.array is None:
+            raise ValueError('The shared memory block of this mapping was closed')
+        key = key if isinstance(key, tuple) else (key,)
+        return self.array[tuple(positions[label] for positions, label in zip(self.positions, key))].item()
+
+    def __iter__(self):
+        if len(self.axes_labels) == 1:
+            return iter(self.axes_labels[0])
+        return itertools.product(*self.axes_labels)
+
+    def __len__(self) -> int:
+        return int(np.prod([len(labels) for labels in self.axes_labels]))
+
+    def release(self) -> None:
+        """
+        Drops the view on the array, so that the mapping raises a ValueError instead of reading unmapped memory.
+        """
+        self.array = None
+
+
+class SharedDataHandle(NamedTuple):
+    """
+    Picklable reference to the DatIn data published in shared memory (see publish()).
+    """
+    shm_name: str
+    layout: Dict[str, Tuple[str, tuple, int]]  # {array name: (dtype, shape, offset in the block)}
+    dat_params: dict
+
+    def attach(self) -> 'SharedDatIn':
+        """
+        Attaches to the shared memory block and returns the DatIn-like object of its data (without copying it).
+        """
+        return SharedDatIn(self)
+
+
+class SharedDatIn:
+    """
+    Read-only DatIn-like object whose sets and parameters are views on the arrays of a shared memory block.
+
+    It has the attributes of DatIn consumed by OptModel and DatOut. The parameters are read-only mappings, so that a
+    worker cannot change the data seen by the others (e.g., OptModel.resolve_demand() is not supported).
+    """
+
+    def __init__(self, handle: SharedDataHandle) -> None:
+        self.handle = handle
+        self.shm = _attach_shared_memory(handle.shm_name)
+        self.arrays = {name: np.ndarray(shape, dtype=np.dtype(dtype), buffer=self.shm.buf, offset=offset)
+                       for name, (dtype, shape, offset) in handle.layout.items()}
+        for array in self.arrays.values():
+            array.flags.writeable = False
+
+        packings = [str(i) for i in self.arrays['packings']]
+        periods = [int(t) for t in self.arrays['periods']]
+        factories = [str(j) for j in self.arrays['factories']]
+        self.I, self.J, self.T = set(packings), set(factories), set(periods)
+        self.first_period = min(periods)
+        self.T_extend = self.T.union({self.first_period - 1})
+        self.dat_params = self.params = handle.dat_params
+        self.d = _ArrayMapping(self.arrays['demand'], packings, periods)
+        self.au = _ArrayMapping(self.arrays['max_order_qty'], packings, periods)
+        self.moq = _ArrayMapping(self.arrays['min_order_qty'], packings, periods)
+        self.c = _ArrayMapping(self.arrays['unit_price'], packings)
+        self.ini_inventory = _ArrayMapping(self.arrays['initial_inventory'], factories, packings)
+        self.ilg = _ArrayMapping(self.arrays['minimum_inventory'], factories, packings)
+        self.inven_cost = _ArrayMapping(self.arrays['inventory_cost'], factories, packings)
+
+        # same keys as DatIn._derive_variables_keys()
+        self.x_keys = [(i, t) for i in self.I for t in self.T]
+        self.w_keys = self.x_keys.copy()
+        self.wb_keys = self.x_keys.copy()
+        self.xb_keys = self.x_keys.copy()
+        self.yp_keys = [(i, t) for i in self.I for t in self.T_extend]
+        self.yg_keys = self.yp_keys.copy()
+        self._dat = None
+
+    @property
+    def dat(self) -> input_schema.PanDat:
+        """
+        A PanDat object with the demand_packing table rebuilt from the shared arrays (used by DatOut).
+        """
+        if self.shm is None:
+            raise ValueError('The shared memory block of this SharedDatIn was closed')
+        if self._dat is None:
+            packings, periods = self.arrays['packings'].astype(str), self.arrays['periods']
+            self._dat = input_schema.PanDat(demand_packing=pd.DataFrame({
+                'Packing ID': np.repeat(packings, len(periods)),
+                'Period ID': np.tile(periods, len(packings)),
+                'Demand': self.arrays['demand'].flatten(),
+                'Min Order Qty': self.arrays['min_order_qty'].flatten(),
+                'Max Order Qty': self.arrays['max_order_qty'].flatten()}))
+        return self._dat
+
+    def close(self) -> None:
+        """
+        Detaches from the shared memory block. Afterwards, the parameters and the dat attribute raise a ValueError
+        (the views on the block are dropped before it is unmapped, so they can't read unmapped memory).
+        """
+        if self.shm is None:
+            return
+        for mapping in (self.d, self.au, self.moq, self.c, self.ini_inventory, self.ilg, self.inven_cost):
+            mapping.release()
+        self.arrays, self._dat = {}, None
+        shm, self.shm = self.shm, None
+        shm.close()
+
+
+class _Publication:
+    """
+    Context manager returned by publish(): it yields the handle and releases the shared memory block on exit.
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory, handle: SharedDataHandle) -> None:
+        self.shm = shm
+        self.handle = handle
+
+    def __enter__(self) -> SharedDataHandle:
+        return self.handle
+
+    def __exit__(self, *exc_info) -> None:
+        self.release()
+
+    def release(self) -> None:
+        """
+        Closes and removes the shared memory block. The workers must have detached before.
+        """
+        self.shm.close()
+        self.shm.unlink()
+
+
+def publish(dat_in) -> _Publication:
+    """
+    Copies the numeric data of a DatIn instance once into a shared memory block.
+
+    The packings, periods and factories are encoded by their position in sorted arrays (the labels themselves are
+    stored as fixed width unicode arrays), and the parameters indexed by them are stored as float64 arrays.
+
+    Parameters
+    ----------
+    dat_in : DatIn
+        A DatIn instance containing the input data (see data_bridge.py).
+
+    Returns
+    -------
+    publication : _Publication
+        A context manager whose handle (publication.handle, or the value of the with statement) is sent to the
+        workers. The shared memory block is removed when the with statement exits (or by publication.release()).
+    """
+    packings, periods, factories = sorted(dat_in.I), sorted(dat_in.T), sorted(dat_in.J)
+    arrays = {
+        'packings': np.array(packings, dtype=str),
+        'periods': np.array(periods, dtype=np.int64),
+        'factories': np.array(factories, dtype=str),
+        'demand': np.array([[dat_in.d[i, t] for t in periods] for i in packings], dtype=np.float64),
+        'min_order_qty': np.array([[dat_in.moq[i, t] for t in periods] for i in packings], dtype=np.float64),
+        'max_order_qty': np.array([[dat_in.au[i, t] for t in periods] for i in packings], dtype=np.float64),
+        'unit_price': np.array([dat_in.c[i] for i in packings], dtype=np.float64),
+        'initial_inventory': np.array([[dat_in.ini_inventory[j, i] for i in packings] for j in factories],
+                                      dtype=np.float64),
+        'minimum_inventory': np.array([[dat_in.ilg[j, i] for i in packings] for j in factories], dtype=np.float64),
+        'inventory_cost': np.array([[dat_in.inven_cost[j, i] for i in packings] for j in factories],
+                                   dtype=np.float64),
+    }
+    layout, offset = {}, 0
+    for name, array in arrays.items():
+        offset = -(-offset // 8) * 8  # 8 bytes alignment
+        layout[name] = (array.dtype.str, array.shape, offset)
+        offset += array.nbytes
+    shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+    for name, array in arrays.items():
+        dtype, shape, array_offset = layout[name]
+        np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf, offset=array_offset)[...] = array
+    return _Publication(shm, SharedDataHandle(shm.name, layout, dict(dat_in.dat_params)))
+
+
+def _attach_shared_memory(name: str) -> shared_memory.SharedMemory:
+    """
+    Attaches to an existing shared memory block, without making this process responsible for removing it.
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    # before Python 3.13, attaching registers the block again in the resource tracker. The processes started by
+    # multiprocessing share the tracker of the publisher, where the block is already registered, so this is harmless
+    # (and unregistering here would drop the registration of the publisher).
+    return shared_memory.SharedMemory(name=name)
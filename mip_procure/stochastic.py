@@ -0,0 +1,442 @@
+"""
+Contains the two-stage stochastic demand mode, where the demand of each (packing, period) pair is given by a set of
+sampled scenarios (the demand_scenarios table of schemas.scenarios_schema) instead of the demand_packing point forecast.
+
+The orders (w, wb, and the discount variables, if enabled), and optionally the transfers (x, xb, n) of the first
+periods, are first-stage decisions shared by every scenario. The remaining transfers and the inventories (yp, yg) are
+recourse decisions, with one copy per scenario. The expected cost over the scenarios is minimized.
+
+The single-scenario model is built once by OptModel (in compact_names mode, so that every row and column is mapped
+to its family, packing and period), its coefficient matrix is extracted, and the recourse blocks are replicated for
+every scenario with array operations. The replicated model is written to an MPS file and solved by CBC.
+"""
+import logging
+import os
+import subprocess
+import tempfile
+import time
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+import pulp
+
+from mip_procure.data_bridge import DatIn, DatOut
+from mip_procure.opt_model import OptModel, cbc_best_bound
+from mip_procure.schemas import input_schema, output_schema, scenarios_schema
+
+logger = logging.getLogger(__name__)
+
+# variable families that are always first-stage, and the ones that are first-stage in the first_stage_periods only
+FIRST_STAGE_FAMILIES = ('w', 'wb', 'wd', 'dc')
+EARLY_PERIOD_FAMILIES = ('x', 'xb', 'n')
+
+# CBC command line names of the pulp solver arguments set by OptModel.set_model_parameters()
+_CBC_OPTIONS = {'timeLimit': 'sec', 'gapRel': 'ratioGap', 'threads': 'threads'}
+_MPS_SENSES = {pulp.LpConstraintLE: 'L', pulp.LpConstraintGE: 'G', pulp.LpConstraintEQ: 'E'}
+
+
+def scenario_demand_array(scenarios_dat: scenarios_schema.PanDat, packings: list,
+                          periods: list) -> (List, np.ndarray):
+    """
+    Reads the demand_scenarios table into a (scenario, packing, period) array.
+
+    Parameters
+    ----------
+    scenarios_dat : scenarios_schema.PanDat
+        The demand scenarios, with a demand_scenarios row for every scenario and every (packing, period) pair of the
+        demand_packing table of the input data.
+    packings, periods : list
+        The order of the packing and period axes of the array.
+
+    Returns
+    -------
+    scenarios, demand : tuple of (list, np.ndarray)
+        The scenario IDs, in their order of appearance, and the demand array.
+    """
+    demand_scenarios = scenarios_dat.demand_scenarios
+    if demand_scenarios.empty:
+        raise ValueError('The stochastic mode requires demand scenarios in the demand_scenarios table.')
+    scenarios = list(pd.unique(demand_scenarios['Scenario ID']))
+    positions = (pd.Index(scenarios).get_indexer(demand_scenarios['Scenario ID']),
+                 pd.Index(packings).get_indexer(demand_scenarios['Packing ID']),
+                 pd.Index(periods).get_indexer(demand_scenarios['Period ID']))
+    unknown = np.logical_or.reduce([axis_positions == -1 for axis_positions in positions])
+    if unknown.any():  # a -1 position would silently overwrite the last packing or period of the array
+        raise ValueError(f'There are {unknown.sum()} demand_scenarios rows whose packing and period are not in the '
+                         f'demand_packing table:\n{demand_scenarios[unknown].to_string()}')
+    demand = np.full((len(scenarios), len(packings), len(periods)), np.nan)
+    demand[positions] = demand_scenarios['Demand']
+    missing = np.isnan(demand)
+    if missing.any():
+        scenario_numbers = np.nonzero(missing.any(axis=(1, 2)))[0]
+        raise ValueError(f'There are {missing.sum()} missing pairs of packing and period in the demand_scenarios '
+                         f'table, in the scenarios {[scenarios[number] for number in scenario_numbers]}')
+    return scenarios, demand
+
+
+class StochasticModel:
+    """
+    Builds and solves the two-stage stochastic model, by replicating the recourse blocks of the single-scenario
+    model built by OptModel.
+    """
+
+    def __init__(self, dat: input_schema.PanDat, scenarios_dat: scenarios_schema.PanDat, first_stage_periods: int = 0,
+                 discount: bool = False, probabilities: Dict = None) -> None:
+        """
+        Initializes a StochasticModel instance, building the single-scenario model and extracting its matrix.
+
+        Parameters
+        ----------
+        dat : input_schema.PanDat
+            The input data. The demand_packing table still defines the (packing, period) pairs and the order quantity
+            limits.
+        scenarios_dat : scenarios_schema.PanDat
+            The demand scenarios (see scenario_demand_array()).
+        first_stage_periods : int
+            Number of periods, from the first one, whose transfers (x, xb, n) are first-stage decisions.
+        discount : bool
+            Whether the volume discount complexity is enabled.
+        probabilities : dict, optional
+            Dictionary {scenario ID: probability}. Defaults to equiprobable scenarios (e.g., sampled ones).
+        """
+        self.dat_in = DatIn(dat)
+        self.packings, self.periods = sorted(self.dat_in.I), sorted(self.dat_in.T)
+        self.scenarios, self.demand = scenario_demand_array(scenarios_dat, self.packings, self.periods)
+        num_scenarios = len(self.scenarios)
+        self.probabilities = np.full(num_scenarios, 1 / num_scenarios) if probabilities is None else \
+            np.array([probabilities[scenario] for scenario in self.scenarios], dtype=float)
+        self.first_stage_periods = first_stage_periods
+        self.run_stats = {'Scenarios': num_scenarios, 'First Stage Periods': first_stage_periods}
+        self.solver_params = {}
+        self.sol = None
+
+        start = time.perf_counter()
+        self.base_model = OptModel(self.dat_in, model_name='Mip_Procure', compact_names=True)
+        self.base_model.build_base_model()
+        self.base_model.transporting_cost_complexity()
+        if discount:
+            self.base_model.discount_complexity()
+        self.run_stats['Build Time Base Model (s)'] = time.perf_counter() - start
+        self._extract_matrix()
+
+    def _extract_matrix(self) -> None:
+        """
+        Extracts the coefficient matrix (in coordinate format), the right-hand sides, the objective and the bounds
+        of the single-scenario model as arrays indexed by its compact row and column numbers.
+        """
+        base_model = self.base_model
+        column_index, row_index = base_model.column_index, base_model.row_index
+        self.column_family = np.array(column_index['Family'], dtype=object)
+        self.column_packing = np.array(column_index['Packing ID'], dtype=object)
+        self.column_period = np.array(column_index['Period ID'], dtype=object)
+        num_columns, num_rows = len(self.column_family), len(row_index['Family'])
+
+        self.lower = np.zeros(num_columns)
+        self.upper = np.full(num_columns, np.inf)
+        self.integer = np.zeros(num_columns, dtype=bool)
+        for family_vars in base_model.vars.values():
+            for var in family_vars.values():
+                column = int(var.name[1:])
+                self.lower[column] = -np.inf if var.lowBound is None else var.lowBound
+                self.upper[column] = np.inf if var.upBound is None else var.upBound
+                self.integer[column] = var.cat in (pulp.LpInteger, pulp.LpBinary)
+        self.objective = np.zeros(num_columns)
+        for var, coefficient in base_model.ObjFunction.items():
+            self.objective[int(var.name[1:])] = coefficient
+
+        rows, columns, values = [], [], []
+        self.senses = np.empty(num_rows, dtype='<U1')
+        self.rhs = np.zeros(num_rows)
+        for name, constr in base_model.mdl.constraints.items():
+            row = int(name[1:])
+            self.senses[row] = _MPS_SENSES[constr.sense]
+            self.rhs[row] = -constr.constant
+            rows.extend(row for _ in range(len(constr)))
+            columns.extend(int(var.name[1:]) for var in constr)
+            values.extend(constr.values())
+        self.rows, self.columns, self.values = np.array(rows), np.array(columns), np.array(values, dtype=float)
+
+        # (position of the demand of each C4a row in the demand array) to set its right-hand side per scenario
+        row_family = np.array(row_index['Family'], dtype=object)
+        self.c4a_rows = np.nonzero(row_family == 'C4a')[0]
+        self.c4a_packings = pd.Index(self.packings).get_indexer(np.array(row_index['Packing ID'],
+                                                                         dtype=object)[self.c4a_rows])
+        self.c4a_periods = pd.Index(self.periods).get_indexer(np.array(row_index['Period ID'],
+                                                                       dtype=object)[self.c4a_rows])
+
+    def build(self) -> None:
+        """
+        Replicates the recourse columns and rows of the single-scenario model for every scenario.
+
+        A column is first-stage if its family is in FIRST_STAGE_FAMILIES, or in EARLY_PERIOD_FAMILIES with a period
+        among the first_stage_periods first ones. A row is first-stage if all its columns are first-stage. The
+        first-stage columns and rows appear once, followed by one block of recourse columns and rows per scenario,
+        and the objective coefficients of each recourse block are weighted by the probability of its scenario.
+        """
+        start = time.perf_counter()
+        num_scenarios = len(self.scenarios)
+        early_periods = self.periods[:self.first_stage_periods]
+        first_stage = np.isin(self.column_family, FIRST_STAGE_FAMILIES) | (
+            np.isin(self.column_family, EARLY_PERIOD_FAMILIES) & np.isin(self.column_period, early_periods))
+        recourse_row = np.bincount(self.rows, weights=~first_stage[self.columns], minlength=len(self.senses)) > 0
+        self.first_stage = first_stage
+
+        # column_map[s, j] / row_map[s, k]: number of the column j / row k of the base model in the scenario s
+        self.column_map = _replication_map(~first_stage, num_scenarios)
+        self.row_map = _replication_map(recourse_row, num_scenarios)
+        num_columns, num_rows = int(self.column_map.max()) + 1, int(self.row_map.max()) + 1
+
+        # matrix: the entries of the first-stage rows once, and the ones of the recourse rows for every scenario
+        first_entries = np.nonzero(~recourse_row[self.rows])[0]
+        recourse_entries = np.nonzero(recourse_row[self.rows])[0]
+        scenario_numbers = np.repeat(np.arange(num_scenarios), len(recourse_entries))
+        entries = np.tile(recourse_entries, num_scenarios)
+        self.matrix_rows = np.concatenate([self.row_map[0, self.rows[first_entries]],
+                                           self.row_map[scenario_numbers, self.rows[entries]]])
+        self.matrix_columns = np.concatenate([self.column_map[0, self.columns[first_entries]],
+                                              self.column_map[scenario_numbers, self.columns[entries]]])
+        self.matrix_values = np.concatenate([self.values[first_entries], self.values[entries]])
+
+        # rows and columns data, written at their replicated positions
+        self.model_senses = np.empty(num_rows, dtype='<U1')
+        self.model_rhs = np.empty(num_rows)
+        self.model_senses[self.row_map] = self.senses[None, :]
+        self.model_rhs[self.row_map] = self.rhs[None, :]
+        self.model_rhs[self.row_map[:, self.c4a_rows]] = -self.demand[:, self.c4a_packings, self.c4a_periods]
+        self.model_objective = np.zeros(num_columns)
+        weights = np.where(first_stage[None, :], 1.0, self.probabilities[:, None])
+        self.model_objective[self.column_map] = weights * self.objective[None, :]
+        self.model_lower, self.model_upper = np.empty(num_columns), np.empty(num_columns)
+        self.model_integer = np.empty(num_columns, dtype=bool)
+        self.model_lower[self.column_map] = self.lower[None, :]
+        self.model_upper[self.column_map] = self.upper[None, :]
+        self.model_integer[self.column_map] = self.integer[None, :]
+
+        stats = self.run_stats
+        stats['Build Time Replication (s)'] = time.perf_counter() - start
+        stats['First Stage Columns'] = int(first_stage.sum())
+        stats['Rows'], stats['Columns'], stats['Nonzeros'] = num_rows, num_columns, len(self.matrix_values)
+        logger.info('Stochastic model of %d scenarios: %d rows, %d columns and %d nonzeros', num_scenarios,
+                    num_rows, num_columns, len(self.matrix_values))
+
+    def set_model_parameters(self, parameters: Dict[str, float]) -> None:
+        """
+        Sets the solver parameters, with the same gurobi-like names as OptModel.set_model_parameters().
+        """
+        self.base_model.set_model_parameters(parameters)
+        self.solver_params = self.base_model.solver_params
+
+    def write_mps(self, path: str) -> None:
+        """
+        Writes the replicated model to a fixed format MPS file (as pulp writes them), whose rows are named R<number>
+        and columns C<number>.
+
+        The names of the rows and columns and the distinct values of the model are formatted once each, and the
+        lines are assembled from them by array indexing and concatenation.
+        """
+        num_columns, num_rows = len(self.model_objective), len(self.model_rhs)
+        column_names, row_names = _names('C', num_columns), _names('R', num_rows)
+        # COLUMNS section: the objective and matrix entries of each column, contiguous, integer columns first
+        entry_columns = np.concatenate([np.arange(num_columns), self.matrix_columns])
+        entry_rows = np.concatenate([np.full(num_columns, num_rows), self.matrix_rows])  # num_rows: the objective
+        entry_values = np.concatenate([self.model_objective, self.matrix_values])
+        order = np.lexsort((entry_columns, ~self.model_integer[entry_columns]))
+        entry_lines = '    ' + column_names[entry_columns[order]] + '  ' + \
+            np.append(row_names, 'OBJ     ')[entry_rows[order]] + '  ' + _values(entry_values[order]) + '\n'
+        num_integer_entries = int(self.model_integer[entry_columns].sum())
+        nonzero_rhs = np.nonzero(self.model_rhs)[0]
+
+        with open(path, 'w') as file:
+            file.write('NAME          Mip_Procure_Stochastic\nROWS\n N  OBJ\n')
+            file.writelines(' ' + self.model_senses.astype(object) + '  ' + row_names + '\n')
+            file.write("COLUMNS\n    MARK      'MARKER'                 'INTORG'\n")
+            file.writelines(entry_lines[:num_integer_entries])
+            file.write("    MARK      'MARKER'                 'INTEND'\n")
+            file.writelines(entry_lines[num_integer_entries:])
+            file.write('RHS\n')
+            file.writelines('    RHS       ' + row_names[nonzero_rhs] + '  ' + _values(self.model_rhs[nonzero_rhs]) +
+                            '\n')
+            file.write('BOUNDS\n')
+            file.writelines(_bound_lines(column_names, self.model_lower, self.model_upper, self.model_integer))
+            file.write('ENDATA\n')
+
+    def optimize(self) -> None:
+        """
+        Writes the replicated model to a temporary MPS file, solves it with the CBC binary shipped with pulp, and
+        populates self.sol with its status, expected cost and column values.
+        """
+        logger.info('Solving the stochastic model...')
+        solver = pulp.PULP_CBC_CMD(msg=False)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            mps_path, sol_path, log_path = (os.path.join(tmp_dir, name) for name in ('model.mps', 'model.sol',
+                                                                                       'cbc.log'))
+            start = time.perf_counter()
+            self.write_mps(mps_path)
+            self.run_stats['Write Time (s)'] = time.perf_counter() - start
+            options = [f'-{_CBC_OPTIONS[name]}={value}' for name, value in self.solver_params.items()
+                       if name in _CBC_OPTIONS]
+            start = time.perf_counter()
+            with open(log_path, 'w') as log_file:
+                subprocess.run([solver.path, mps_path, *options, '-branch', '-printingOptions', 'all', '-solution',
+                                sol_path], stdout=log_file, stderr=subprocess.STDOUT, check=True)
+            solve_time = time.perf_counter() - start
+            with open(log_path) as file:
+                solver_log = file.read()
+            logger.debug('CBC log:\n%s', solver_log)
+            status, sol_status = solver.get_status(sol_path)
+            values = _read_column_values(sol_path, len(self.model_objective))
+
+        self.sol = {'status': status, 'sol_status': sol_status}
+        stats = self.run_stats
+        stats['Solve Time (s)'] = solve_time
+        stats['Status'] = pulp.LpStatus[status]
+        stats['Solution Status'] = pulp.LpSolution[sol_status]
+        if sol_status in (pulp.LpSolutionOptimal, pulp.LpSolutionIntegerFeasible):
+            self.sol.update({'obj_val': float(self.model_objective @ values), 'values': values})
+        stats['Objective'] = self.sol.get('obj_val')
+        stats['Best Bound'] = cbc_best_bound(solver_log)
+        logger.info('Stochastic model status: %s', stats['Status'])
+
+    def build_outputs(self) -> Dict:
+        """
+        Builds the output tables of each scenario, from the first-stage values and the recourse values of the
+        scenario.
+
+        Returns
+        -------
+        solutions : dict
+            Dictionary {scenario ID: output_schema.PanDat}. The run_stats table of each scenario adds its 'Scenario
+            ID', 'Scenario Probability' and 'Scenario Cost' to the statistics of the stochastic model. The
+            pet_gourmet and patas_pack tables are None if the model has no solution.
+        """
+        solutions = {}
+        for number, scenario in enumerate(self.scenarios):
+            sln = output_schema.PanDat()
+            stats = {**self.run_stats, 'Scenario ID': str(scenario),
+                     'Scenario Probability': float(self.probabilities[number])}
+            if 'values' in self.sol:
+                values = self.sol['values'][self.column_map[number]]
+                stats['Scenario Cost'] = float(self.objective @ values)
+                frames = [self._family_frame(family, values, name) for family, name in
+                          (('x', 'Transferred Quantity'), ('w', 'Acquired Quantity'), ('yp', 'Final Inventory'),
+                           ('yg', 'Final Inventory'))]
+                demand_df = pd.DataFrame({'Packing ID': np.repeat(self.packings, len(self.periods)),
+                                          'Period ID': np.tile(self.periods, len(self.packings)),
+                                          'Demand': self.demand[number].ravel()})
+                sln.pet_gourmet, sln.patas_pack = DatOut._build_tables(*frames, demand_df)
+            sln.run_stats = pd.DataFrame(list(stats.items()), columns=['Statistic', 'Value'])
+            sln.infeasibility_triage = pd.DataFrame(columns=['Family', 'Packing ID', 'Period ID', 'Violation'])
+            solutions[scenario] = sln
+        return solutions
+
+    def _family_frame(self, family: str, values: np.ndarray, value_name: str) -> pd.DataFrame:
+        """
+        Gets the values of a family of (packing, period) columns as a dataframe sorted by packing and period.
+        """
+        columns = np.nonzero(self.column_family == family)[0]
+        family_df = pd.DataFrame({'Packing ID': self.column_packing[columns],
+                                  'Period ID': self.column_period[columns].astype(np.int64),
+                                  value_name: values[columns]})
+        return family_df.sort_values(by=['Packing ID', 'Period ID'], ignore_index=True)
+
+
+def _replication_map(replicated: np.ndarray, num_scenarios: int) -> np.ndarray:
+    """
+    Numbers the items (rows or columns) of the replicated model: the items that are not replicated come first, once,
+    followed by one block of the replicated items per scenario.
+
+    Returns
+    -------
+    replication_map : np.ndarray
+        (scenario, item) array with the number of each item of the base model in each scenario.
+    """
+    num_shared = int((~replicated).sum())
+    shared_rank = np.cumsum(~replicated) - 1
+    replicated_rank = np.cumsum(replicated) - 1
+    scenario_offsets = num_shared + np.arange(num_scenarios)[:, None] * int(replicated.sum())
+    return np.where(replicated[None, :], scenario_offsets + replicated_rank[None, :], shared_rank[None, :])
+
+
+def _names(prefix: str, count: int) -> np.ndarray:
+    """
+    Gets the names <prefix>0, ..., <prefix><count - 1>, padded to the 8 characters of a fixed format MPS field.
+    """
+    return np.array([f'{prefix}{number:<7}' for number in range(count)], dtype=object)
+
+
+def _values(values: np.ndarray) -> np.ndarray:
+    """
+    Formats values as pulp writes them in MPS files, formatting each distinct value once.
+    """
+    unique_values, positions = np.unique(values, return_inverse=True)
+    return np.array([f'{value: .12e}' for value in unique_values], dtype=object)[positions]
+
+
+def _bound_lines(column_names: np.ndarray, lower: np.ndarray, upper: np.ndarray, integer: np.ndarray) -> np.ndarray:
+    """
+    Builds the BOUNDS section lines of the columns whose bounds differ from the MPS defaults, as pulp writes them
+    (e.g., an explicit 0 lower bound for the integer columns without upper bound, which CBC reads as binary
+    otherwise).
+    """
+    binary = integer & (lower == 0) & (upper == 1)
+    bounds = [('BV', binary, None),
+              ('FR', ~binary & np.isneginf(lower) & np.isposinf(upper), None),
+              ('MI', ~binary & np.isneginf(lower) & ~np.isposinf(upper), None),
+              ('LO', ~binary & np.isfinite(lower) & ((lower != 0) | (integer & np.isposinf(upper))), lower),
+              ('UP', ~binary & ~np.isposinf(upper), upper)]
+    lines = []
+    for bound_type, mask, value in bounds:
+        if value is None:  # BV, FR and MI bounds have no value
+            lines.append(f' {bound_type} BND       ' + column_names[mask] + '\n')
+        else:
+            lines.append(f' {bound_type} BND       ' + column_names[mask] + '  ' + _values(value[mask]) + '\n')
+    return np.concatenate(lines)
+
+
+def _read_column_values(sol_path: str, num_columns: int) -> np.ndarray:
+    """
+    Reads the column values of a CBC solution file (written with -printingOptions all) into an array.
+    """
+    with open(sol_path) as file:
+        lines = file.read().replace('**', '').splitlines()[1:]
+    sol_df = pd.DataFrame([line.split()[1:3] for line in lines if line.strip()], columns=['name', 'value'])
+    sol_df = sol_df[sol_df['name'].str.startswith('C')]
+    values = np.zeros(num_columns)
+    values[sol_df['name'].str.slice(1).astype(np.int64).to_numpy()] = sol_df['value'].astype(float).to_numpy()
+    return values
+
+
+def solve_stochastic(dat: input_schema.PanDat, scenarios_dat: scenarios_schema.PanDat, first_stage_periods: int = 0,
+                     discount: bool = False, probabilities: Dict = None,
+                     solver_parameters: Dict[str, float] = None) -> Dict:
+    """
+    Solves the two-stage stochastic model of the demand scenarios and returns the output of each scenario.
+
+    Parameters
+    ----------
+    dat : input_schema.PanDat
+        The input data.
+    scenarios_dat : scenarios_schema.PanDat
+        The demand scenarios (see scenario_demand_array()).
+    first_stage_periods : int
+        Number of periods, from the first one, whose transfers are first-stage decisions.
+    discount : bool
+        Whether the volume discount complexity is enabled.
+    probabilities : dict, optional
+        Dictionary {scenario ID: probability}. Defaults to equiprobable scenarios.
+    solver_parameters : dict, optional
+        Solver parameters (see OptModel.set_model_parameters()).
+
+    Returns
+    -------
+    solutions : dict
+        Dictionary {scenario ID: output_schema.PanDat} (see StochasticModel.build_outputs()).
+    """
+    stochastic_model = StochasticModel(dat, scenarios_dat, first_stage_periods=first_stage_periods, discount=discount,
+                                       probabilities=probabilities)
+    stochastic_model.build()
+    if solver_parameters:
+        stochastic_model.set_model_parameters(solver_parameters)
+    stochastic_model.optimize()
+    return stochastic_model.build_outputs()
@@ -1,7 +1,12 @@
-from typing import Any, Dict, List
+import logging
+from typing import Any, Dict, List, Union
 import pandas as pd
 from ticdat import PanDatFactory
 
+logger = logging.getLogger(__name__)
+
+LOG_FORMAT = '%(asctime)s %(levelname)s %(name)s: %(message)s'
+
 def set_input_parameter(schema, dat, name: str, value: Any):
     assert isinstance(schema, PanDatFactory)
     assert isinstance(dat, schema.PanDat)
@@ -14,10 +19,10 @@ def set_input_parameter(schema, dat, name: str, value: Any):
     _dat = schema.copy_pan_dat(dat)
     
     if name in params_df["Name"].values:
-        print(f"Overwriting parameter {repr(name)} with new value {repr(value)}")
+        logger.info('Overwriting parameter %r with new value %r', name, value)
         params_df.loc[params_df["Name"] == name, "Value"] = value
     else:
-        print(f"Adding new parameter {repr(name)} with value {repr(value)}")
+        logger.info('Adding new parameter %r with value %r', name, value)
         new_row = pd.DataFrame({"Name": [name], "Value": [value]})
         params_df = pd.concat([params_df, new_row], ignore_index=True, axis=0)
     
@@ -37,6 +42,25 @@ def set_multiple_input_parameters(schema, dat, parameters: Dict[str, Any]):
 # TODO: Function set_of_consecutive_integers
 
 
+def configure_logging(level: Union[int, str] = logging.INFO) -> None:
+    """
+    Sets the level of the package loggers and, if the package logger has no handler yet, adds a handler writing to
+    stderr.
+
+    Parameters
+    ----------
+    level : int or str
+        A logging level, e.g. logging.DEBUG or 'DEBUG'. DEBUG also logs the solver log and the build time of each
+        constraint family.
+    """
+    package_logger = logging.getLogger('mip_procure')
+    package_logger.setLevel(level.upper() if isinstance(level, str) else level)
+    if not package_logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        package_logger.addHandler(handler)
+
+
 def is_list_of_consecutive_increasing_integers(list_of_integers: List[int]) -> bool:
     assert isinstance(list_of_integers, list)
     assert all(isinstance(value, int) for value in list_of_integers)
@@ -47,3 +71,9 @@ class BadSolutionError(Exception):
     """
     Raised inside DatOut when the optimization solution is not feasible.
     """
+
+
+class ModelTooLargeError(Exception):
+    """
+    Raised inside main.solve when the estimated model size exceeds the size limits and the oversize mode is "reject".
+    """
@@ -0,0 +1,398 @@
+"""
+Contains the vectorized validation engine for the PanDat objects of a schema.
+"""
+import collections
+import hashlib
+import pickle
+from typing import Callable, Dict, Iterable, List, Set, Tuple
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import infer_dtype, is_bool_dtype, is_numeric_dtype
+from ticdat import PanDatFactory
+from ticdat.utils import TypeDictionary
+
+from mip_procure.data_preparation import integrity_checks_tables
+from mip_procure.schemas import input_schema, input_row_predicates
+
+TableField = collections.namedtuple('TableField', ['table', 'field'])
+TablePredicateName = collections.namedtuple('TablePredicateName', ['table', 'predicate_name'])
+
+# Data type applied by ticdat to the primary key fields without an explicit data type: anything but null.
+_PRIMARY_KEY_DATA_TYPE = TypeDictionary.safe_creator(number_allowed=True, inclusive_min=True, inclusive_max=True,
+                                                     min=-float('inf'), max=float('inf'), must_be_int=False,
+                                                     strings_allowed='*', nullable=False)
+_PARAMETERS_PREDICATE_NAME = 'Good Name/Value Check'
+FAILURE_KINDS = ('Foreign key', 'Data type', 'Data row', 'Duplicates')
+
+
+class VectorizedValidator:
+    """
+    Runs the data integrity checks of a PanDatFactory schema with column-wise pandas/NumPy operations.
+
+    The data types, foreign keys, row predicates and primary keys of the schema are compiled once, when the
+    validator is initialized. Then, each find_* method returns the same failure tables as the homonymous method of
+    the schema, but evaluates every rule over whole columns instead of calling Python functions row by row.
+    """
+
+    def __init__(self, schema: PanDatFactory = input_schema,
+                 row_predicates: List[Tuple[str, str, str, Callable, str]] = None) -> None:
+        """
+        Initializes a VectorizedValidator instance, compiling the rules of the given schema.
+
+        Parameters
+        ----------
+        schema : PanDatFactory
+            The schema whose rules are checked.
+        row_predicates : list, optional
+            The row predicates of the schema, declared as (table, predicate name, left field, comparison, right
+            field) tuples, where comparison is a function from the operator module. Defaults to
+            schemas.input_row_predicates for schemas.input_schema, and to no predicates otherwise.
+        """
+        assert isinstance(schema, PanDatFactory)
+        if row_predicates is None:
+            row_predicates = input_row_predicates if schema is input_schema else []
+        self.schema = schema
+        self.row_predicates = list(row_predicates)
+
+        # data types, including the implicit data type of the primary key fields
+        self.data_types = {table: dict(fields) for table, fields in schema.data_types.items()}
+        for table, pk_fields in schema.primary_key_fields.items():
+            for field in pk_fields:
+                self.data_types.setdefault(table, {}).setdefault(field, _PRIMARY_KEY_DATA_TYPE)
+        self.parameters_data_types = {name: parameter.type_dictionary for name, parameter in
+                                      schema.parameters.items()}
+
+    def _check_good_pan_dat(self, dat) -> None:
+        msg = []
+        if not self.schema.good_pan_dat_object(dat, msg.append):
+            raise ValueError(f"dat is not a good object for this schema: {' '.join(msg)}")
+
+    def find_data_type_failures(self, dat, tables: Iterable[str] = None) -> Dict[TableField, pd.DataFrame]:
+        """
+        Finds the rows whose values are inconsistent with the data type of their field.
+
+        Parameters
+        ----------
+        dat : PanDat
+            A PanDat object of the schema.
+        tables : iterable of str, optional
+            If given, only these tables are checked.
+
+        Returns
+        -------
+        failures : dict
+            Dictionary {TableField(table, field): DataFrame with the failing rows}.
+        """
+        self._check_good_pan_dat(dat)
+        failures = {}
+        for table, fields in self.data_types.items():
+            if tables is not None and table not in tables:
+                continue
+            df = getattr(dat, table)
+            for field, data_type in fields.items():
+                bad_rows = ~valid_data_mask(df[field], data_type)
+                if bad_rows.any():
+                    failures[TableField(table, field)] = df[bad_rows].copy()
+        return failures
+
+    def find_foreign_key_failures(self, dat, tables: Iterable[str] = None) -> Dict[tuple, pd.DataFrame]:
+        """
+        Finds the rows of the native tables that don't match any row of the foreign tables.
+
+        Parameters
+        ----------
+        dat : PanDat
+            A PanDat object of the schema.
+        tables : iterable of str, optional
+            If given, only the foreign keys whose native table is one of these tables are checked.
+
+        Returns
+        -------
+        failures : dict
+            Dictionary {foreign key (as in schema.foreign_keys): DataFrame with the failing native table rows}.
+        """
+        self._check_good_pan_dat(dat)
+        failures = {}
+        for fk in self.schema.foreign_keys:
+            if tables is not None and fk.native_table not in tables:
+                continue
+            native_df, foreign_df = getattr(dat, fk.native_table), getattr(dat, fk.foreign_table)
+            native_fields = list(fk.nativefields())
+            foreign_fields = [fk.nativetoforeignmapping()[field] for field in native_fields]
+            if len(native_fields) == 1:
+                matched = native_df[native_fields[0]].isin(foreign_df[foreign_fields[0]])
+            else:
+                matched = pd.MultiIndex.from_frame(native_df[native_fields]).isin(
+                    pd.MultiIndex.from_frame(foreign_df[foreign_fields]))
+            if not np.all(matched):
+                failures[fk] = native_df[~np.asarray(matched)]
+        return failures
+
+    def find_data_row_failures(self, dat, tables: Iterable[str] = None) -> Dict[TablePredicateName, pd.DataFrame]:
+        """
+        Finds the rows that violate the row predicates, including the check of the parameters table.
+
+        Parameters
+        ----------
+        dat : PanDat
+            A PanDat object of the schema.
+        tables : iterable of str, optional
+            If given, only these tables are checked.
+
+        Returns
+        -------
+        failures : dict
+            Dictionary {TablePredicateName(table, predicate_name): DataFrame with the failing rows}.
+        """
+        self._check_good_pan_dat(dat)
+        failures = {}
+        for table, predicate_name, left_field, comparison, right_field in self.row_predicates:
+            if tables is not None and table not in tables:
+                continue
+            df = getattr(dat, table)
+            bad_rows = ~np.asarray(comparison(df[left_field], df[right_field]), dtype=bool)
+            if bad_rows.any():
+                failures[TablePredicateName(table, predicate_name)] = df[bad_rows].copy()
+
+        if self.parameters_data_types and (tables is None or 'parameters' in tables):
+            df = dat.parameters
+            name_field = self.schema.primary_key_fields['parameters'][0]
+            value_field = self.schema.data_fields['parameters'][0]
+            good_rows = pd.Series(False, index=df.index)
+            for name, data_type in self.parameters_data_types.items():
+                is_name = df[name_field] == name
+                if is_name.any():
+                    good_rows[is_name] = True if data_type is None else valid_data_mask(df.loc[is_name, value_field],
+                                                                                      data_type)
+            if not good_rows.all():
+                failures[TablePredicateName('parameters', _PARAMETERS_PREDICATE_NAME)] = df[~good_rows].copy()
+        return failures
+
+    def find_duplicates(self, dat, tables: Iterable[str] = None) -> Dict[str, pd.DataFrame]:
+        """
+        Finds the rows that duplicate the primary key of a previous row of the same table.
+
+        Parameters
+        ----------
+        dat : PanDat
+            A PanDat object of the schema.
+        tables : iterable of str, optional
+            If given, only these tables are checked.
+
+        Returns
+        -------
+        failures : dict
+            Dictionary {table: DataFrame with the duplicated rows}.
+        """
+        self._check_good_pan_dat(dat)
+        failures = {}
+        for table, pk_fields in self.schema.primary_key_fields.items():
+            if pk_fields and (tables is None or table in tables):
+                df = getattr(dat, table)
+                duplicated = df.duplicated(list(pk_fields), keep='first')
+                if duplicated.any():
+                    failures[table] = df[duplicated]
+        return failures
+
+
+class ValidationCache:
+    """
+    Keeps the validation results of each input table, so that only the tables that changed are validated again.
+
+    Every call to validate() fingerprints the content of each table. A table is validated again only if its
+    fingerprint changed, or if it has a foreign key pointing to a table that changed; the results of all the other
+    tables are reused. The same goes for the integrity checks of data_preparation.py, which run again only when one
+    of the tables they read changed. The cache can be saved to disk, to be reused between runs.
+    """
+
+    def __init__(self, schema: PanDatFactory = input_schema, validator: VectorizedValidator = None) -> None:
+        """
+        Initializes an empty ValidationCache instance.
+
+        Parameters
+        ----------
+        schema : PanDatFactory
+            The schema of the PanDat objects to be validated.
+        validator : VectorizedValidator, optional
+            The validator that checks the tables. Defaults to a VectorizedValidator of the schema.
+        """
+        self.schema = schema
+        self.validator = validator or VectorizedValidator(schema)
+        self.fingerprints = {}  # dict {table: fingerprint of its content}
+        self.failures = {}  # dict {table: {failure kind: {failure key: failing rows}}}
+        self.integrity_errors = {}  # dict {integrity check: error message, or None if the check passed}
+        self.validated_tables = set()  # tables validated (i.e., not reused) by the last call to validate()
+
+    def validate(self, dat) -> Dict[str, dict]:
+        """
+        Validates the tables of dat that changed since the last call, and reuses the results of the other ones.
+
+        Parameters
+        ----------
+        dat : PanDat
+            A PanDat object of the schema.
+
+        Returns
+        -------
+        failures : dict
+            Dictionary {failure kind: {failure key: failing rows}} with the failures of all tables, where the failure
+            kinds are those in FAILURE_KINDS and the failure keys are the same as in VectorizedValidator.
+        """
+        fingerprints = {table: table_fingerprint(getattr(dat, table)) for table in self.schema.all_tables}
+        changed_tables = {table for table, fingerprint in fingerprints.items()
+                          if self.fingerprints.get(table) != fingerprint}
+        tables = changed_tables.union(fk.native_table for fk in self.schema.foreign_keys
+                                      if fk.foreign_table in changed_tables)
+        if tables:
+            validator = self.validator
+            new_failures = dict(zip(FAILURE_KINDS, (validator.find_foreign_key_failures(dat, tables),
+                                                    validator.find_data_type_failures(dat, tables),
+                                                    validator.find_data_row_failures(dat, tables),
+                                                    validator.find_duplicates(dat, tables))))
+            for table in tables:
+                self.failures[table] = {kind: {key: rows for key, rows in kind_failures.items()
+                                               if _failure_table(key) == table}
+                                        for kind, kind_failures in new_failures.items()}
+
+        if self.schema is input_schema:
+            for check, check_tables in integrity_checks_tables.items():
+                if check.__name__ not in self.integrity_errors or changed_tables.intersection(check_tables):
+                    try:
+                        check(dat)
+                        self.integrity_errors[check.__name__] = None
+                    except ValueError as error:
+                        self.integrity_errors[check.__name__] = str(error)
+
+        self.fingerprints = fingerprints
+        self.validated_tables = tables
+        return {kind: {key: rows for table_failures in self.failures.values()
+                       for key, rows in table_failures[kind].items()} for kind in FAILURE_KINDS}
+
+    def check(self, dat) -> None:
+        """
+        Validates dat (see validate()) and raises a ValueError if there are any failures.
+
+        Parameters
+        ----------
+        dat : PanDat
+            A PanDat object of the schema.
+        """
+        failures = self.validate(dat)
+        messages = [f'{kind} failures found in {len(kind_failures)} table(s)/field(s): {list(kind_failures)}'
+                    for kind, kind_failures in failures.items() if kind_failures]
+        messages += [error for error in self.integrity_errors.values() if error]
+        if messages:
+            raise ValueError('\n'.join(messages))
+
+    def save(self, path: str) -> None:
+        """
+        Saves the cache to the path, to be loaded by the next run.
+        """
+        # ticdat's foreign keys can't be pickled, so they are saved by their position in schema.foreign_keys
+        foreign_keys = list(self.schema.foreign_keys)
+        failures = {table: {kind: {foreign_keys.index(key) if kind == 'Foreign key' else key: rows
+                                   for key, rows in kind_failures.items()}
+                            for kind, kind_failures in table_failures.items()}
+                    for table, table_failures in self.failures.items()}
+        with open(path, 'wb') as file:
+            pickle.dump({'fingerprints': self.fingerprints, 'failures': failures,
+                         'integrity_errors': self.integrity_errors}, file)
+
+    @classmethod
+    def load(cls, path: str, schema: PanDatFactory = input_schema) -> 'ValidationCache':
+        """
+        Loads a cache saved by save(). Returns an empty cache if there is no file in the path.
+        """
+        cache = cls(schema)
+        try:
+            with open(path, 'rb') as file:
+                saved = pickle.load(file)
+        except FileNotFoundError:
+            return cache
+        foreign_keys = list(schema.foreign_keys)
+        cache.failures = {table: {kind: {foreign_keys[key] if kind == 'Foreign key' else key: rows
+                                         for key, rows in kind_failures.items()}
+                                  for kind, kind_failures in table_failures.items()}
+                          for table, table_failures in saved['failures'].items()}
+        cache.fingerprints, cache.integrity_errors = saved['fingerprints'], saved['integrity_errors']
+        return cache
+
+
+def table_fingerprint(df: pd.DataFrame) -> str:
+    """
+    Computes a fingerprint of the content (column names, data types and values) of a table.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr([(str(field), str(dtype)) for field, dtype in df.dtypes.items()]).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def _failure_table(key) -> str:
+    """
+    Returns the table of a failure key: the table itself for duplicates, and the first member (table or native
+    table) of the namedtuple keys otherwise.
+    """
+    return key if isinstance(key, str) else key[0]
+
+
+def valid_data_mask(values: pd.Series, data_type: TypeDictionary) -> pd.Series:
+    """
+    Vectorized version of ticdat's TypeDictionary.valid_data: flags which values are valid for the data type.
+
+    Parameters
+    ----------
+    values : pd.Series
+        The column to be checked.
+    data_type : TypeDictionary
+        The data type of the column, as stored in PanDatFactory.data_types.
+
+    Returns
+    -------
+    valid : pd.Series
+        Boolean Series, aligned with values, that is True for the valid values.
+    """
+    if data_type.datetime:  # dates are rare in our schemas, so they are checked by ticdat itself
+        return values.apply(lambda value: data_type.valid_data(None if pd.isnull(value) else value)).astype(bool)
+
+    is_null = values.isna().to_numpy()
+    if is_bool_dtype(values.dtype):
+        is_number = is_string = np.zeros(len(values), dtype=bool)
+    elif is_numeric_dtype(values.dtype):
+        is_number, is_string = ~is_null, np.zeros(len(values), dtype=bool)
+    else:
+        inferred_type = infer_dtype(values, skipna=True)
+        if inferred_type == 'string':
+            is_number, is_string = np.zeros(len(values), dtype=bool), ~is_null
+        elif inferred_type in ('integer', 'floating', 'mixed-integer-float', 'decimal'):
+            is_number, is_string = ~is_null, np.zeros(len(values), dtype=bool)
+        else:  # mixed column: fall back to the type of each value
+            value_types = values.map(type)
+            is_string = value_types.map(lambda value_type: all(hasattr(value_type, attr) for attr in
+                                                               ('lower', 'upper', 'strip'))).to_numpy(dtype=bool)
+            is_number = value_types.map(lambda value_type: issubclass(value_type, (int, float, np.number)) and
+                                        not issubclass(value_type, (bool, np.bool_))).to_numpy(dtype=bool)
+            is_number = is_number & ~is_null
+
+    valid = is_null & bool(data_type.nullable)
+    if is_number.any() and data_type.number_allowed:
+        numbers = pd.to_numeric(values.where(is_number), errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+        with np.errstate(invalid='ignore'):
+            good_number = (numbers >= data_type.min) & (numbers <= data_type.max)
+            if not data_type.inclusive_min:
+                good_number &= numbers != data_type.min
+            if not data_type.inclusive_max:
+                good_number &= numbers != data_type.max
+            if data_type.must_be_int:
+                is_int = np.isfinite(numbers) & (numbers == np.trunc(numbers))
+                if data_type.inclusive_max and data_type.max == float('inf'):
+                    is_int |= numbers == float('inf')
+                good_number &= is_int
+        valid |= is_number & good_number
+    if is_string.any():
+        if data_type.strings_allowed == '*':
+            valid |= is_string
+        else:
+            valid |= is_string & values.isin(data_type.strings_allowed).to_numpy()
+    return pd.Series(valid, index=values.index)
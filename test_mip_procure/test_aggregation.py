@@ -0,0 +1,81 @@
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import pulp
+
+import mip_procure
+from mip_procure.aggregation import aggregate_dat, cluster_packings, solve_aggregated
+from mip_procure.data_bridge import DatIn, DatOut
+from mip_procure.rolling_horizon import window_size
+from test_mip_procure import utils
+
+cwd = Path(__file__).parent.resolve()
+
+
+class TestAggregation(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.dat = utils.read_data(f'{cwd}/data/testing_data/validation_data.xlsx', mip_procure.input_schema)
+        cls.obj_val = utils.build_model(cls.dat, optimize=True).sol['obj_val']
+
+    def test_1_aggregate_dat(self):
+        clusters = cluster_packings(self.dat, num_clusters=3)
+        self.assertSetEqual(set(clusters.index), set(self.dat.packing['Packing ID']))
+        self.assertEqual(clusters.nunique(), 3)
+        agg_dat = aggregate_dat(self.dat, clusters)
+        utils.check_data(agg_dat, mip_procure.input_schema)
+        DatIn(agg_dat)  # passes the integrity checks
+        self.assertEqual(len(agg_dat.packing), 3)
+        self.assertEqual(agg_dat.demand_packing['Demand'].sum(), self.dat.demand_packing['Demand'].sum())
+        self.assertEqual(cluster_packings(self.dat, num_clusters=1).nunique(), 1)
+
+    def test_2_solve_aggregated(self):
+        opt_model = solve_aggregated(self.dat, num_clusters=3)
+        self.assertIn('vars', opt_model.sol, 'The aggregated plan must lead to a feasible plan')
+        self.assertGreaterEqual(opt_model.sol['obj_val'], self.obj_val - 1e-6)
+        self.assertEqual(opt_model.run_stats['Aggregation Clusters'], 3)
+        sln = DatOut(opt_model).build_output()
+        self.assertEqual(len(sln.pet_gourmet), len(self.dat.demand_packing))
+        self.assertFalse(mip_procure.output_schema.find_data_type_failures(sln))
+
+        warm_model = solve_aggregated(self.dat, num_clusters=3, warm_start=True)
+        self.assertAlmostEqual(warm_model.sol['obj_val'], self.obj_val, places=4)
+
+    def test_3_aggregate_oversize_mode(self):
+        long_dat = utils.long_horizon_data(self.dat, 2, mip_procure.input_schema)
+        size_limits = {'num_variables': window_size(long_dat, 2).num_variables}
+        sln = mip_procure.solve(long_dat, size_limits=size_limits, oversize_mode='aggregate')
+        self.assertEqual(len(sln.patas_pack), len(long_dat.demand_packing))
+        stats = dict(zip(sln.run_stats['Statistic'], sln.run_stats['Value']))
+        self.assertLess(stats['Aggregation Clusters'], len(long_dat.packing))
+        # the plan is repaired by windows of periods whose models fit the limits, instead of the full model
+        self.assertEqual(stats['Periods per Window'], 2)
+        self.assertLessEqual(stats['Max Window Columns'], size_limits['num_variables'])
+        with self.assertRaises(ValueError):
+            solve_aggregated(long_dat, num_clusters=3, warm_start=True, periods_per_window=2)
+
+    def test_4_full_model_fallback(self):
+        def restrict_to_nothing(opt_model, agg_model, clusters):  # a plan without orders can't be repaired
+            restricted = {var: (var.lowBound, var.upBound) for var in opt_model.vars['wb'].values()}
+            for var in restricted:
+                var.lowBound = var.upBound = 0
+            return restricted
+
+        with mock.patch('mip_procure.aggregation.restrict_to_aggregated_plan', restrict_to_nothing):
+            with self.assertLogs('mip_procure.aggregation', level='WARNING'):
+                opt_model = solve_aggregated(self.dat, num_clusters=3)
+            self.assertEqual(opt_model.mdl.status, pulp.LpStatusNotSolved)
+            self.assertEqual(opt_model.run_stats['Full Model Fallback'], 0)
+            self.assertIsNone(DatOut(opt_model).build_output().patas_pack)
+
+            fallback_model = solve_aggregated(self.dat, num_clusters=3, solver_parameters={'TimeLimit': 60},
+                                              full_model_fallback=True)
+        self.assertEqual(fallback_model.run_stats['Full Model Fallback'], 1)
+        self.assertEqual(fallback_model.solver_params['timeLimit'], 60)
+        self.assertAlmostEqual(fallback_model.sol['obj_val'], self.obj_val, places=4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+import mip_procure
+from mip_procure.comparison import COST_COLUMNS, compare_solutions
+from test_mip_procure import utils
+
+cwd = Path(__file__).parent.resolve()
+
+
+class TestComparison(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        dat = utils.read_data(f'{cwd}/data/testing_data/validation_data.xlsx', mip_procure.input_schema)
+        set_parameters = mip_procure.utils.set_multiple_input_parameters
+        cls.dats = {'Base': dat,
+                    'Cheap Trucks': set_parameters(mip_procure.input_schema, dat, {'CostByTruck': 10}),
+                    'Infeasible': set_parameters(mip_procure.input_schema, dat, {'InventoryCapacityGourmet': 0})}
+        cls.obj_vals, cls.solutions = {}, {}
+        for scenario, scenario_dat in cls.dats.items():
+            cls.obj_vals[scenario] = utils.build_model(scenario_dat, optimize=True).sol.get('obj_val')
+            cls.solutions[scenario] = mip_procure.solve(scenario_dat, debug_lp_path=None)
+
+    def test_1_compare_solutions(self):
+        report = compare_solutions(self.solutions, self.dats)
+        stack = report.stack
+        base = self.solutions['Base'].patas_pack
+        self.assertTupleEqual(stack.values['Acquired Quantity'].shape,
+                              (3, base['Packing ID'].nunique(), base['Period ID'].nunique()))
+        base = base.sort_values(['Packing ID', 'Period ID'])
+        np.testing.assert_allclose(stack.values['Acquired Quantity'][0].ravel(), base['Acquired Quantity'])
+        self.assertTrue(np.isnan(stack.values['Transferred Quantity'][2]).all())
+
+        # the cost breakdown adds up to the objective value of the model
+        self.assertListEqual(list(report.costs_df.columns), COST_COLUMNS)
+        for scenario in ('Base', 'Cheap Trucks'):
+            self.assertAlmostEqual(report.costs_df.loc[scenario, 'Total Cost'], self.obj_vals[scenario], places=4)
+        self.assertTrue(report.costs_df.loc['Infeasible'].isna().all())
+
+        for field, mask in report.changed.items():
+            self.assertFalse(mask[0].any(), 'The baseline must not change')
+            self.assertTrue(mask[2].all(), 'Every decision of a scenario without solution is changed')
+        self.assertEqual(len(report.changes_df), sum(mask.sum() for mask in report.changed.values()))
+
+        report = compare_solutions(self.solutions, self.dats['Base'], baseline='Cheap Trucks')
+        self.assertFalse(any(mask[1].any() for mask in report.changed.values()))
+        self.assertNotIn('Cheap Trucks', set(report.changes_df['Scenario']))
+
+
+if __name__ == '__main__':
+    unittest.main()
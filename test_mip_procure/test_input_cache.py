@@ -0,0 +1,76 @@
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import pandas as pd
+
+import mip_procure
+from mip_procure import input_cache
+from mip_procure.__main__ import _cached_dat_reader
+from mip_procure.input_cache import read_pan_dat, schema_version
+
+cwd = Path(__file__).parent.resolve()
+
+
+class TestInputCache(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.data_path = f'{cwd}/data/testing_data/validation_data.xlsx'
+        cls.dat = mip_procure.input_schema.xls.create_pan_dat(cls.data_path)
+
+    def _assert_same_dat(self, dat):
+        for table in mip_procure.input_schema.all_tables:
+            pd.testing.assert_frame_equal(getattr(self.dat, table).reset_index(drop=True), getattr(dat, table))
+
+    def test_1_read_pan_dat(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path, cache_dir = os.path.join(tmp_dir, 'input.xlsx'), os.path.join(tmp_dir, 'cache')
+            shutil.copy(self.data_path, path)
+            with mock.patch.object(input_cache, '_parse', wraps=input_cache._parse) as parse:
+                self._assert_same_dat(read_pan_dat(path, cache_dir=cache_dir))
+                self._assert_same_dat(read_pan_dat(path, cache_dir=cache_dir))
+                self.assertEqual(parse.call_count, 1, 'A warm read must not parse the file')
+
+                os.utime(path, ns=(0, 0))  # a changed modification time invalidates the entry
+                self._assert_same_dat(read_pan_dat(path, cache_dir=cache_dir))
+                self.assertEqual(parse.call_count, 2)
+                read_pan_dat(path, cache_dir=cache_dir, use_cache=False)
+                self.assertEqual(parse.call_count, 3)
+            self.assertEqual(len(os.listdir(cache_dir)), 1, 'The entry of a file must be overwritten')
+
+    def test_2_schema_version(self):
+        self.assertEqual(schema_version(mip_procure.input_schema), schema_version(mip_procure.input_schema))
+        self.assertNotEqual(schema_version(mip_procure.input_schema), schema_version(mip_procure.output_schema))
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path, cache_dir = os.path.join(tmp_dir, 'input.xlsx'), os.path.join(tmp_dir, 'cache')
+            shutil.copy(self.data_path, path)
+            read_pan_dat(path, cache_dir=cache_dir)
+            with mock.patch.object(input_cache, 'schema_version', return_value='another version'), \
+                    mock.patch.object(input_cache, '_parse', wraps=input_cache._parse) as parse:
+                self._assert_same_dat(read_pan_dat(path, cache_dir=cache_dir))
+                self.assertEqual(parse.call_count, 1, 'An entry of another schema version must not be used')
+
+    def test_3_cached_dat_reader(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path, cache_dir = os.path.join(tmp_dir, 'input.xlsx'), os.path.join(tmp_dir, 'cache')
+            shutil.copy(self.data_path, path)
+            csv_dir = os.path.join(tmp_dir, 'input_csv')
+            mip_procure.input_schema.csv.write_directory(self.dat, csv_dir)
+            get_dat_object = _cached_dat_reader(cache_dir)
+            with mock.patch.object(input_cache, '_parse', wraps=input_cache._parse) as parse:
+                for _ in range(2):
+                    self._assert_same_dat(get_dat_object(mip_procure.input_schema, 'create_pan_dat', path, 'file',
+                                                         False))
+                self.assertEqual(parse.call_count, 1, 'The xlsx file must be read through the cache')
+                # the other inputs are read by ticdat
+                dat = get_dat_object(mip_procure.input_schema, 'create_pan_dat', csv_dir, 'directory', False)
+                self.assertEqual(parse.call_count, 1)
+            self.assertEqual(len(dat.demand_packing), len(self.dat.demand_packing))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,267 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+import pulp
+
+import mip_procure
+from mip_procure.data_bridge import DatIn, DatOut
+from mip_procure.model_size import estimate_model_size
+from mip_procure.opt_model import cbc_best_bound, default_portfolio, portfolio_history_summary
+from test_mip_procure import utils
+
+cwd = Path(__file__).parent.resolve()
+
+
+class TestOptModel(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.dat = utils.read_data(f'{cwd}/data/testing_data/validation_data.xlsx', mip_procure.input_schema)
+        cls.params = mip_procure.input_schema.create_full_parameters_dict(cls.dat)
+
+    def test_1_discount_complexity(self):
+        dat = mip_procure.utils.set_multiple_input_parameters(mip_procure.input_schema, self.dat,
+                                                              {'DiscountLimit': 1000, 'PercentualDiscount': 0.5})
+        base_model = utils.build_model(dat, optimize=True)
+        discount_model = utils.build_model(dat, discount=True, optimize=True)
+        self.assertEqual(discount_model.mdl.status, pulp.LpStatusOptimal, 'Discount model must be solvable')
+        self.assertLessEqual(discount_model.sol['obj_val'], base_model.sol['obj_val'] + 1e-6)
+
+        # the discount is granted exactly to the orders of at least DiscountLimit units
+        wd, dc, w = discount_model.vars['wd'], discount_model.vars['dc'], discount_model.vars['w']
+        for key, var in w.items():
+            discounted = round(dc[key].value()) == 1
+            self.assertEqual(discounted, var.value() >= 1000 - 1e-6, f'Wrong price segment for {key}')
+            self.assertAlmostEqual(wd[key].value(), var.value() if discounted else 0.0)
+
+    def test_2_resolve_demand(self):
+        opt_model = utils.build_model(self.dat, optimize=True)
+        demand_delta = self.dat.demand_packing.head(2).copy()
+        demand_delta['Demand'] = demand_delta['Demand'] + 500
+        changes_df = opt_model.resolve_demand(demand_delta)
+
+        dat = mip_procure.input_schema.copy_pan_dat(self.dat)
+        dat.demand_packing.loc[demand_delta.index, 'Demand'] = demand_delta['Demand']
+        cold_model = utils.build_model(dat, optimize=True)
+        self.assertAlmostEqual(opt_model.sol['obj_val'], cold_model.sol['obj_val'], places=4)
+        self.assertFalse(changes_df.empty, 'A demand increase must change some decisions')
+        self.assertListEqual(list(changes_df.columns),
+                             ['Packing ID', 'Period ID', 'Variable', 'Previous Value', 'New Value'])
+        sln = DatOut(opt_model).build_output()
+        merged = sln.pet_gourmet.merge(demand_delta, on=['Packing ID', 'Period ID'], suffixes=('', ' Delta'))
+        self.assertListEqual(list(merged['Demand']), list(merged['Demand Delta']))
+
+    def test_3_optimize_portfolio(self):
+        opt_model = utils.build_model(self.dat, optimize=True)
+        configurations = default_portfolio()[:3]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            history_path = os.path.join(tmp_dir, 'portfolio_history.jsonl')
+            for _ in range(2):
+                portfolio_model = utils.build_model(self.dat)
+                portfolio_model.optimize_portfolio(configurations, history_path=history_path)
+                self.assertAlmostEqual(portfolio_model.sol['obj_val'], opt_model.sol['obj_val'], places=4)
+                self.assertIn(portfolio_model.portfolio_result['winner'], [conf['name'] for conf in configurations])
+            summary_df = portfolio_history_summary(history_path)
+        self.assertSetEqual(set(summary_df['Configuration']), {conf['name'] for conf in configurations})
+        self.assertEqual(summary_df['Wins'].sum(), 2)
+        self.assertTrue((summary_df['Races'] == 2).all())
+
+    def test_4_optimize_anytime(self):
+        opt_model = utils.build_model(self.dat, optimize=True)
+        incumbents = []
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            anytime_model = utils.build_model(self.dat)
+            anytime_model.optimize_anytime(lambda number, obj_val, sln: incumbents.append((number, obj_val, sln)),
+                                           output_dir=tmp_dir, first_time_slice=0.5)
+            self.assertSetEqual(set(os.listdir(tmp_dir)), {f'incumbent_{number}' for number, _, _ in incumbents})
+        self.assertGreaterEqual(len(incumbents), 1)
+        self.assertListEqual([number for number, _, _ in incumbents], list(range(1, len(incumbents) + 1)))
+        self.assertTrue(all(obj_1 > obj_2 for (_, obj_1, _), (_, obj_2, _) in zip(incumbents, incumbents[1:])))
+        self.assertAlmostEqual(anytime_model.sol['obj_val'], opt_model.sol['obj_val'], places=4)
+        self.assertEqual(anytime_model.sol['sol_status'], pulp.LpSolutionOptimal)
+        self.assertEqual(len(incumbents[-1][2].pet_gourmet), len(self.dat.demand_packing))
+
+        # the best bound is the highest one of the time slices, not the one of the last slice, and the best incumbent
+        # is kept even if the last slice returns a worse solution
+        bound_model = utils.build_model(self.dat)
+        solve = bound_model.mdl.solve
+        costly_var = next(var for var, coefficient in bound_model.ObjFunction.items() if coefficient > 0)
+
+        def stop_first_slice(*args, **kwargs):  # the first slice stops before proving optimality
+            status = solve(*args, **kwargs)
+            if bound_model.mdl.solve.call_count == 1:
+                bound_model.mdl.sol_status = pulp.LpSolutionIntegerFeasible
+            else:
+                costly_var.varValue += 1
+            return status
+
+        with mock.patch.object(bound_model.mdl, 'solve', side_effect=stop_first_slice) as patched_solve, \
+                mock.patch('mip_procure.opt_model.cbc_best_bound', side_effect=[7000.0, 6000.0]):
+            bound_model.optimize_anytime(first_time_slice=0.5)
+        self.assertEqual(patched_solve.call_count, 2)
+        self.assertEqual(bound_model.run_stats['Best Bound'], 7000.0)
+        self.assertAlmostEqual(bound_model.sol['obj_val'], opt_model.sol['obj_val'], places=4)
+
+    def test_5_estimate_model_size(self):
+        for discount in (False, True):
+            estimate = estimate_model_size(self.dat, discount=discount)
+            mdl = utils.build_model(self.dat, discount=discount).mdl
+            self.assertEqual(estimate.num_variables, mdl.numVariables())
+            self.assertEqual(estimate.num_constraints, mdl.numConstraints())
+            self.assertEqual(estimate.num_nonzeros, sum(len(constr) for constr in mdl.constraints.values()))
+            self.assertEqual(estimate.num_binary_variables,
+                             sum(var.cat == pulp.LpBinary or var.cat == pulp.LpInteger and var.upBound == 1
+                                 for var in mdl.variables()))
+        self.assertListEqual(estimate.exceeded_limits(), [])
+        self.assertEqual(len(estimate.exceeded_limits({'num_variables': 10, 'memory_mb': 0})), 2)
+        with self.assertRaises(mip_procure.utils.ModelTooLargeError):
+            mip_procure.solve(self.dat, size_limits={'num_nonzeros': 10})
+        # the heuristic mode solves windows of periods whose models fit the limits
+        long_dat = utils.long_horizon_data(self.dat, 2, mip_procure.input_schema)
+        size_limits = {'num_nonzeros': estimate_model_size(long_dat).num_nonzeros // 2}
+        sln = mip_procure.solve(long_dat, size_limits=size_limits, oversize_mode='heuristic')
+        stats = dict(zip(sln.run_stats['Statistic'], sln.run_stats['Value']))
+        self.assertGreater(stats['Windows'], 1)
+        self.assertLessEqual(stats['Max Window Nonzeros'], size_limits['num_nonzeros'])
+        self.assertEqual(len(sln.pet_gourmet), len(long_dat.demand_packing))
+
+    def test_6_run_stats(self):
+        opt_model = utils.build_model(self.dat, discount=True)
+        opt_model.set_model_parameters({'TimeLimit': 60})
+        opt_model.optimize()
+        stats = opt_model.run_stats
+        for family in ['Variables', 'Objective', 'Transporting Cost', 'Discount'] + [f'C{k}' for k in range(1, 10)]:
+            self.assertGreaterEqual(stats[f'Build Time {family} (s)'], 0.0)
+        self.assertEqual(stats['Status'], 'Optimal')
+        self.assertAlmostEqual(stats['Objective'], opt_model.sol['obj_val'])
+        self.assertAlmostEqual(stats['Best Bound'], stats['Objective'], delta=1e-4 * abs(stats['Objective']))
+        self.assertLessEqual(stats['Gap'], 1e-4)
+        self.assertEqual((stats['Rows'], stats['Columns']), (opt_model.mdl.numConstraints(),
+                                                              opt_model.mdl.numVariables()))
+        self.assertAlmostEqual(stats['Time Budget Used'], stats['Solve Time (s)'] / 60)
+        self.assertEqual(stats['Time Budget Warning'], 0)
+
+        sln = DatOut(opt_model).build_output()
+        self.assertDictEqual(dict(zip(sln.run_stats['Statistic'], sln.run_stats['Value'])), stats)
+        self.assertFalse(mip_procure.output_schema.find_data_type_failures(sln))
+
+        self.assertEqual(cbc_best_bound('Result - Stopped on time limit\n\nObjective value:   105.0\n'
+                                        'Lower bound:       100.0\nGap:    0.05\n'), 100.0)
+        self.assertEqual(cbc_best_bound('Cbc0010I After 100 nodes, 3 on tree, 105 best solution, best possible 98.5 '
+                                        '(1.5 seconds)\nCbc0010I After 200 nodes, 2 on tree, 105 best solution, '
+                                        'best possible 99.5 (2.1 seconds)\n'), 99.5)
+        self.assertIsNone(cbc_best_bound('Result - Linear relaxation infeasible\n'))
+
+    def test_7_compact_names(self):
+        opt_model = utils.build_model(self.dat, discount=True, optimize=True)
+        compact_model = utils.build_model(self.dat, discount=True, compact_names=True, optimize=True)
+        self.assertAlmostEqual(compact_model.sol['obj_val'], opt_model.sol['obj_val'], places=4)
+
+        lookup_df = compact_model.name_lookup()
+        self.assertListEqual(list(lookup_df.columns), ['Name', 'Kind', 'Family', 'Packing ID', 'Period ID'])
+        self.assertSetEqual(set(lookup_df.loc[lookup_df['Kind'] == 'Row', 'Name']), set(compact_model.mdl.constraints))
+        self.assertSetEqual(set(lookup_df.loc[lookup_df['Kind'] == 'Column', 'Name']),
+                            {var.name for var in compact_model.mdl.variables()})
+        # the compact solution, mapped back to the descriptive columns, has the same cost in the descriptive model (the
+        # solutions themselves may differ, since the model has ties)
+        columns_df = lookup_df[lookup_df['Kind'] == 'Column']
+        compact_values = {var.name: var.value() for var in compact_model.mdl.variables()}
+        for name, family, packing, period in zip(columns_df['Name'], columns_df['Family'], columns_df['Packing ID'],
+                                                 columns_df['Period ID']):
+            key = int(period) if pd.isna(packing) else (packing, int(period))
+            opt_model.vars[family][key].varValue = compact_values[name]
+        self.assertAlmostEqual(opt_model.mdl.objective.value(), compact_model.sol['obj_val'], places=4)
+        # every compact name maps back to the descriptive name of the same row/column
+        rows_df = lookup_df[lookup_df['Kind'] == 'Row']
+        descriptive_rows = {'_'.join(str(part) for part in (family, period, packing) if not pd.isna(part))
+                            for family, packing, period in zip(rows_df['Family'], rows_df['Packing ID'],
+                                                               rows_df['Period ID'])}
+        self.assertSetEqual(descriptive_rows, set(opt_model.mdl.constraints))
+        c4a_name = compact_model.constrs['C4a'][next(iter(compact_model.constrs['C4a']))].name
+        row = lookup_df.set_index('Name').loc[c4a_name]
+        self.assertEqual(row['Family'], 'C4a')
+        self.assertTupleEqual((row['Packing ID'], row['Period ID']), next(iter(compact_model.constrs['C4a'])))
+
+    def test_8_optimize_lazy(self):
+        opt_model = utils.build_model(self.dat, optimize=True)
+        lazy_model = utils.build_model(self.dat, lazy_constraints=True)
+        self.assertEqual(lazy_model.mdl.numConstraints(), opt_model.mdl.numConstraints() - len(self.dat.packing) *
+                         (2 * self.dat.demand_packing['Period ID'].nunique() - int(self.params['MaxTimePackingPack'])))
+        lazy_model.optimize_lazy()
+        self.assertAlmostEqual(lazy_model.sol['obj_val'], opt_model.sol['obj_val'], places=4)
+        stats = lazy_model.run_stats
+        self.assertEqual(stats['Lazy Converged'], 1)
+        self.assertGreaterEqual(stats['Lazy Iterations'], 2)
+        self.assertEqual(stats['Full Model Rows'], opt_model.mdl.numConstraints())
+        self.assertEqual(stats['Rows'], lazy_model.mdl.numConstraints())
+        self.assertLessEqual(stats['Rows'], stats['Full Model Rows'])
+        self.assertGreater(stats['Lazy Rows C9'], 0)
+        with self.assertRaises(ValueError):
+            opt_model.optimize_lazy()
+
+        # the loop stops when the violated rows are already in the model, instead of re-solving the same model
+        stuck_model = utils.build_model(self.dat, lazy_constraints=True)
+        num_packings, num_periods = len(self.dat.packing), self.dat.demand_packing['Period ID'].nunique()
+        values = {'x': np.ones((num_packings, num_periods)), 'xb': np.zeros((num_packings, num_periods)),
+                  'yp': np.zeros((num_packings, num_periods))}  # every C9 row is violated
+        with mock.patch.object(stuck_model, '_values_array', side_effect=lambda var_name, I, T: values[var_name]), \
+                self.assertLogs('mip_procure.opt_model', level='WARNING'):
+            stuck_model.optimize_lazy()
+        self.assertEqual(stuck_model.run_stats['Lazy Converged'], 0)
+        self.assertEqual(stuck_model.run_stats['Lazy Iterations'], 2)
+        self.assertEqual(stuck_model.run_stats['Lazy Rows C9'], num_packings * num_periods)
+
+    def test_9_logging(self):
+        with self.assertLogs('mip_procure', level='INFO') as logs:
+            DatIn(self.dat, verbose=True)
+        demand_log = next(message for message in logs.output if ':mip_procure.data_bridge:d: ' in message)
+        self.assertIn(f'dict of {len(self.dat.demand_packing)} items', demand_log)
+        self.assertTrue(demand_log.endswith(', ...]'), 'Only a sample of the demand must be logged')
+        with self.assertLogs('mip_procure', level='DEBUG') as logs:
+            mip_procure.utils.configure_logging('DEBUG')
+            utils.build_model(self.dat, optimize=True)
+        self.assertTrue(any('CBC log:' in message for message in logs.output))
+        self.assertTrue(any('ADDING C1: ' in message for message in logs.output))
+        mip_procure.utils.configure_logging('WARNING')
+
+    def test_10_triage_infeasibility(self):
+        dat = mip_procure.utils.set_multiple_input_parameters(mip_procure.input_schema, self.dat,
+                                                              {'InventoryCapacityGourmet': 0})
+        for compact_names in (False, True):
+            opt_model = utils.build_model(dat, compact_names=compact_names, optimize=True)
+            self.assertEqual(opt_model.mdl.status, pulp.LpStatusInfeasible)
+            triage_df = opt_model.triage_infeasibility()
+            self.assertEqual(opt_model.mdl.status, pulp.LpStatusInfeasible, 'The original status must be kept')
+            self.assertEqual(opt_model.run_stats['Elastic Status'], 'Optimal')
+            self.assertListEqual(list(triage_df.columns), ['Family', 'Packing ID', 'Period ID', 'Violation'])
+            self.assertTrue(set(triage_df['Family']).issubset({'C1b', 'C5'}))
+            self.assertIn('C1b', set(triage_df['Family']))
+            self.assertTrue(triage_df.loc[triage_df['Family'] == 'C1b', 'Packing ID'].isna().all())
+            self.assertTrue((triage_df['Violation'] > 0).all())
+            self.assertAlmostEqual(triage_df['Violation'].sum(), opt_model.mdl.objective.value(), places=4)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            debug_lp_path = os.path.join(tmp_dir, 'debug.lp')
+            sln = mip_procure.solve(dat, compact_names=True, debug_lp_path=debug_lp_path)
+            self.assertSetEqual(set(os.listdir(tmp_dir)), {'debug.lp', 'debug_names.csv'})
+        self.assertIsNone(sln.pet_gourmet)
+        self.assertAlmostEqual(sln.infeasibility_triage['Violation'].sum(), triage_df['Violation'].sum(), places=4)
+
+    def test_11_cost_by_truck(self):
+        # the trucks cost CostByTruck each (it used to be a hardcoded 350, the default value of the parameter)
+        for cost_by_truck, obj_val in ((350, 7603.5), (10, 4543.5), (1000, 13453.5)):
+            dat = mip_procure.utils.set_multiple_input_parameters(mip_procure.input_schema, self.dat,
+                                                                  {'CostByTruck': cost_by_truck})
+            opt_model = utils.build_model(dat, optimize=True)
+            self.assertAlmostEqual(opt_model.sol['obj_val'], obj_val, places=4)
+            num_trucks = sum(var.value() for var in opt_model.vars['n'].values())
+            self.assertAlmostEqual(opt_model.sol['obj_val'] - cost_by_truck * num_trucks, 4453.5, places=4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+import pandas as pd
+
+import mip_procure
+from mip_procure.data_bridge import DatOut
+from mip_procure.output_writer import pan_dat_chunks, pyarrow, write_output_chunks, write_solution
+from test_mip_procure import utils
+
+cwd = Path(__file__).parent.resolve()
+
+
+class TestOutputWriter(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        dat = utils.read_data(f'{cwd}/data/testing_data/validation_data.xlsx', mip_procure.input_schema)
+        cls.opt_model = utils.build_model(dat, optimize=True)
+        cls.sln = DatOut(cls.opt_model).build_output()
+
+    def _assert_same_output(self, sln):
+        for table in mip_procure.output_schema.all_tables:
+            expected_df, actual_df = getattr(self.sln, table), getattr(sln, table)
+            self.assertListEqual(list(expected_df.columns), list(actual_df.columns))
+            pd.testing.assert_frame_equal(expected_df.reset_index(drop=True), actual_df.reset_index(drop=True),
+                                          check_dtype=False)
+
+    def test_1_iter_output_chunks(self):
+        chunks = list(DatOut(self.opt_model, build_tables=False).iter_output_chunks(packings_per_chunk=2))
+        self.assertGreater(len(chunks), 2)
+        sln = mip_procure.output_schema.PanDat()
+        for table in mip_procure.output_schema.all_tables:
+            setattr(sln, table, pd.concat([chunk_df for name, chunk_df in chunks if name == table],
+                                          ignore_index=True))
+        self._assert_same_output(sln)
+
+    def test_2_write_solution(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            write_solution(self.opt_model, os.path.join(tmp_dir, 'solution.xlsx'), packings_per_chunk=2)
+            self._assert_same_output(mip_procure.output_schema.xls.create_pan_dat(
+                os.path.join(tmp_dir, 'solution.xlsx')))
+            write_solution(self.opt_model, os.path.join(tmp_dir, 'solution'), file_format='csv',
+                           packings_per_chunk=2)
+            self._assert_same_output(mip_procure.output_schema.csv.create_pan_dat(
+                os.path.join(tmp_dir, 'solution')))
+
+    def test_3_write_parquet(self):
+        if pyarrow is None:
+            self.skipTest('pyarrow is not installed')
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            write_output_chunks(pan_dat_chunks(self.sln, rows_per_chunk=5), tmp_dir, file_format='parquet')
+            sln = mip_procure.output_schema.PanDat()
+            for table in mip_procure.output_schema.all_tables:
+                setattr(sln, table, pd.read_parquet(os.path.join(tmp_dir, f'{table}.parquet')))
+        # the run_stats values are written as strings, since the column mixes strings and numbers
+        values = sln.run_stats['Value']
+        self.assertTrue(all(isinstance(value, str) for value in values))
+        numbers = pd.to_numeric(values, errors='coerce')
+        sln.run_stats['Value'] = numbers.astype(object).where(numbers.notna(), values)
+        self._assert_same_output(sln)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+from pathlib import Path
+
+import pulp
+
+import mip_procure
+from mip_procure.data_bridge import DatOut
+from mip_procure.rolling_horizon import max_periods_per_window, solve_rolling_horizon, window_size
+from test_mip_procure import utils
+
+cwd = Path(__file__).parent.resolve()
+
+
+class TestRollingHorizon(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        dat = utils.read_data(f'{cwd}/data/testing_data/validation_data.xlsx', mip_procure.input_schema)
+        cls.dat = utils.long_horizon_data(dat, 2, mip_procure.input_schema)
+        cls.opt_model = utils.build_model(cls.dat, optimize=True)
+
+    def test_1_window_size(self):
+        num_periods = self.dat.demand_packing['Period ID'].nunique()
+        full_size = window_size(self.dat, num_periods)
+        self.assertGreaterEqual(full_size.num_nonzeros, self.opt_model.run_stats['Nonzeros'])
+        size_limits = {'num_nonzeros': window_size(self.dat, 2).num_nonzeros}
+        self.assertEqual(max_periods_per_window(self.dat, size_limits), 2)
+        self.assertEqual(max_periods_per_window(self.dat, {'num_nonzeros': 10}), 1)
+        self.assertEqual(max_periods_per_window(self.dat), num_periods)
+
+    def test_2_solve_rolling_horizon(self):
+        for periods_per_window in (1, 2, 4):
+            opt_model = solve_rolling_horizon(self.dat, periods_per_window)
+            stats = opt_model.run_stats
+            self.assertEqual(stats['Status'], 'Optimal')
+            self.assertGreaterEqual(stats['Objective'], self.opt_model.sol['obj_val'] - 1e-6)
+            self.assertLessEqual(stats['Max Window Nonzeros'], window_size(self.dat, periods_per_window).num_nonzeros)
+            self.assertLessEqual(stats['Max Window Rows'], window_size(self.dat, periods_per_window).num_constraints)
+            sln = DatOut(opt_model).build_output()
+            self.assertEqual(len(sln.pet_gourmet), len(self.dat.demand_packing))
+            self.assertFalse(mip_procure.output_schema.find_data_type_failures(sln))
+
+            # the combined plan is feasible for the full model, and has the same cost there
+            full_model = utils.build_model(self.dat)
+            for var_name, values in opt_model.sol['vars'].items():
+                for i, t, value in values:
+                    full_model.vars[var_name][i, t].lowBound = full_model.vars[var_name][i, t].upBound = round(value)
+            full_model.optimize()
+            self.assertEqual(full_model.mdl.status, pulp.LpStatusOptimal)
+            self.assertAlmostEqual(full_model.sol['obj_val'], stats['Objective'], places=4)
+
+    def test_3_heuristic_oversize_mode(self):
+        size_limits = {'num_nonzeros': window_size(self.dat, 2).num_nonzeros}
+        sln = mip_procure.solve(self.dat, size_limits=size_limits, oversize_mode='heuristic')
+        stats = dict(zip(sln.run_stats['Statistic'], sln.run_stats['Value']))
+        self.assertEqual(stats['Periods per Window'], 2)
+        self.assertLessEqual(stats['Max Window Nonzeros'], size_limits['num_nonzeros'])
+        self.assertEqual(len(sln.patas_pack), len(self.dat.demand_packing))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import multiprocessing
+import unittest
+from pathlib import Path
+
+import mip_procure
+from mip_procure.data_bridge import DatIn, DatOut
+from mip_procure.shared_data import publish
+from test_mip_procure import utils
+
+cwd = Path(__file__).parent.resolve()
+
+
+def _solve_shared(handle):
+    shared_dat_in = handle.attach()
+    opt_model = utils.build_model(shared_dat_in, optimize=True)
+    num_rows = len(DatOut(opt_model).build_output().pet_gourmet)
+    shared_dat_in.close()
+    return opt_model.sol['obj_val'], num_rows
+
+
+class TestSharedData(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.dat = utils.read_data(f'{cwd}/data/testing_data/validation_data.xlsx', mip_procure.input_schema)
+        cls.dat_in = DatIn(cls.dat)
+
+    def test_1_attach(self):
+        with publish(self.dat_in) as handle:
+            shared_dat_in = handle.attach()
+            for attr in ('I', 'J', 'T', 'T_extend', 'first_period', 'dat_params'):
+                self.assertEqual(getattr(shared_dat_in, attr), getattr(self.dat_in, attr), attr)
+            for attr in ('d', 'au', 'moq', 'c', 'ini_inventory', 'ilg', 'inven_cost'):
+                self.assertDictEqual(dict(getattr(shared_dat_in, attr)), dict(getattr(self.dat_in, attr)), attr)
+            self.assertSetEqual(set(shared_dat_in.x_keys), set(self.dat_in.x_keys))
+            self.assertSetEqual(set(shared_dat_in.yp_keys), set(self.dat_in.yp_keys))
+            self.assertEqual(len(shared_dat_in.dat.demand_packing), len(self.dat.demand_packing))
+            with self.assertRaises(ValueError):  # the shared arrays are read-only
+                shared_dat_in.arrays['demand'][0, 0] = 0
+            shared_dat_in.close()
+
+            # the data can't be read after closing, instead of reading unmapped memory
+            for attr in ('d', 'au', 'moq', 'c', 'ini_inventory', 'ilg', 'inven_cost'):
+                with self.assertRaises(ValueError):
+                    dict(getattr(shared_dat_in, attr))
+            with self.assertRaises(ValueError):
+                shared_dat_in.d[next(iter(self.dat_in.d))]
+            with self.assertRaises(ValueError):
+                shared_dat_in.dat
+            shared_dat_in.close()  # closing twice is harmless
+
+    def test_2_workers(self):
+        opt_model = utils.build_model(self.dat_in, optimize=True)
+        with publish(self.dat_in) as handle, multiprocessing.get_context('spawn').Pool(2) as pool:
+            results = pool.map(_solve_shared, [handle] * 2)
+        for obj_val, num_rows in results:
+            self.assertAlmostEqual(obj_val, opt_model.sol['obj_val'], places=4)
+            self.assertEqual(num_rows, len(self.dat.demand_packing))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import mip_procure
+from mip_procure.stochastic import StochasticModel, solve_stochastic
+from test_mip_procure import utils
+
+cwd = Path(__file__).parent.resolve()
+
+
+def _scenarios(dat, demands: dict):
+    """
+    Builds the demand scenarios from {scenario ID: demand series aligned to the demand_packing table of dat}.
+    """
+    return mip_procure.scenarios_schema.PanDat(demand_scenarios=pd.concat(
+        [dat.demand_packing[['Packing ID', 'Period ID']].assign(**{'Scenario ID': scenario, 'Demand': demand})
+         for scenario, demand in demands.items()], ignore_index=True))
+
+
+class TestStochastic(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.dat = utils.read_data(f'{cwd}/data/testing_data/validation_data.xlsx', mip_procure.input_schema)
+        demand = cls.dat.demand_packing['Demand']
+        cls.low_dat = mip_procure.input_schema.copy_pan_dat(cls.dat)
+        cls.low_dat.demand_packing['Demand'] = (demand * 0.95).round().astype(int)
+        cls.obj_vals = {name: utils.build_model(dat, optimize=True).sol['obj_val']
+                        for name, dat in (('Base', cls.dat), ('Low', cls.low_dat))}
+
+    def test_1_single_scenario(self):
+        solutions = solve_stochastic(self.dat, _scenarios(self.dat, {'S1': self.dat.demand_packing['Demand']}))
+        stats = dict(zip(solutions['S1'].run_stats['Statistic'], solutions['S1'].run_stats['Value']))
+        self.assertEqual(stats['Status'], 'Optimal')
+        self.assertAlmostEqual(stats['Objective'], self.obj_vals['Base'], places=4)
+        self.assertAlmostEqual(stats['Scenario Cost'], self.obj_vals['Base'], places=4)
+
+        # identical scenarios replicate the same optimal cost
+        demand = self.dat.demand_packing['Demand']
+        solutions = solve_stochastic(self.dat, _scenarios(self.dat, {'S1': demand, 'S2': demand, 'S3': demand}),
+                                     first_stage_periods=1)
+        stats = dict(zip(solutions['S3'].run_stats['Statistic'], solutions['S3'].run_stats['Value']))
+        self.assertAlmostEqual(stats['Objective'], self.obj_vals['Base'], places=4)
+
+    def test_2_two_scenarios(self):
+        scenarios_dat = _scenarios(self.dat, {'Base': self.dat.demand_packing['Demand'],
+                                              'Low': self.low_dat.demand_packing['Demand']})
+        stochastic_model = StochasticModel(self.dat, scenarios_dat)
+        stochastic_model.build()
+        num_columns = len(stochastic_model.objective)
+        num_first_stage = stochastic_model.first_stage.sum()
+        self.assertEqual(stochastic_model.run_stats['Columns'], num_first_stage + 2 * (num_columns - num_first_stage))
+        stochastic_model.optimize()
+        solutions = stochastic_model.build_outputs()
+
+        # the shared orders cost at least the average of the costs of the scenarios solved alone
+        stats = dict(zip(solutions['Base'].run_stats['Statistic'], solutions['Base'].run_stats['Value']))
+        self.assertEqual(stats['Status'], 'Optimal')
+        self.assertGreaterEqual(stats['Objective'], np.mean(list(self.obj_vals.values())) - 1e-6)
+        scenario_costs = [dict(zip(sln.run_stats['Statistic'], sln.run_stats['Value']))['Scenario Cost']
+                          for sln in solutions.values()]
+        self.assertAlmostEqual(np.mean(scenario_costs), stats['Objective'], places=4)
+
+        # the orders are shared, and the demand of each scenario is served by its own recourse
+        pd.testing.assert_series_equal(solutions['Base'].patas_pack['Acquired Quantity'],
+                                       solutions['Low'].patas_pack['Acquired Quantity'])
+        for scenario, scenario_dat in (('Base', self.dat), ('Low', self.low_dat)):
+            pet_gourmet = solutions[scenario].pet_gourmet
+            expected = scenario_dat.demand_packing.sort_values(['Packing ID', 'Period ID'])['Demand']
+            np.testing.assert_allclose(pet_gourmet['Demand'], expected)
+
+    def test_3_missing_demand(self):
+        scenarios_dat = _scenarios(self.dat, {'S1': self.dat.demand_packing['Demand']})
+        scenarios_dat.demand_scenarios = scenarios_dat.demand_scenarios.iloc[1:]
+        with self.assertRaises(ValueError):
+            StochasticModel(self.dat, scenarios_dat)
+
+    def test_4_unknown_pairs(self):
+        # the rows of a stray period or packing are rejected instead of overwriting the last period or packing
+        for field, value in (('Period ID', 999), ('Packing ID', 'Stray Packing')):
+            scenarios_dat = _scenarios(self.dat, {'S1': self.dat.demand_packing['Demand']})
+            stray_row = scenarios_dat.demand_scenarios.iloc[[0]].assign(**{field: value, 'Demand': 123456})
+            scenarios_dat.demand_scenarios = pd.concat([scenarios_dat.demand_scenarios, stray_row], ignore_index=True)
+            with self.assertRaisesRegex(ValueError, '123456'):
+                StochasticModel(self.dat, scenarios_dat)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+import pandas as pd
+
+import mip_procure
+from mip_procure.data_bridge import DatIn
+from mip_procure.validation import ValidationCache, VectorizedValidator
+from test_mip_procure import utils
+
+cwd = Path(__file__).parent.resolve()
+
+
+class TestValidation(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.dat = utils.read_data(f'{cwd}/data/testing_data/validation_data.xlsx', mip_procure.input_schema)
+
+    def _bad_dat(self):
+        schema = mip_procure.input_schema
+        dat = schema.copy_pan_dat(self.dat)
+        dat.packing['Size'] = dat.packing['Size'].astype(float)
+        dat.packing.loc[0, 'Size'] = 1.5  # must be int
+        dat.demand_packing.loc[0, 'Demand'] = -10  # below min
+        dat.demand_packing.loc[1, 'Min Order Qty'] = dat.demand_packing.loc[1, 'Max Order Qty'] + 1  # predicate
+        dat.inventory.loc[0, 'Factory ID'] = 'Warehouse'  # string not allowed
+        dat.inventory.loc[1, 'Minimum Inventory'] = dat.inventory.loc[1, 'Initial Inventory'] + 1  # predicate
+        dat.distribution.loc[0, 'Packing ID'] = 'Unknown Packing'  # foreign key
+        dat.items_aging.loc[0, 'Maximum Time'] = None  # not nullable
+        dat.demand_packing = pd.concat([dat.demand_packing, dat.demand_packing.head(1)], ignore_index=True)
+        dat.parameters = pd.concat([dat.parameters, pd.DataFrame({'Name': ['Unknown Parameter', 'TruckCapacity'],
+                                                                  'Value': [1, 'many']})], ignore_index=True)
+        return dat
+
+    def _assert_same_failures(self, expected, actual):
+        self.assertSetEqual(set(expected), set(actual))
+        for key, failures_df in expected.items():
+            self.assertListEqual(list(failures_df.index), list(actual[key].index), f'Different failures for {key}')
+
+    def test_1_same_failures_as_ticdat(self):
+        schema, validator = mip_procure.input_schema, VectorizedValidator()
+        for dat in (self.dat, self._bad_dat()):
+            self._assert_same_failures(schema.find_data_type_failures(dat), validator.find_data_type_failures(dat))
+            self._assert_same_failures(schema.find_foreign_key_failures(dat),
+                                       validator.find_foreign_key_failures(dat))
+            self._assert_same_failures(schema.find_data_row_failures(dat), validator.find_data_row_failures(dat))
+            self._assert_same_failures(schema.find_duplicates(dat), validator.find_duplicates(dat))
+
+    def test_2_check_data(self):
+        utils.check_data(self.dat, mip_procure.input_schema, vectorized=True)
+        with self.assertRaises(AssertionError):
+            utils.check_data(self._bad_dat(), mip_procure.input_schema, vectorized=True)
+
+    def test_3_validation_cache(self):
+        schema, cache = mip_procure.input_schema, ValidationCache()
+        cache.validate(self.dat)
+        self.assertSetEqual(cache.validated_tables, set(schema.all_tables))
+        cache.validate(schema.copy_pan_dat(self.dat))
+        self.assertSetEqual(cache.validated_tables, set(), 'Unchanged tables must not be validated again')
+
+        dat = self._bad_dat()
+        dat.packing = self.dat.packing.copy()
+        dat.parameters = self.dat.parameters.copy()
+        failures = cache.validate(dat)
+        self.assertSetEqual(cache.validated_tables, set(schema.all_tables).difference({'packing', 'parameters'}))
+        self._assert_same_failures(VectorizedValidator().find_data_type_failures(dat), failures['Data type'])
+        self._assert_same_failures(VectorizedValidator().find_data_row_failures(dat), failures['Data row'])
+
+        # tables with foreign keys pointing to packing are validated again when packing changes
+        dat.packing = self._bad_dat().packing
+        cache.validate(dat)
+        self.assertSetEqual(cache.validated_tables, {'packing', 'demand_packing', 'distribution', 'items_aging'})
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache.save(os.path.join(tmp_dir, 'validation_cache.pkl'))
+            loaded_cache = ValidationCache.load(os.path.join(tmp_dir, 'validation_cache.pkl'))
+        loaded_cache.validate(self.dat)
+        self.assertSetEqual(loaded_cache.validated_tables, {'packing', 'demand_packing', 'distribution',
+                                                            'items_aging', 'inventory'})
+        DatIn(self.dat, validation_cache=loaded_cache)
+        with self.assertRaises(ValueError):
+            DatIn(self._bad_dat(), validation_cache=loaded_cache)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,14 +1,20 @@
 import inspect
 import os
+import pandas as pd
 from ticdat import PanDatFactory
 from ticdat import TicDatFactory
+from mip_procure.data_bridge import DatIn
+from mip_procure.input_cache import read_pan_dat
+from mip_procure.opt_model import OptModel
+from mip_procure.schemas import input_schema
+from mip_procure.validation import VectorizedValidator
 
 
 def _this_directory():
     return os.path.dirname(os.path.realpath(os.path.abspath(inspect.getsourcefile(_this_directory))))
 
 
-def read_data(input_data_loc, schema):
+def read_data(input_data_loc, schema, use_cache=False):
     """
     Reads data from files and populates an instance of the corresponding schema.
 
@@ -19,6 +25,9 @@ def read_data(input_data_loc, schema):
         It can be a directory containing CSV files, a xls/xlsx file, or a json file.
     schema: PanDatFactory
         An instance of the PanDatFactory class of ticdat.
+    use_cache: bool
+        If True, unchanged files are loaded from the parsed-input cache (see mip_procure.input_cache) instead of
+        being parsed again. Off by default, so that the tests neither read nor write the user's cache directory.
     Returns
     -------
     PanDat
@@ -27,13 +36,7 @@ def read_data(input_data_loc, schema):
     print(f'Reading data from: {input_data_loc}')
     path = os.path.join(_this_directory(), "data", input_data_loc)
     assert os.path.exists(path), f"bad path {path}"
-    if input_data_loc.endswith(".xlsx") or input_data_loc.endswith(".xls"):
-        dat = schema.xls.create_pan_dat(path)
-    elif input_data_loc.endswith("json"):
-        dat = schema.json.create_pan_dat(path)
-    else:  # read from cvs files
-        dat = schema.csv.create_pan_dat(path)
-    return dat
+    return read_pan_dat(path, schema, use_cache=use_cache)
 
 
 def write_data(sln, output_data_loc, schema):
@@ -65,6 +68,69 @@ def write_data(sln, output_data_loc, schema):
     return None
 
 
+def long_horizon_data(dat, num_repeats, schema):
+    """
+    Copies the testing data with its demand repeated over num_repeats consecutive horizons and without its last
+    packing (so that the packings diversity limit doesn't bind, and short windows of periods remain feasible).
+
+    Parameters
+    ----------
+    dat: PanDat
+        A PanDat object with the testing data.
+    num_repeats: int
+        The number of copies of the periods of the demand_packing table.
+    schema: PanDatFactory
+        An instance of the PanDatFactory class of ticdat compatible with dat.
+    Returns
+    -------
+    PanDat
+        a PanDat object with num_repeats times the periods of dat.
+    """
+    dat = schema.copy_pan_dat(dat)
+    last_packing = dat.packing['Packing ID'].max()
+    for table in ('packing', 'demand_packing', 'inventory', 'distribution', 'items_aging'):
+        df = getattr(dat, table)
+        setattr(dat, table, df[df['Packing ID'] != last_packing].reset_index(drop=True))
+    num_periods = dat.demand_packing['Period ID'].nunique()
+    dat.demand_packing = pd.concat([dat.demand_packing.assign(**{'Period ID': dat.demand_packing['Period ID'] +
+                                                                 repeat * num_periods})
+                                    for repeat in range(num_repeats)], ignore_index=True)
+    return dat
+
+
+def build_model(dat, discount=False, compact_names=False, lazy_constraints=False, optimize=False):
+    """
+    Builds the model of the testing data as mip_procure.solve() does: the base model with the transporting cost and,
+    optionally, the volume discount.
+
+    Parameters
+    ----------
+    dat: PanDat or DatIn
+        A PanDat object of mip_procure.input_schema, or an already built DatIn (or SharedDatIn) instance.
+    discount: bool
+        Whether the volume discount complexity is added.
+    compact_names: bool
+        Whether the model uses compact names (see OptModel).
+    lazy_constraints: bool
+        Whether the C6 and C9 rows are left out of the base model, to be added by optimize_lazy() 
+    optimize: bool
+        If True, the model is also solved.
+    Returns
+    -------
+    OptModel
+        the built (and, if optimize, solved) model.
+    """
+    dat_in = DatIn(dat) if isinstance(dat, input_schema.PanDat) else dat
+    opt_model = OptModel(dat_in, model_name='Mip_Procure', compact_names=compact_names)
+    opt_model.build_base_model(lazy_constraints=lazy_constraints)
+    opt_model.transporting_cost_complexity()
+    if discount:
+        opt_model.discount_complexity()
+    if optimize:
+        opt_model.optimize()
+    return opt_model
+
+
 def print_failures(schema, failures):
     """Prints out a sample of the data failure encountered."""
     if isinstance(schema, PanDatFactory):
@@ -79,16 +145,20 @@ def print_failures(schema, failures):
         raise ValueError('bad schema')
 
 
-def check_data(dat, schema):
+def check_data(dat, schema, vectorized=False):
     """
     Runs data integrity checks and prints out some sample failures to facilitate debugging.
 
     :param dat: A PanDat or TicDat object.
     :param schema: The schema that `dat` belongs to.
+    :param vectorized: If True (PanDat only), the foreign key, data type, data row and duplicates checks are run by
+                       mip_procure.validation.VectorizedValidator instead of ticdat's row by row checks.
     :return: None
     """
     print('Running data integrity check...')
     assert isinstance(schema, (TicDatFactory, PanDatFactory))
+    assert not vectorized or isinstance(schema, PanDatFactory), 'The vectorized checks require a PanDatFactory'
+    checker = VectorizedValidator(schema) if vectorized else schema
 
     if isinstance(schema, TicDatFactory):
         if not schema.good_tic_dat_object(dat):
@@ -96,20 +166,20 @@ def check_data(dat, schema):
     else:
         if not schema.good_pan_dat_object(dat):
             raise AssertionError("Not a good PanDat object")
-    foreign_key_failures = schema.find_foreign_key_failures(dat)
+    foreign_key_failures = checker.find_foreign_key_failures(dat)
 
     if foreign_key_failures:
         print_failures(schema, foreign_key_failures)
         raise AssertionError(f"Foreign key failures found in {len(foreign_key_failures)} table(s)/field(s).")
-    data_type_failures = schema.find_data_type_failures(dat)
+    data_type_failures = checker.find_data_type_failures(dat)
     if data_type_failures:
         print_failures(schema, data_type_failures)
         raise AssertionError(f"Data type failures found in {len(data_type_failures)} table(s)/field(s).")
-    data_row_failures = schema.find_data_row_failures(dat)
+    data_row_failures = checker.find_data_row_failures(dat)
     if data_row_failures:
         print_failures(schema, data_row_failures)
         raise AssertionError(f"Data row failures found in {len(data_row_failures)} table(s)/field(s).")
-    duplicates = schema.find_duplicates(dat)
+    duplicates = checker.find_duplicates(dat)
     if duplicates:
         print_failures(schema, duplicates)
         raise AssertionError(f"Duplicates found in {len(duplicates)} table(s)/field(s).")